@@ -360,6 +360,7 @@ class RadiusBatchAdmin(MultitenantAdminMixin, TimeStampedEditableAdmin):
         'name',
         'organization',
         'strategy',
+        'status',
         'expiration_date',
         'created',
         'modified',
@@ -374,15 +375,21 @@ class RadiusBatchAdmin(MultitenantAdminMixin, TimeStampedEditableAdmin):
         'users',
         'pdf',
         'expiration_date',
+        'status',
+        'progress',
+        'total_users',
+        'error',
         'created',
         'modified',
     ]
     list_filter = [
         'strategy',
+        'status',
         ('organization', MultitenantOrgFilter),
     ]
     search_fields = ['name']
     form = RadiusBatchForm
+    status_fields = ['status', 'progress', 'total_users', 'error']
 
     class Media:
         js = [
@@ -396,17 +403,32 @@ class RadiusBatchAdmin(MultitenantAdminMixin, TimeStampedEditableAdmin):
 
     number_of_users.short_description = _('number of users')
 
+    def progress(self, obj):
+        return obj.get_processed_users()
+
+    progress.short_description = _('processed users')
+
     def get_fields(self, request, obj=None):
         fields = super().get_fields(request, obj)[:]
         if not obj:
-            fields.remove('users')
-            fields.remove('pdf')
+            for field in ['users', 'pdf'] + self.status_fields:
+                fields.remove(field)
         return fields
 
     def save_model(self, request, obj, form, change):
         data = form.cleaned_data
         strategy = data.get('strategy')
-        if not change:
+        if not change and app_settings.BATCH_JOB_WORKERS:
+            obj.schedule(number_of_users=data.get('number_of_users'))
+            self.message_user(
+                request,
+                _(
+                    'The users of the batch "%s" are being added in '
+                    'background, reload the page to see the progress'
+                )
+                % obj,
+            )
+        elif not change:
             if strategy == 'csv':
                 if data.get('csvfile', False):
                     csvfile = data.get('csvfile')
@@ -442,14 +464,18 @@ class RadiusBatchAdmin(MultitenantAdminMixin, TimeStampedEditableAdmin):
         )
         if obj:
             return (
-                'strategy',
-                'prefix',
-                'csvfile',
-                'number_of_users',
-                'users',
-                'pdf',
-                'expiration_date',
-            ) + readonly_fields
+                (
+                    'strategy',
+                    'prefix',
+                    'csvfile',
+                    'number_of_users',
+                    'users',
+                    'pdf',
+                    'expiration_date',
+                )
+                + tuple(self.status_fields)
+                + readonly_fields
+            )
         return readonly_fields
 
 
@@ -0,0 +1,98 @@
+"""
+Lightweight views for the API endpoints consumed by freeradius,
+implemented with plain django views instead of django-rest-framework.
+
+Usage: ``get_urls(api_views=fast_views)`` (see ``openwisp_radius.urls``);
+the views which are not consumed by freeradius are the same of
+``openwisp_radius.api.views``.
+"""
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import freeradius
+from . import views as api_views
+from .freeradius import FreeradiusError, render
+from .utils import compact_response
+from .views import (  # noqa
+    accounting_batch,
+    authorize_batch,
+    batch,
+    batch_detail,
+    change_phone_number,
+    create_phone_token,
+    obtain_auth_token,
+    password_change,
+    password_reset,
+    password_reset_confirm,
+    register,
+    user_accounting,
+    validate_auth_token,
+    validate_phone_token,
+)
+
+
+def parse_body(request):
+    """
+    returns the JSON or form encoded body sent by freeradius as a dict
+    """
+    if request.content_type != 'application/json':
+        return request.POST.dict()
+    return freeradius.parse_json(request.body, request.encoding or 'utf-8')
+
+
+class FreeradiusView(View):
+    """
+    Authenticates the organization, parses the packet and
+    passes it to ``function``, which returns the status code
+    and the rendered body of the response
+    """
+
+    http_method_names = ['post']
+    function = None
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = parse_body(request)
+            uuid, token = freeradius.get_uuid_token(request.GET, request.META)
+        except FreeradiusError as e:
+            status, body = e.status, render(e.detail)
+        else:
+            status, body = freeradius.respond(self.function, uuid, token, data)
+        return compact_response(body, status)
+
+
+class AuthorizeView(FreeradiusView):
+    function = staticmethod(freeradius.authorize)
+
+
+authorize = csrf_exempt(AuthorizeView.as_view())
+
+
+class PostAuthView(FreeradiusView):
+    function = staticmethod(freeradius.postauth)
+
+
+postauth = csrf_exempt(PostAuthView.as_view())
+
+
+class UsageView(FreeradiusView):
+    function = staticmethod(freeradius.usage)
+
+
+usage = csrf_exempt(UsageView.as_view())
+
+
+class AccountingView(FreeradiusView):
+    """
+    GET requests (list of accounting objects) are
+    handled by ``openwisp_radius.api.views.accounting``
+    """
+
+    http_method_names = ['get', 'post']
+    function = staticmethod(freeradius.accounting)
+
+    def get(self, request, *args, **kwargs):
+        return api_views.accounting(request, *args, **kwargs)
+
+
+accounting = csrf_exempt(AccountingView.as_view())
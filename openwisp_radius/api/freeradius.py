@@ -0,0 +1,529 @@
+"""
+Transport independent implementation of the API endpoints
+consumed by freeradius (authorize, postauth, accounting, usage).
+
+Functions in this module receive the organization id and the
+packet as a dict and return a ``(status, body)`` tuple where
+``body`` is already rendered; errors are raised as ``FreeradiusError``.
+"""
+import json
+import logging
+from functools import lru_cache
+from time import time
+from uuid import UUID
+
+import swapper
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import NOT_PROVIDED, Exists, OuterRef
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .. import counters, metrics, policy
+from .. import settings as app_settings
+from ..cache import (
+    authorize_cache,
+    check_password,
+    get_organization_token,
+    get_user_groupname,
+    set_organization_token,
+)
+from ..utils import load_model
+from ..writebehind import postauth_queue
+from .serializers import STATUS_TYPE_CHOICES
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+OrganizationRadiusSettings = load_model('OrganizationRadiusSettings')
+RadiusAccounting = load_model('RadiusAccounting')
+RadiusPostAuth = load_model('RadiusPostAuth')
+RadiusToken = load_model('RadiusToken')
+OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
+
+
+class FreeradiusError(Exception):
+    def __init__(self, status, detail):
+        self.status = status
+        self.detail = detail
+        super().__init__(status, detail)
+
+
+def render(data):
+    """
+    renders ``data`` as compact JSON,
+    ``None`` is rendered as an empty body
+    """
+    if data is None:
+        return b''
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+@lru_cache(maxsize=256)
+def _render_items(items):
+    return render({key: value for key, value_type, value in items})
+
+
+def render_cached(data):
+    """
+    same as ``render``, the bodies of flat dicts (eg: the attributes
+    returned by the authorize endpoint) are rendered once and cached
+    """
+    if data is None:
+        return EMPTY
+    try:
+        # the type is part of the key because equal values
+        # (eg: 1, 1.0 and True) are not rendered in the same way
+        return _render_items(
+            tuple((key, type(value), value) for key, value in data.items())
+        )
+    except TypeError:
+        # unhashable values (eg: lists of validation errors)
+        return render(data)
+
+
+EMPTY = render(None)
+ACCEPT = render({'control:Auth-Type': 'Accept'})
+REJECT = render({'control:Auth-Type': 'Reject'})
+_TOKEN_AUTH_FAILED = 'Token authentication failed'
+_UNIQUE_ID_ERROR = {
+    'unique_id': ['radius accounting with this accounting unique ID already exists.']
+}
+
+
+# Organization authentication
+def get_uuid_token(GET, META):
+    """
+    returns the organization uuid and token supplied either
+    in the authorization header or in the query string
+    """
+    uuid = GET.get('uuid')
+    token = GET.get('token')
+    if 'HTTP_AUTHORIZATION' in META:
+        parts = META['HTTP_AUTHORIZATION'].split(' ')
+        try:
+            uuid = parts[1]
+            token = parts[2]
+        except IndexError:
+            raise FreeradiusError(400, {'detail': 'Invalid token'})
+    return uuid, token
+
+
+def load_organization_token(uuid):
+    """
+    returns the radius token of the organization (``None`` if it
+    doesn't exist), looks in the cache first and falls back to the database
+    """
+    organization_token = get_organization_token(uuid)
+    if organization_token is None:
+        try:
+            instance = OrganizationRadiusSettings.objects.only('token').get(
+                organization_id=uuid
+            )
+        except OrganizationRadiusSettings.DoesNotExist:
+            return None
+        organization_token = instance.token
+        set_organization_token(uuid, organization_token)
+    return organization_token
+
+
+def authenticate(uuid, token):
+    """
+    returns the normalized organization uuid if ``token`` is valid
+    """
+    try:
+        uuid = str(UUID(uuid))
+    except (TypeError, ValueError):
+        raise FreeradiusError(403, {'detail': _TOKEN_AUTH_FAILED})
+    organization_token = load_organization_token(uuid)
+    if (
+        organization_token is None
+        or not token
+        or not constant_time_compare(organization_token, token)
+    ):
+        raise FreeradiusError(403, {'detail': _TOKEN_AUTH_FAILED})
+    return uuid
+
+
+def parse_json(body, encoding='utf-8'):
+    """
+    returns the JSON body sent by freeradius as a dict
+    """
+    try:
+        data = json.loads(body.decode(encoding) or '{}')
+    except ValueError as e:
+        raise FreeradiusError(400, {'detail': 'JSON parse error - {}'.format(e)})
+    if not isinstance(data, dict):
+        raise FreeradiusError(400, {'detail': 'JSON parse error - expected an object'})
+    return data
+
+
+def authenticate_request(uuid, token, data):
+    """
+    returns the normalized organization uuid if ``token`` is
+    valid and the packet does not specify the organization
+    """
+    if 'organization' in data:
+        raise FreeradiusError(
+            403,
+            {'detail': 'setting the organization parameter explicitly is not allowed'},
+        )
+    return authenticate(uuid, token)
+
+
+def respond(function, uuid, token, data):
+    """
+    authenticates the organization and passes the packet to ``function``
+    (``authorize``, ``postauth`` or ``accounting``), returns a ``(status, body)``
+    tuple, errors included
+    """
+    with metrics.instrument(function.__name__):
+        try:
+            with metrics.phase('auth'):
+                organization_id = authenticate_request(uuid, token, data)
+            return function(organization_id, data)
+        except FreeradiusError as e:
+            return e.status, render(e.detail)
+
+
+def respond_authenticated(function, organization_id, data):
+    """
+    same as ``respond``, for packets already
+    authenticated with ``authenticate_request``
+    """
+    with metrics.instrument(function.__name__):
+        try:
+            return function(organization_id, data)
+        except FreeradiusError as e:
+            return e.status, render(e.detail)
+
+
+# Validation
+class FieldRule(object):
+    """
+    Validates a value with ``to_python`` and the
+    validators of a model field, both looked up once
+    """
+
+    def __init__(self, field, required=None, default=NOT_PROVIDED):
+        self.name = field.name
+        self.to_python = field.to_python
+        self.validators = list(field.validators)
+        self.allow_blank = field.blank
+        self.required = not field.blank if required is None else required
+        self.default = default
+        self.empty = '' if field.empty_strings_allowed else None
+        self.is_datetime = field.get_internal_type() == 'DateTimeField'
+
+    def clean(self, value):
+        if value is None or value == '':
+            if not self.allow_blank:
+                raise ValidationError('This field may not be blank.')
+            return self.empty
+        value = self.to_python(value)
+        if self.is_datetime and settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        for validator in self.validators:
+            validator(value)
+        return value
+
+
+def compile_rules(model, exclude=(), **options):
+    """
+    returns a dict of ``FieldRule`` instances for the concrete
+    fields of ``model``, ``options`` may contain ``FieldRule``
+    keyword arguments for each field
+    """
+    rules = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.name in exclude:
+            continue
+        rules[field.name] = FieldRule(field, **options.get(field.name, {}))
+    return rules
+
+
+def clean(rules, data):
+    """
+    returns the validated data, raises ``FreeradiusError``
+    if one or more fields are not valid
+    """
+    cleaned = {}
+    errors = {}
+    for name, rule in rules.items():
+        if name not in data:
+            if rule.required:
+                errors[name] = ['This field is required.']
+            elif rule.default is not NOT_PROVIDED:
+                cleaned[name] = rule.default
+            continue
+        try:
+            cleaned[name] = rule.clean(data[name])
+        except ValidationError as e:
+            errors[name] = e.messages
+    if errors:
+        raise FreeradiusError(400, errors)
+    return cleaned
+
+
+ACCOUNTING_RULES = compile_rules(
+    RadiusAccounting,
+    exclude=('organization',),
+    session_time={'default': 0},
+    input_octets={'default': 0},
+    output_octets={'default': 0},
+)
+POSTAUTH_RULES = compile_rules(RadiusPostAuth, exclude=('organization', 'date'))
+STATUS_TYPES = dict(STATUS_TYPE_CHOICES)
+
+
+# Authorize
+def get_users_queryset(organization_id):
+    """
+    active users which are members of the organization,
+    with their radius token
+    """
+    membership = OrganizationUser.objects.filter(
+        user=OuterRef('pk'), organization_id=organization_id
+    )
+    # only the fields needed to authorize the user are loaded (and cached)
+    return (
+        User.objects.filter(is_active=True)
+        .annotate(is_member=Exists(membership))
+        .filter(is_member=True)
+        .select_related('radius_token')
+        .only('username', 'password', 'is_active', 'radius_token__key')
+    )
+
+
+def get_user_queryset(organization_id, username):
+    """
+    looks up the user, its membership to the
+    organization and its radius token with one query
+    """
+    return get_users_queryset(organization_id).filter(username=username)
+
+
+def get_user(organization_id, username):
+    """
+    returns active user or ``None``
+    """
+    key = (organization_id, username)
+    with metrics.phase('user_lookup'):
+        user = authorize_cache.get(key)
+        if user is None:
+            loaded = time()
+            user = get_user_queryset(organization_id, username).first()
+            if user is not None:
+                authorize_cache.set(key, user, loaded=loaded)
+    return user
+
+
+def get_users(organization_id, usernames):
+    """
+    same as ``get_user`` for several usernames, returns a dict
+    of the active users found keyed by username; the users
+    which are not cached are looked up with one query
+    """
+    users = {}
+    missing = set()
+    with metrics.phase('user_lookup'):
+        for username in set(usernames):
+            user = authorize_cache.get((organization_id, username))
+            if user is None:
+                missing.add(username)
+            else:
+                users[username] = user
+        if missing:
+            loaded = time()
+            queryset = get_users_queryset(organization_id)
+            for user in queryset.filter(username__in=missing):
+                authorize_cache.set(
+                    (organization_id, user.username), user, loaded=loaded
+                )
+                users[user.username] = user
+    return users
+
+
+def check_user_token(user, password):
+    """
+    returns ``True`` if ``password`` is a valid radius user token
+    """
+    try:
+        token = user.radius_token
+    except RadiusToken.DoesNotExist:
+        return False
+    if not password or not constant_time_compare(token.key, password):
+        return False
+    # the token may have been used or deleted by another
+    # process since the user has been looked up or cached
+    return RadiusToken.objects.verify(user, token.key)
+
+
+def authorize(organization_id, data):
+    username = data.get('username')
+    password = data.get('password')
+    user = get_user(organization_id, username)
+    if user:
+        with metrics.phase('password_check'):
+            valid = check_password(user, password)
+        if not valid:
+            with metrics.phase('token_check'):
+                valid = check_user_token(user, password)
+        if valid:
+            if app_settings.API_AUTHORIZE_GROUP_POLICY:
+                return authorize_group_policy(organization_id, user, data)
+            return 200, ACCEPT
+    if app_settings.API_AUTHORIZE_REJECT:
+        return 401, REJECT
+    return 200, EMPTY
+
+
+def authorize_group_policy(organization_id, user, data):
+    """
+    evaluates the checks of the radius group of the user
+    (see ``openwisp_radius.policy``)
+    """
+    accept, attributes = policy.authorize(organization_id, user, data)
+    if not accept:
+        return 401, render({'control:Auth-Type': 'Reject', **attributes})
+    return 200, render({'control:Auth-Type': 'Accept', **attributes})
+
+
+# Post Auth
+def postauth(organization_id, data):
+    with metrics.phase('validation'):
+        cleaned = clean(POSTAUTH_RULES, data)
+    # do not save correct passwords in clear text
+    if cleaned['reply'] == 'Access-Accept':
+        cleaned['password'] = ''
+    instance = RadiusPostAuth(organization_id=organization_id, **cleaned)
+    with metrics.phase('db_write'):
+        if app_settings.API_POSTAUTH_WRITE_BEHIND:
+            postauth_queue.put(instance)
+        else:
+            instance.save()
+    return 201, EMPTY
+
+
+# Usage
+def usage(organization_id, data):
+    """
+    returns the remaining time and traffic of the user
+    as reply attributes (see ``openwisp_radius.counters``)
+    """
+    accept, attributes = counters.get_reply(organization_id, data.get('username'))
+    if not accept:
+        return 401, render({'control:Auth-Type': 'Reject', **attributes})
+    return 200, render(attributes or None)
+
+
+# Accounting
+def accounting(organization_id, data):
+    """
+    adds or updates accounting information (start, interim-update, stop)
+    """
+    status_type = data.get('status_type')
+    if status_type is None:
+        raise FreeradiusError(400, {'status_type': ['This field is required.']})
+    if status_type not in STATUS_TYPES:
+        raise FreeradiusError(
+            400, {'status_type': [f'"{status_type}" is not a valid choice.']}
+        )
+    # Accounting-On and Accounting-Off are ignored
+    if status_type in ['Accounting-On', 'Accounting-Off']:
+        return 200, EMPTY
+    is_start = status_type == 'Start'
+    if is_start:
+        data = data.copy()
+        for field in ['session_time', 'input_octets', 'output_octets']:
+            if data.get(field) == '':
+                data[field] = 0
+    with metrics.phase('validation'):
+        cleaned = clean(ACCOUNTING_RULES, data)
+    time = timezone.now()
+    if status_type in ['Interim-Update', 'Stop']:
+        cleaned['update_time'] = time
+    if status_type == 'Stop':
+        cleaned['stop_time'] = time
+    instance = RadiusAccounting(organization_id=organization_id, **cleaned)
+    if app_settings.API_ACCOUNTING_AUTO_GROUP and 'groupname' not in cleaned:
+        # only used if the session is created
+        instance.groupname = _get_groupname(instance.username, organization_id)
+    previous = None
+    if app_settings.API_ACCOUNTING_COUNTERS:
+        with metrics.phase('session_lookup'):
+            previous = counters.get_session_usage(organization_id, cleaned['unique_id'])
+    with metrics.phase('db_write'):
+        status = _save_session(organization_id, instance, cleaned, is_start)
+    if status is None:
+        raise FreeradiusError(400, _UNIQUE_ID_ERROR)
+    if app_settings.API_ACCOUNTING_COUNTERS:
+        counters.record_usage(organization_id, cleaned, previous)
+    return status, EMPTY
+
+
+def _save_session(organization_id, instance, cleaned, is_start):
+    """
+    returns the status code of the response, ``None``
+    if the unique id belongs to another organization
+    """
+    if app_settings.API_ACCOUNTING_UPSERT:
+        if not RadiusAccounting.objects.upsert(instance, cleaned.keys()):
+            return None
+        return 201 if is_start else 200
+    # start packets usually create new sessions,
+    # while other packets usually update existing ones;
+    # duplicated start packets cannot be detected by inserting
+    # in partitioned tables, hence sessions are updated first
+    create_first = is_start and not app_settings.ACCOUNTING_PARTITIONED
+    if create_first and _create_session(instance):
+        return 201
+    if _update_session(organization_id, cleaned):
+        return 200
+    if not create_first and _create_session(instance):
+        return 201
+    return None
+
+
+def _get_groupname(username, organization_id):
+    try:
+        with metrics.phase('groupname_lookup'):
+            return get_user_groupname(username, organization_id)
+    except User.DoesNotExist:
+        logger.info('no corresponding user found for username: {}'.format(username))
+
+
+def _create_session(instance):
+    try:
+        with transaction.atomic():
+            if app_settings.ACCOUNTING_PARTITIONED and not _check_partitioned(instance):
+                return False
+            instance.save(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _check_partitioned(instance):
+    """
+    returns ``False`` if the session already exists; partitioned tables
+    cannot enforce the uniqueness of unique_id, hence the inserts of the
+    same session are serialized and the existing sessions are looked up
+    """
+    if not RadiusAccounting.objects.lock_new_session(instance.unique_id):
+        return False
+    # the start time is part of the primary key of partitioned tables
+    if instance.start_time is None:
+        instance.start_time = timezone.now()
+    return True
+
+
+def _update_session(organization_id, cleaned):
+    fields = cleaned.copy()
+    unique_id = fields.pop('unique_id')
+    queryset = RadiusAccounting.objects.filter(
+        unique_id=unique_id, organization_id=organization_id
+    )
+    return queryset.update(**fields) > 0
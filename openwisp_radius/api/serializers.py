@@ -15,7 +15,7 @@ from rest_framework import serializers
 from rest_framework.exceptions import APIException
 
 from ..utils import load_model
-from .utils import ErrorDictMixin
+from .utils import ErrorDictMixin, InstrumentedSerializerMixin
 
 RadiusPostAuth = load_model('RadiusPostAuth')
 RadiusAccounting = load_model('RadiusAccounting')
@@ -23,7 +23,9 @@ RadiusBatch = load_model('RadiusBatch')
 User = get_user_model()
 
 
-class RadiusPostAuthSerializer(serializers.ModelSerializer):
+class RadiusPostAuthSerializer(
+    InstrumentedSerializerMixin, serializers.ModelSerializer
+):
     password = serializers.CharField(required=False, allow_blank=True)
     called_station_id = serializers.CharField(required=False, allow_blank=True)
     calling_station_id = serializers.CharField(required=False, allow_blank=True)
@@ -39,6 +41,17 @@ class RadiusPostAuthSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class RadiusPostAuthWriteBehindSerializer(RadiusPostAuthSerializer):
+    """
+    Does not validate the organization, which is taken
+    from the authentication, in order to avoid any query
+    """
+
+    class Meta(RadiusPostAuthSerializer.Meta):
+        fields = None
+        exclude = ('organization',)
+
+
 STATUS_TYPE_CHOICES = (
     ('Start', 'Start'),
     ('Interim-Update', 'Interim-Update'),
@@ -48,7 +61,9 @@ STATUS_TYPE_CHOICES = (
 )
 
 
-class RadiusAccountingSerializer(serializers.ModelSerializer):
+class RadiusAccountingSerializer(
+    InstrumentedSerializerMixin, serializers.ModelSerializer
+):
     framed_ip_address = serializers.IPAddressField(required=False, allow_blank=True)
     framed_ipv6_address = serializers.IPAddressField(
         required=False, allow_blank=True, protocol='IPv6'
@@ -85,6 +100,18 @@ class RadiusAccountingSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class RadiusAccountingBatchSerializer(RadiusAccountingSerializer):
+    """
+    Used to validate accounting packets in bulk: the organization
+    and the uniqueness of unique_id are handled by the view
+    """
+
+    class Meta(RadiusAccountingSerializer.Meta):
+        fields = None
+        exclude = ('organization',)
+        extra_kwargs = {'unique_id': {'validators': []}}
+
+
 class GroupSerializer(serializers.ModelSerializer):
     class Meta:
         model = Group
@@ -120,6 +147,27 @@ class RadiusBatchSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class RadiusBatchStatusSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='radius:batch_detail')
+    # updated while the batch is running
+    processed_users = serializers.IntegerField(source='get_processed_users')
+
+    class Meta:
+        model = RadiusBatch
+        fields = (
+            'id',
+            'url',
+            'name',
+            'strategy',
+            'status',
+            'processed_users',
+            'total_users',
+            'error',
+            'pdf',
+        )
+        read_only_fields = fields
+
+
 class PasswordResetSerializer(BasePasswordResetSerializer):
     def save(self):
         request = self.context.get('request')
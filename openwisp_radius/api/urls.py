@@ -3,14 +3,29 @@ from django.conf.urls import url
 from . import views
 
 
+def _optional_url(api_views, regex, name):
+    """
+    the views added after the first release may be missing in
+    custom ``api_views`` modules, their urls are not registered
+    """
+    view = getattr(api_views, name, None)
+    if view is None:
+        return None
+    return url(regex, view, name=name)
+
+
 def get_api_urls(api_views=None):
     if not api_views:
         api_views = views
-    return [
+    urls = [
         url(r'^authorize/$', api_views.authorize, name='authorize'),
+        _optional_url(api_views, r'^authorize/batch/$', 'authorize_batch'),
         url(r'^postauth/$', api_views.postauth, name='postauth'),
+        _optional_url(api_views, r'^usage/$', 'usage'),
         url(r'^accounting/$', api_views.accounting, name='accounting'),
+        _optional_url(api_views, r'^accounting/batch/$', 'accounting_batch'),
         url(r'^batch/$', api_views.batch, name='batch'),
+        _optional_url(api_views, r'^batch/(?P<pk>[0-9a-f-]+)/$', 'batch_detail'),
         # registration differentiated by organization
         url(r'^(?P<slug>[\w-]+)/account/$', api_views.register, name='rest_register'),
         # password reset
@@ -63,3 +78,4 @@ def get_api_urls(api_views=None):
             name='phone_number_change',
         ),
     ]
+    return [pattern for pattern in urls if pattern is not None]
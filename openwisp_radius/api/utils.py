@@ -1,6 +1,74 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .. import metrics
+
+
+def compact_response(body, status=200):
+    """
+    returns a plain django response with the JSON ``body``
+    (already rendered) and an explicit ``Content-Length``
+    """
+    response = HttpResponse(body, status=status, content_type='application/json')
+    response['Content-Length'] = len(body)
+    return response
+
+
 class ErrorDictMixin(object):
     def _get_error_dict(self, error):
         dict_ = error.message_dict.copy()
         if '__all__' in dict_:
             dict_['non_field_errors'] = dict_.pop('__all__')
         return dict_
+
+
+class InstrumentedSerializerMixin(object):
+    """
+    records validation and saving as phases
+    of the request metrics (see ``openwisp_radius.metrics``)
+    """
+
+    def is_valid(self, *args, **kwargs):
+        with metrics.phase('validation'):
+            return super().is_valid(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        with metrics.phase('db_write'):
+            return super().save(*args, **kwargs)
+
+
+class InstrumentedViewMixin(object):
+    """
+    collects the metrics (see ``openwisp_radius.metrics``)
+    of the POST requests, ``metrics_endpoint`` is the name
+    used to identify the view
+    """
+
+    metrics_endpoint = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'POST':
+            return super().dispatch(request, *args, **kwargs)
+        with metrics.instrument(self.metrics_endpoint):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON (one JSON document per line)
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            lines = stream.read().decode(encoding).splitlines()
+            return [json.loads(line) for line in lines if line.strip()]
+        except ValueError as e:
+            raise ParseError('NDJSON parse error - %s' % str(e))
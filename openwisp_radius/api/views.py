@@ -1,4 +1,5 @@
 import logging
+from time import time
 from uuid import UUID
 
 import drf_link_header_pagination
@@ -8,12 +9,15 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.tokens import default_token_generator
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
 from django.http import Http404
+from django.utils.crypto import constant_time_compare
 from django.utils.decorators import method_decorator
 from django.utils.encoding import force_bytes, force_text
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
 from django_filters import rest_framework as filters
@@ -33,24 +37,42 @@ from rest_framework.authtoken.views import ObtainAuthToken as BaseObtainAuthToke
 from rest_framework.exceptions import AuthenticationFailed, ParseError
 from rest_framework.exceptions import ValidationError as RestValidationError
 from rest_framework.generics import CreateAPIView, GenericAPIView
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.throttling import BaseThrottle  # get_ident method
 from rest_framework.views import APIView
 
+from .. import counters, metrics, policy
 from .. import settings as app_settings
+from ..cache import authorize_cache, check_password, check_passwords, get_user_groupname
 from ..exceptions import PhoneTokenException
 from ..utils import load_model
+from ..writebehind import postauth_queue
+from .freeradius import (
+    check_user_token,
+    get_user_queryset,
+    get_users,
+    load_organization_token,
+    render_cached,
+)
 from .serializers import (
     ChangePhoneNumberSerializer,
+    RadiusAccountingBatchSerializer,
     RadiusAccountingSerializer,
     RadiusBatchSerializer,
+    RadiusBatchStatusSerializer,
     RadiusPostAuthSerializer,
+    RadiusPostAuthWriteBehindSerializer,
     ValidatePhoneTokenSerializer,
 )
-from .utils import ErrorDictMixin
+from .utils import ErrorDictMixin, InstrumentedViewMixin, NDJSONParser
 
 _TOKEN_AUTH_FAILED = _('Token authentication failed')
+_UNIQUE_ID_ERROR = {
+    'unique_id': [_('radius accounting with this accounting unique ID already exists.')]
+}
 logger = logging.getLogger(__name__)
 User = get_user_model()
 PhoneToken = load_model('PhoneToken')
@@ -59,30 +81,43 @@ OrganizationRadiusSettings = load_model('OrganizationRadiusSettings')
 RadiusPostAuth = load_model('RadiusPostAuth')
 RadiusAccounting = load_model('RadiusAccounting')
 RadiusBatch = load_model('RadiusBatch')
+RadiusUserGroup = load_model('RadiusUserGroup')
+RadiusUserCounter = load_model('RadiusUserCounter')
 OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
 Organization = swapper.load_model('openwisp_users', 'Organization')
 
 
 class TokenAuthentication(BaseAuthentication):
     def authenticate(self, request):
+        with metrics.phase('auth'):
+            return self.authenticate_organization(request)
+
+    def authenticate_organization(self, request):
         self.check_organization(request)
         uuid, token = self.get_uuid_token(request)
         if not uuid or not token:
             raise AuthenticationFailed(_TOKEN_AUTH_FAILED)
-        # check cache too
-        if not cache.get('uuid'):
-            try:
-                opts = dict(organization_id=uuid, token=token)
-                instance = OrganizationRadiusSettings.objects.get(**opts)
-                cache.set(uuid, instance.token)
-            except OrganizationRadiusSettings.DoesNotExist:
-                raise AuthenticationFailed(_TOKEN_AUTH_FAILED)
-        elif cache.get(uuid) != token:
+        try:
+            uuid = str(UUID(uuid))
+        except ValueError:
+            raise AuthenticationFailed(_TOKEN_AUTH_FAILED)
+        organization_token = self.get_organization_token(uuid)
+        if not constant_time_compare(organization_token, token):
             raise AuthenticationFailed(_TOKEN_AUTH_FAILED)
         # if execution gets here the auth token is good
         # we include the organization id in the auth info
         return (AnonymousUser(), uuid)
 
+    def get_organization_token(self, uuid):
+        """
+        returns the radius token of the organization,
+        looks in the cache first and falls back to the database
+        """
+        organization_token = load_organization_token(uuid)
+        if organization_token is None:
+            raise AuthenticationFailed(_TOKEN_AUTH_FAILED)
+        return organization_token
+
     def check_organization(self, request):
         if 'organization' in request.data:
             raise AuthenticationFailed(
@@ -117,8 +152,47 @@ class TokenAuthorizationMixin(object):
         return super().get_serializer(*args, **kwargs)
 
 
-class AuthorizeView(TokenAuthorizationMixin, APIView):
+class CompactJSONRenderer(JSONRenderer):
+    """
+    renders compact JSON with ``freeradius.render_cached``
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return render_cached(data)
+
+
+def _set_content_length(response):
+    response['Content-Length'] = len(response.content)
+
+
+class CompactResponseMixin(object):
+    """
+    when ``API_COMPACT_RESPONSES`` is enabled, the responses to POST
+    requests are rendered by ``CompactJSONRenderer`` and have an
+    explicit ``Content-Length`` header
+    """
+
+    def get_renderers(self):
+        if app_settings.API_COMPACT_RESPONSES and self.request.method == 'POST':
+            return [CompactJSONRenderer()]
+        return super().get_renderers()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (
+            app_settings.API_COMPACT_RESPONSES
+            and request.method == 'POST'
+            and isinstance(response, Response)
+        ):
+            response.add_post_render_callback(_set_content_length)
+        return response
+
+
+class AuthorizeView(
+    CompactResponseMixin, InstrumentedViewMixin, TokenAuthorizationMixin, APIView
+):
     authentication_classes = (TokenAuthentication,)
+    metrics_endpoint = 'authorize'
     accept_attributes = {'control:Auth-Type': 'Accept'}
     accept_status = 200
     reject_attributes = {'control:Auth-Type': 'Reject'}
@@ -127,28 +201,48 @@ class AuthorizeView(TokenAuthorizationMixin, APIView):
     def post(self, request, *args, **kwargs):
         user = self.get_user(request)
         if user and self.authenticate_user(request, user):
+            if app_settings.API_AUTHORIZE_GROUP_POLICY:
+                return self.apply_group_policy(request, user)
             return Response(self.accept_attributes, status=self.accept_status)
         if app_settings.API_AUTHORIZE_REJECT:
             return Response(self.reject_attributes, status=self.reject_status)
         else:
             return Response(None, status=200)
 
+    def apply_group_policy(self, request, user):
+        """
+        evaluates the checks of the radius group of the user and
+        returns its attributes (see ``openwisp_radius.policy``)
+        """
+        accept, attributes = policy.authorize(request.auth, user, request.data)
+        if not accept:
+            return Response(
+                {**self.reject_attributes, **attributes}, status=self.reject_status
+            )
+        return Response(
+            {**self.accept_attributes, **attributes}, status=self.accept_status
+        )
+
     def get_user(self, request):
         """
         return active user or ``None``
         """
-        try:
-            user = User.objects.get(
-                username=request.data.get('username'), is_active=True
-            )
-            # ensure user is member of the authenticated org
-            if not OrganizationUser.objects.filter(
-                user=user, organization_id=request.auth
-            ).exists():
-                return None
-            return user
-        except User.DoesNotExist:
-            return None
+        key = (str(request.auth), request.data.get('username'))
+        with metrics.phase('user_lookup'):
+            user = authorize_cache.get(key)
+            if user is None:
+                loaded = time()
+                user = self.get_user_queryset(request).first()
+                if user is not None:
+                    authorize_cache.set(key, user, loaded=loaded)
+        return user
+
+    def get_user_queryset(self, request):
+        """
+        looks up the user, its membership to the authenticated
+        organization and its radius token with one query
+        """
+        return get_user_queryset(request.auth, request.data.get('username'))
 
     def authenticate_user(self, request, user):
         """
@@ -156,25 +250,17 @@ class AuthorizeView(TokenAuthorizationMixin, APIView):
         a valid user password or a valid user token
         can be overridden to implement more complex checks
         """
-        return user.check_password(
-            request.data.get('password')
-        ) or self.check_user_token(
-            request, user
-        )  # noqa
+        with metrics.phase('password_check'):
+            valid = check_password(user, request.data.get('password'))
+        return valid or self.check_user_token(request, user)
 
     def check_user_token(self, request, user):
         """
         returns ``True`` if the password value supplied is a valid
         radius user token
         """
-
-        try:
-            token = RadiusToken.objects.get(user=user, key=request.data.get('password'))
-        except RadiusToken.DoesNotExist:
-            token = None
-        if app_settings.DISPOSABLE_RADIUS_USER_TOKEN and token is not None:
-            token.delete()
-        return token is not None
+        with metrics.phase('token_check'):
+            return check_user_token(user, request.data.get('password'))
 
     def get_serializer(self, *args, **kwargs):
         # needed to avoid `'super' object has no attribute 'get_serializer'`
@@ -185,8 +271,112 @@ class AuthorizeView(TokenAuthorizationMixin, APIView):
 authorize = AuthorizeView.as_view()
 
 
-class PostAuthView(TokenAuthorizationMixin, generics.CreateAPIView):
+class AuthorizeBatchView(InstrumentedViewMixin, APIView):
+    """
+    POST: authorize several users (eg: the Access-Requests aggregated
+          by a radius proxy) sent as a JSON array or as newline
+          delimited JSON; returns the outcome of each request
+          in the same order
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    parser_classes = (JSONParser, NDJSONParser)
+    metrics_endpoint = 'authorize_batch'
+    accept_attributes = AuthorizeView.accept_attributes
+    reject_attributes = AuthorizeView.reject_attributes
+
+    def post(self, request, *args, **kwargs):
+        requests = request.data
+        if not isinstance(requests, list):
+            raise RestValidationError(
+                {'non_field_errors': [_('Expected a list of credentials.')]}
+            )
+        max_size = app_settings.API_AUTHORIZE_BATCH_MAX_SIZE
+        if len(requests) > max_size:
+            raise RestValidationError(
+                {
+                    'non_field_errors': [
+                        _('Batches cannot contain more than {} requests.').format(
+                            max_size
+                        )
+                    ]
+                }
+            )
+        results, validated = self.validate_requests(requests)
+        usernames = [data['username'] for result, data in validated]
+        users = get_users(request.auth, usernames)
+        found = [
+            (result, data, users[data['username']])
+            for result, data in validated
+            if data['username'] in users
+        ]
+        with metrics.phase('password_check'):
+            valid = check_passwords(
+                [(user, data.get('password')) for result, data, user in found]
+            )
+        for (result, data, user), is_valid in zip(found, valid):
+            if not is_valid:
+                with metrics.phase('token_check'):
+                    is_valid = check_user_token(user, data.get('password'))
+            if is_valid:
+                self.accept(result, user, data)
+        return Response(results)
+
+    def validate_requests(self, requests):
+        """
+        returns the list of results (one for each request, rejected
+        by default) and a list of (result, request) tuples
+        """
+        results = []
+        validated = []
+        for data in requests:
+            username = data.get('username') if isinstance(data, dict) else None
+            if not username or not isinstance(username, str):
+                results.append(
+                    {
+                        'username': None,
+                        'status': 'error',
+                        'errors': {'username': [_('This field is required.')]},
+                    }
+                )
+                continue
+            result = {
+                'username': username,
+                'status': 'reject',
+                'attributes': self.reject_attributes,
+            }
+            results.append(result)
+            validated.append((result, data))
+        return results, validated
+
+    def accept(self, result, user, data):
+        """
+        called for the users who supplied valid credentials,
+        applies the group policy if it is enabled
+        (see ``AuthorizeView.apply_group_policy``)
+        """
+        accept, attributes = True, {}
+        if app_settings.API_AUTHORIZE_GROUP_POLICY:
+            accept, attributes = policy.authorize(self.request.auth, user, data)
+        if accept:
+            result.update(
+                status='accept', attributes={**self.accept_attributes, **attributes}
+            )
+        else:
+            result['attributes'] = {**self.reject_attributes, **attributes}
+
+
+authorize_batch = AuthorizeBatchView.as_view()
+
+
+class PostAuthView(
+    CompactResponseMixin,
+    InstrumentedViewMixin,
+    TokenAuthorizationMixin,
+    generics.CreateAPIView,
+):
     authentication_classes = (TokenAuthentication,)
+    metrics_endpoint = 'postauth'
     serializer_class = RadiusPostAuthSerializer
 
     def post(self, request, *args, **kwargs):
@@ -198,14 +388,51 @@ class PostAuthView(TokenAuthorizationMixin, generics.CreateAPIView):
         response.data = None
         return response
 
+    def get_serializer_class(self):
+        if app_settings.API_POSTAUTH_WRITE_BEHIND:
+            return RadiusPostAuthWriteBehindSerializer
+        return super().get_serializer_class()
+
+    def perform_create(self, serializer):
+        if not app_settings.API_POSTAUTH_WRITE_BEHIND:
+            return super().perform_create(serializer)
+        # written in batches by a background thread
+        instance = RadiusPostAuth(
+            organization_id=self.request.auth, **serializer.validated_data
+        )
+        with metrics.phase('db_write'):
+            postauth_queue.put(instance)
+
 
 postauth = PostAuthView.as_view()
 
 
+class UsageView(CompactResponseMixin, InstrumentedViewMixin, APIView):
+    """
+    POST: returns the remaining session time and traffic of
+          the user as reply attributes, rejects the user if
+          a limit has been reached (see ``API_ACCOUNTING_COUNTERS``)
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    metrics_endpoint = 'usage'
+
+    def post(self, request, *args, **kwargs):
+        accept, attributes = counters.get_reply(
+            request.auth, request.data.get('username')
+        )
+        if not accept:
+            return Response({'control:Auth-Type': 'Reject', **attributes}, status=401)
+        return Response(attributes or None, status=200)
+
+
+usage = UsageView.as_view()
+
+
 # Radius Accounting
 class AccountingFilter(filters.FilterSet):
     start_time = filters.DateTimeFilter(field_name='start_time', lookup_expr='gte')
-    stop_time = filters.DateTimeFilter(field_name='stop_time', lookup_expr='lte')
+    stop_time = filters.DateTimeFilter(method='filter_stop_time')
     is_open = filters.BooleanFilter(
         field_name='stop_time', lookup_expr='isnull', label='Is Open'
     )
@@ -221,6 +448,14 @@ class AccountingFilter(filters.FilterSet):
             'is_open',
         )
 
+    def filter_stop_time(self, queryset, name, value):
+        # sessions stopped before ``value`` also started before it,
+        # the condition on the start time allows PostgreSQL to skip
+        # the partitions of the following months (ACCOUNTING_PARTITIONED)
+        return queryset.filter(
+            Q(start_time__lte=value) | Q(start_time__isnull=True), stop_time__lte=value,
+        )
+
 
 class AccountingViewPagination(drf_link_header_pagination.LinkHeaderPagination):
     page_size = 10
@@ -228,7 +463,12 @@ class AccountingViewPagination(drf_link_header_pagination.LinkHeaderPagination):
     max_page_size = 100
 
 
-class AccountingView(TokenAuthorizationMixin, generics.ListCreateAPIView):
+class AccountingView(
+    CompactResponseMixin,
+    InstrumentedViewMixin,
+    TokenAuthorizationMixin,
+    generics.ListCreateAPIView,
+):
     """
     HEADER: Pagination is provided using a Link header
             https://developer.github.com/v3/guides/traversing-with-pagination/
@@ -241,6 +481,7 @@ class AccountingView(TokenAuthorizationMixin, generics.ListCreateAPIView):
     """
 
     authentication_classes = (TokenAuthentication,)
+    metrics_endpoint = 'accounting'
     queryset = RadiusAccounting.objects.all().order_by('-start_time')
     serializer_class = RadiusAccountingSerializer
     pagination_class = AccountingViewPagination
@@ -253,9 +494,46 @@ class AccountingView(TokenAuthorizationMixin, generics.ListCreateAPIView):
         # hence  ignored right now - may be implemented in the future
         if status_type in ['Accounting-On', 'Accounting-Off']:
             return Response(None)
+        if app_settings.API_ACCOUNTING_UPSERT:
+            return self.upsert(request, *args, **kwargs)
         method = 'create' if status_type == 'Start' else 'update'
         return getattr(self, method)(request, *args, **kwargs)
 
+    def upsert(self, request, *args, **kwargs):
+        """
+        creates or updates the session with one write,
+        regardless of the order in which packets arrive
+        """
+        is_start = request.data['status_type'] == 'Start'
+        data = request.data.copy()
+        for field in ['session_time', 'input_octets', 'output_octets']:
+            if is_start and data.get(field) == "":
+                data[field] = 0
+        serializer = RadiusAccountingBatchSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        validated_data = serializer.validated_data
+        instance = RadiusAccounting(organization_id=request.auth, **validated_data)
+        if app_settings.API_ACCOUNTING_AUTO_GROUP and 'groupname' not in validated_data:
+            # only used if the session is created
+            try:
+                with metrics.phase('groupname_lookup'):
+                    instance.groupname = get_user_groupname(
+                        instance.username, request.auth
+                    )
+            except User.DoesNotExist:
+                pass
+        previous = None
+        if app_settings.API_ACCOUNTING_COUNTERS:
+            with metrics.phase('session_lookup'):
+                previous = counters.get_session_usage(request.auth, instance.unique_id)
+        with metrics.phase('db_write'):
+            saved = RadiusAccounting.objects.upsert(instance, validated_data.keys())
+        if not saved:
+            raise RestValidationError(_UNIQUE_ID_ERROR)
+        if app_settings.API_ACCOUNTING_COUNTERS:
+            counters.record_usage(request.auth, validated_data, previous)
+        return Response(None, status=201 if is_start else 200)
+
     def create(self, request, *args, **kwargs):
         is_start = request.data['status_type'] == 'Start'
         data = request.data.copy()  # import because request objects is immutable
@@ -267,7 +545,11 @@ class AccountingView(TokenAuthorizationMixin, generics.ListCreateAPIView):
         error_keys = serializer.errors.keys()
         errors = len(error_keys)
         if not errors:
-            self.perform_create(serializer)
+            if not self.create_session(serializer):
+                # inserted by a concurrent request
+                return self.update(request, *args, **kwargs)
+            if app_settings.API_ACCOUNTING_COUNTERS:
+                counters.record_usage(request.auth, serializer.validated_data)
             headers = self.get_success_headers(serializer.data)
             return Response(None, status=201, headers=headers)
         # trying to create a record which
@@ -277,35 +559,54 @@ class AccountingView(TokenAuthorizationMixin, generics.ListCreateAPIView):
         else:
             raise RestValidationError(serializer.errors)
 
+    def create_session(self, serializer):
+        """
+        returns ``False`` if the session already exists; partitioned
+        tables (``ACCOUNTING_PARTITIONED``) cannot reject duplicated
+        sessions, hence the inserts of the same session are serialized
+        and the existing sessions are looked up
+        """
+        if not app_settings.ACCOUNTING_PARTITIONED:
+            self.perform_create(serializer)
+            return True
+        unique_id = serializer.validated_data['unique_id']
+        with transaction.atomic():
+            if not RadiusAccounting.objects.lock_new_session(unique_id):
+                return False
+            self.perform_create(serializer)
+        return True
+
     def perform_create(self, serializer):
         if app_settings.API_ACCOUNTING_AUTO_GROUP:
-            user_model = get_user_model()
             username = serializer.validated_data.get('username', "")
             try:
-                user = user_model.objects.get(username=username)
+                # user may not have a group defined
+                with metrics.phase('groupname_lookup'):
+                    groupname = get_user_groupname(username, self.request.auth)
             except User.DoesNotExist:
                 logging.info(
                     'no corresponding user found ' 'for username: {}'.format(username)
                 )
                 serializer.save()
             else:
-                group = user.radiususergroup_set.order_by('priority').first()
-                # user may not have a group defined
-                groupname = group.groupname if group else None
                 serializer.save(groupname=groupname)
         else:
             return super().perform_create(serializer)
 
     def update(self, request, *args, **kwargs):
         try:
-            instance = self.get_queryset().get(unique_id=request.data['unique_id'])
+            with metrics.phase('session_lookup'):
+                instance = self.get_queryset().get(unique_id=request.data['unique_id'])
         # trying to update a record which
         # does not exist, fallback to create
         except RadiusAccounting.DoesNotExist:
             return self.create(request, *args, **kwargs)
+        previous = counters.get_instance_usage(instance)
         serializer = self.get_serializer(instance, data=request.data, partial=False)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        if app_settings.API_ACCOUNTING_COUNTERS:
+            counters.record_usage(request.auth, serializer.validated_data, previous)
         return Response(None)
 
     def _get_status_type(self, request):
@@ -321,6 +622,167 @@ class AccountingView(TokenAuthorizationMixin, generics.ListCreateAPIView):
 accounting = AccountingView.as_view()
 
 
+class AccountingBatchView(APIView):
+    """
+    POST: add or update several accounting packets (start, interim-update,
+          stop) sent as a JSON array or as newline delimited JSON;
+          returns the outcome of each packet in the same order
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    parser_classes = (JSONParser, NDJSONParser)
+
+    def post(self, request, *args, **kwargs):
+        packets = request.data
+        if not isinstance(packets, list):
+            raise RestValidationError(
+                {'non_field_errors': [_('Expected a list of accounting packets.')]}
+            )
+        max_size = app_settings.API_ACCOUNTING_BATCH_MAX_SIZE
+        if len(packets) > max_size:
+            raise RestValidationError(
+                {
+                    'non_field_errors': [
+                        _('Batches cannot contain more than {} packets.').format(
+                            max_size
+                        )
+                    ]
+                }
+            )
+        results, validated = self.validate_packets(packets)
+        with transaction.atomic():
+            self.save_packets(validated)
+        return Response(results)
+
+    def validate_packets(self, packets):
+        """
+        returns the list of results (one for each packet)
+        and a list of (result, validated_data) tuples
+        """
+        results = []
+        validated = []
+        for packet in packets:
+            if not isinstance(packet, dict):
+                results.append(
+                    {
+                        'unique_id': None,
+                        'status': 'error',
+                        'errors': {'non_field_errors': [_('Invalid packet.')]},
+                    }
+                )
+                continue
+            result = {'unique_id': packet.get('unique_id')}
+            results.append(result)
+            status_type = packet.get('status_type')
+            # Accounting-On and Accounting-Off are ignored
+            if status_type in ['Accounting-On', 'Accounting-Off']:
+                result['status'] = 'ignored'
+                continue
+            data = packet.copy()
+            if status_type == 'Start':
+                for field in ['session_time', 'input_octets', 'output_octets']:
+                    if data.get(field) == "":
+                        data[field] = 0
+            serializer = RadiusAccountingBatchSerializer(data=data)
+            if not serializer.is_valid():
+                result.update({'status': 'error', 'errors': serializer.errors})
+                continue
+            validated.append((result, serializer.validated_data))
+        return results, validated
+
+    def save_packets(self, validated):
+        """
+        resolves the existing sessions with one query
+        and writes the changes in bulk
+        """
+        organization_id = self.request.auth
+        unique_ids = {data['unique_id'] for result, data in validated}
+        if app_settings.ACCOUNTING_PARTITIONED:
+            # partitioned tables cannot reject duplicated sessions, the
+            # sessions are locked until the end of the transaction
+            RadiusAccounting.objects.lock_unique_ids(unique_ids)
+        existing = {
+            instance.unique_id: instance
+            for instance in RadiusAccounting.objects.filter(unique_id__in=unique_ids)
+        }
+        created = {}
+        updated = {}
+        update_fields = set()
+        usage = {}
+        for result, data in validated:
+            unique_id = data['unique_id']
+            instance = created.get(unique_id) or existing.get(unique_id)
+            if instance is None:
+                instance = RadiusAccounting(organization_id=organization_id, **data)
+                if not instance.start_time:
+                    instance.start_time = now()
+                created[unique_id] = instance
+                result['status'] = 'created'
+                self.add_usage(usage, instance, data)
+                continue
+            if str(instance.organization_id) != str(organization_id):
+                result.update({'status': 'error', 'errors': _UNIQUE_ID_ERROR})
+                continue
+            self.add_usage(usage, instance, data, counters.get_instance_usage(instance))
+            for field, value in data.items():
+                setattr(instance, field, value)
+            if unique_id not in created:
+                updated[unique_id] = instance
+                update_fields.update(data.keys())
+            result['status'] = 'updated'
+        if app_settings.API_ACCOUNTING_AUTO_GROUP:
+            self.set_groupnames(created.values())
+        RadiusAccounting.objects.bulk_create(created.values())
+        update_fields.discard('unique_id')
+        if updated:
+            RadiusAccounting.objects.bulk_update(updated.values(), update_fields)
+        for username, (session_time, traffic) in usage.items():
+            RadiusUserCounter.objects.add(
+                organization_id, username, session_time, traffic
+            )
+
+    def add_usage(self, usage, instance, data, previous=None):
+        """
+        sums the usage reported by the packets of each user, so
+        that counters are updated once per user (if enabled)
+        """
+        if not app_settings.API_ACCOUNTING_COUNTERS or not instance.username:
+            return
+        session_time, traffic = counters.get_usage_delta(data, previous)
+        if session_time or traffic:
+            total_time, total_traffic = usage.get(instance.username, (0, 0))
+            usage[instance.username] = (
+                total_time + session_time,
+                total_traffic + traffic,
+            )
+
+    def set_groupnames(self, instances):
+        """
+        fills the groupname of new sessions
+        (see ``AccountingView.perform_create``)
+        """
+        usernames = {instance.username for instance in instances if instance.username}
+        if not usernames:
+            return
+        groupnames = {}
+        # the group with the highest priority (lowest number) is the last one
+        queryset = (
+            RadiusUserGroup.objects.filter(
+                Q(group__organization_id=self.request.auth) | Q(group__isnull=True),
+                user__username__in=usernames,
+            )
+            .order_by('-priority')
+            .values_list('user__username', 'groupname')
+        )
+        for username, groupname in queryset:
+            groupnames[username] = groupname
+        for instance in instances:
+            instance.groupname = groupnames.get(instance.username)
+
+
+accounting_batch = AccountingBatchView.as_view()
+
+
 class BatchView(TokenAuthorizationMixin, generics.CreateAPIView):
     authentication_classes = (TokenAuthentication,)
     queryset = RadiusBatch.objects.all()
@@ -341,6 +803,9 @@ class BatchView(TokenAuthorizationMixin, generics.CreateAPIView):
                     csvfile=csvfile,
                 )
                 batch = self._create_batch(serializer, **options)
+                if app_settings.BATCH_JOB_WORKERS:
+                    batch.schedule()
+                    return self._accepted(batch)
                 batch.csvfile_upload(csvfile)
                 response = RadiusBatchSerializer(batch)
             elif strategy == 'prefix':
@@ -353,6 +818,9 @@ class BatchView(TokenAuthorizationMixin, generics.CreateAPIView):
                 )
                 batch = self._create_batch(serializer, **options)
                 number_of_users = int(request.data['number_of_users'])
+                if app_settings.BATCH_JOB_WORKERS:
+                    batch.schedule(number_of_users=number_of_users)
+                    return self._accepted(batch)
                 batch.prefix_add(prefix, number_of_users)
                 response = RadiusBatchSerializer(batch)
             return Response(response.data, status=status.HTTP_201_CREATED)
@@ -364,10 +832,38 @@ class BatchView(TokenAuthorizationMixin, generics.CreateAPIView):
         options.update(kwargs)
         return RadiusBatch(**options)
 
+    def _accepted(self, batch):
+        """
+        the users are added in background (see ``BATCH_JOB_WORKERS``),
+        the status of the operation can be polled at the returned url
+        """
+        data = RadiusBatchStatusSerializer(
+            batch, context=self.get_serializer_context()
+        ).data
+        return Response(
+            data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['url']}
+        )
+
 
 batch = BatchView.as_view()
 
 
+class BatchDetailView(generics.RetrieveAPIView):
+    """
+    returns the status of a batch user creation operation
+    of the organization (see ``BATCH_JOB_WORKERS``)
+    """
+
+    authentication_classes = (TokenAuthentication,)
+    serializer_class = RadiusBatchStatusSerializer
+
+    def get_queryset(self):
+        return RadiusBatch.objects.filter(organization_id=self.request.auth)
+
+
+batch_detail = BatchDetailView.as_view()
+
+
 class DispatchOrgMixin(object):
     def dispatch(self, *args, **kwargs):
         try:
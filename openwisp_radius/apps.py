@@ -2,16 +2,22 @@ import swapper
 from django.apps import AppConfig
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.utils.translation import ugettext_lazy as _
 
 from .receivers import (
+    authorize_cache_related_handler,
+    authorize_cache_user_handler,
     create_default_groups_handler,
+    group_policy_handler,
+    groupname_cache_user_handler,
+    groupname_cache_usergroup_handler,
     organization_post_save,
     organization_pre_save,
+    password_cache_user_handler,
     set_default_group_handler,
 )
-from .utils import update_user_related_records
+from .utils import load_model, update_user_related_records
 
 
 class OpenwispRadiusConfig(AppConfig):
@@ -27,6 +33,8 @@ class OpenwispRadiusConfig(AppConfig):
         OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
         Organization = swapper.load_model('openwisp_users', 'Organization')
         User = get_user_model()
+        RadiusToken = load_model('RadiusToken')
+        RadiusUserGroup = load_model('RadiusUserGroup')
 
         post_save.connect(
             create_default_groups_handler,
@@ -53,6 +61,82 @@ class OpenwispRadiusConfig(AppConfig):
             sender=Organization,
             dispatch_uid='openwisp_radius_org_post_save',
         )
+        self.connect_authorize_cache_signals(User, OrganizationUser, RadiusToken)
+        self.connect_groupname_cache_signals(User, RadiusUserGroup)
+        self.connect_password_cache_signals(User)
+        self.connect_group_policy_signals(
+            load_model('RadiusGroupCheck'), load_model('RadiusGroupReply')
+        )
+
+    def connect_authorize_cache_signals(self, User, OrganizationUser, RadiusToken):
+        """
+        invalidates the users cached by the authorize endpoint
+        """
+        for signal in (post_save, post_delete):
+            signal_name = 'save' if signal is post_save else 'delete'
+            signal.connect(
+                authorize_cache_user_handler,
+                sender=User,
+                dispatch_uid=f'authorize_cache_user_{signal_name}',
+            )
+            signal.connect(
+                authorize_cache_related_handler,
+                sender=OrganizationUser,
+                dispatch_uid=f'authorize_cache_organizationuser_{signal_name}',
+            )
+            signal.connect(
+                authorize_cache_related_handler,
+                sender=RadiusToken,
+                dispatch_uid=f'authorize_cache_radiustoken_{signal_name}',
+            )
+
+    def connect_groupname_cache_signals(self, User, RadiusUserGroup):
+        """
+        invalidates the groupnames cached for the accounting endpoint
+        (changes to radius groups are handled in ``RadiusGroup.save``)
+        """
+        for signal in (post_save, post_delete):
+            signal_name = 'save' if signal is post_save else 'delete'
+            signal.connect(
+                groupname_cache_user_handler,
+                sender=User,
+                dispatch_uid=f'groupname_cache_user_{signal_name}',
+            )
+            signal.connect(
+                groupname_cache_usergroup_handler,
+                sender=RadiusUserGroup,
+                dispatch_uid=f'groupname_cache_radiususergroup_{signal_name}',
+            )
+
+    def connect_password_cache_signals(self, User):
+        """
+        invalidates the passwords verified by the authorize endpoint
+        """
+        for signal in (post_save, post_delete):
+            signal_name = 'save' if signal is post_save else 'delete'
+            signal.connect(
+                password_cache_user_handler,
+                sender=User,
+                dispatch_uid=f'password_cache_user_{signal_name}',
+            )
+
+    def connect_group_policy_signals(self, RadiusGroupCheck, RadiusGroupReply):
+        """
+        invalidates the group policies compiled for the authorize endpoint
+        (changes to radius groups are handled in ``RadiusGroup.save``)
+        """
+        for signal in (post_save, post_delete):
+            signal_name = 'save' if signal is post_save else 'delete'
+            signal.connect(
+                group_policy_handler,
+                sender=RadiusGroupCheck,
+                dispatch_uid=f'group_policy_radiusgroupcheck_{signal_name}',
+            )
+            signal.connect(
+                group_policy_handler,
+                sender=RadiusGroupReply,
+                dispatch_uid=f'group_policy_radiusgroupreply_{signal_name}',
+            )
 
     def add_default_menu_items(self):
         menu_setting = 'OPENWISP_DEFAULT_ADMIN_MENU_ITEMS'
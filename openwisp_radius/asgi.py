@@ -0,0 +1,225 @@
+"""
+ASGI application serving the API endpoints consumed by freeradius
+(authorize, postauth, accounting, usage) without blocking the event loop.
+
+Database access runs in a bounded thread pool and each organization
+can use only a limited number of threads at the same time, so that
+a slow organization cannot exhaust the workers of the others.
+
+Usage (``asgi.py`` of the django project)::
+
+    from django.core.asgi import get_asgi_application
+
+    django_application = get_asgi_application()
+
+    from openwisp_radius.asgi import FreeradiusApplication  # noqa
+
+    application = FreeradiusApplication(fallback=django_application)
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import QueryDict
+
+from . import settings as app_settings
+from .api import freeradius
+from .api.freeradius import FreeradiusError, render
+
+logger = logging.getLogger(__name__)
+
+_JSON_HEADERS = [(b'content-type', b'application/json')]
+
+
+class FreeradiusApplication(object):
+    """
+    Serves ``POST {prefix}authorize/``, ``POST {prefix}postauth/``,
+    ``POST {prefix}accounting/`` and ``POST {prefix}usage/``, any other
+    request is passed to the ``fallback`` ASGI application (if any)
+    """
+
+    functions = {
+        'authorize/': freeradius.authorize,
+        'postauth/': freeradius.postauth,
+        'accounting/': freeradius.accounting,
+        'usage/': freeradius.usage,
+    }
+
+    def __init__(
+        self,
+        fallback=None,
+        prefix='/api/v1/',
+        executor=None,
+        organization_concurrency=None,
+        queue_timeout=None,
+    ):
+        self.fallback = fallback
+        self.paths = {
+            f'{prefix}{path}': function for path, function in self.functions.items()
+        }
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=app_settings.ASGI_THREADS,
+            thread_name_prefix='openwisp-radius-asgi',
+        )
+        self.organization_concurrency = (
+            organization_concurrency or app_settings.ASGI_ORGANIZATION_CONCURRENCY
+        )
+        self.queue_timeout = (
+            app_settings.ASGI_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        )
+        self._semaphores = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        function = self.paths.get(scope.get('path'))
+        if scope['type'] != 'http' or function is None or scope['method'] != 'POST':
+            if self.fallback is None:
+                return await self.send_response(send, 404, {'detail': 'Not found.'})
+            return await self.fallback(scope, receive, send)
+        try:
+            body = await self.read_body(receive)
+        except FreeradiusError as e:
+            return await self.send_response(send, e.status, e.detail)
+        status, body = await self.handle(function, scope, body)
+        await self.send_response(send, status, body)
+
+    async def handle(self, function, scope, body):
+        """
+        returns the ``(status, body)`` tuple of the response
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            data = self.parse_body(scope, body)
+            uuid, token = freeradius.get_uuid_token(*self.get_params(scope))
+            # semaphores are created only for authenticated organizations
+            organization_id = await loop.run_in_executor(
+                self.executor, self.authenticate, uuid, token, data
+            )
+        except FreeradiusError as e:
+            return e.status, render(e.detail)
+        semaphore = self.acquire_semaphore(organization_id)
+        try:
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f'too many concurrent requests for organization {organization_id}'
+                )
+                return 503, render({'detail': 'Too many concurrent requests.'})
+            try:
+                return await loop.run_in_executor(
+                    self.executor, self.respond, function, organization_id, data
+                )
+            finally:
+                semaphore.release()
+        finally:
+            self.release_semaphore(organization_id)
+
+    def authenticate(self, uuid, token, data):
+        """
+        executed in the thread pool, returns
+        the normalized uuid of the organization
+        """
+        close_old_connections()
+        try:
+            return freeradius.authenticate_request(uuid, token, data)
+        finally:
+            close_old_connections()
+
+    def respond(self, function, organization_id, data):
+        """
+        executed in the thread pool
+        """
+        close_old_connections()
+        try:
+            return freeradius.respond_authenticated(function, organization_id, data)
+        finally:
+            close_old_connections()
+
+    def acquire_semaphore(self, key):
+        """
+        returns the semaphore which limits the concurrent requests
+        of an organization (identified by its normalized uuid);
+        semaphores are discarded when no request is using them
+        """
+        if key not in self._semaphores:
+            semaphore = asyncio.Semaphore(self.organization_concurrency)
+            self._semaphores[key] = [semaphore, 0]
+        self._semaphores[key][1] += 1
+        return self._semaphores[key][0]
+
+    def release_semaphore(self, key):
+        self._semaphores[key][1] -= 1
+        if not self._semaphores[key][1]:
+            del self._semaphores[key]
+
+    def get_params(self, scope):
+        """
+        returns the query string parameters and the
+        headers of the request in the format of ``request.META``
+        """
+        query_params = QueryDict(scope.get('query_string', b'').decode('latin-1'))
+        meta = {}
+        for name, value in scope.get('headers', []):
+            key = 'HTTP_' + name.decode('latin-1').upper().replace('-', '_')
+            meta[key] = value.decode('latin-1')
+        return query_params, meta
+
+    def parse_body(self, scope, body):
+        content_type = b''
+        for name, value in scope.get('headers', []):
+            if name.lower() == b'content-type':
+                content_type = value.split(b';')[0].strip().lower()
+        if content_type == b'application/json':
+            return freeradius.parse_json(body)
+        try:
+            return QueryDict(body.decode('utf-8')).dict()
+        except UnicodeDecodeError:
+            raise FreeradiusError(400, {'detail': 'Invalid encoding.'})
+
+    async def read_body(self, receive):
+        """
+        raises ``FreeradiusError`` if the body is
+        larger than ``DATA_UPLOAD_MAX_MEMORY_SIZE``
+        """
+        max_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise FreeradiusError(
+                    413,
+                    {
+                        'detail': 'Request body exceeded '
+                        'settings.DATA_UPLOAD_MAX_MEMORY_SIZE.'
+                    },
+                )
+            chunks.append(chunk)
+            more_body = message.get('more_body', False)
+        return b''.join(chunks)
+
+    async def send_response(self, send, status, body):
+        if not isinstance(body, bytes):
+            body = render(body)
+        headers = _JSON_HEADERS + [(b'content-length', str(len(body)).encode())]
+        await send(
+            {'type': 'http.response.start', 'status': status, 'headers': headers}
+        )
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
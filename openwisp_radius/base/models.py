@@ -1,10 +1,8 @@
-import csv
 import logging
 import os
 from base64 import encodestring
 from datetime import timedelta
 from hashlib import md5, sha1
-from io import StringIO
 from os import urandom
 
 import swapper
@@ -12,9 +10,9 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
-from django.db import models
-from django.db.models import Count, ProtectedError
+from django.core.mail import get_connection, send_mass_mail
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Count, F, ProtectedError
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.utils.timezone import now
@@ -25,8 +23,15 @@ from passlib.hash import lmhash, nthash, sha512_crypt
 from openwisp_users.mixins import OrgMixin
 from openwisp_utils.base import KeyField, TimeStampedEditableModel, UUIDModel
 
-from .. import exceptions
+from .. import exceptions, jobs
 from .. import settings as app_settings
+from ..cache import (
+    delete_organization_token,
+    invalidate_group_policy_cache,
+    invalidate_groupname_cache,
+    set_organization_token,
+)
+from ..provisioning import BulkUserCreator, chunked
 from ..settings import (
     BATCH_DEFAULT_PASSWORD_LENGTH,
     BATCH_MAIL_MESSAGE,
@@ -35,10 +40,10 @@ from ..settings import (
 )
 from ..utils import (
     SmsMessage,
-    find_available_username,
     generate_pdf,
     generate_sms_token,
     get_sms_default_valid_until,
+    iter_csv_rows,
     load_model,
     prefix_generate_users,
     validate_csvfile,
@@ -139,6 +144,13 @@ RADCHECK_ATTRIBUTE_TYPES += RADCHECK_PASSWD_TYPE
 
 STRATEGIES = (('prefix', _('Generate from prefix')), ('csv', _('Import from CSV')))
 
+BATCH_STATUSES = (
+    ('pending', _('pending')),
+    ('running', _('running')),
+    ('done', _('done')),
+    ('failed', _('failed')),
+)
+
 
 class BaseModel(TimeStampedEditableModel):
     id = None
@@ -325,6 +337,135 @@ class AbstractRadiusReply(OrgMixin, AutoUsernameMixin, BaseModel):
         return self.username
 
 
+class AbstractRadiusAccountingManager(models.Manager):
+    def upsert(self, instance, update_fields):
+        """
+        Inserts ``instance`` or, if a session with the same ``unique_id``
+        already exists in the same organization, updates ``update_fields``,
+        using a single statement on PostgreSQL, MySQL and SQLite.
+        Returns ``False`` if ``unique_id`` belongs to a session of another
+        organization (which is left untouched), ``True`` otherwise.
+        On MySQL sessions of other organizations are left untouched too,
+        but the conflict cannot be detected and ``True`` is returned.
+        Partitioned tables (see ``ACCOUNTING_PARTITIONED``) do not have
+        a unique index on ``unique_id``, hence a select is executed first.
+        """
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        opts = self.model._meta
+        if not instance.start_time:
+            instance.start_time = now()
+        fields = [field for field in opts.concrete_fields if not field.primary_key]
+        update_fields = [
+            field
+            for field in fields
+            if field.name in update_fields and field.name != 'unique_id'
+        ]
+        if (
+            connection.vendor not in ['postgresql', 'mysql', 'sqlite']
+            or app_settings.ACCOUNTING_PARTITIONED
+        ):
+            return self._upsert_fallback(instance, update_fields, db)
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        organization = qn(opts.get_field('organization').column)
+        params = [
+            field.get_db_prep_save(field.pre_save(instance, True), connection)
+            for field in fields
+        ]
+        sql = 'INSERT INTO {table} ({columns}) VALUES ({values}) '.format(
+            table=table,
+            columns=', '.join(qn(field.column) for field in fields),
+            values=', '.join(['%s'] * len(fields)),
+        )
+        if connection.vendor == 'mysql':
+            # rows of other organizations are assigned their current values
+            assignments = [
+                '{0} = IF({1} = VALUES({1}), VALUES({0}), {0})'.format(
+                    qn(field.column), organization
+                )
+                for field in update_fields
+            ]
+            # ON DUPLICATE KEY UPDATE requires at least one assignment
+            assignments = assignments or [f'{organization} = {organization}']
+            sql += 'ON DUPLICATE KEY UPDATE {}'.format(', '.join(assignments))
+        else:
+            assignments = [
+                '{0} = EXCLUDED.{0}'.format(qn(field.column)) for field in update_fields
+            ]
+            # the WHERE clause must be present even if there's nothing to
+            # update, otherwise conflicts with other organizations would
+            # not be detected
+            assignments = assignments or [f'{organization} = EXCLUDED.{organization}']
+            sql += (
+                'ON CONFLICT ({unique_id}) DO UPDATE SET {assignments} '
+                'WHERE {table}.{organization} = EXCLUDED.{organization}'
+            ).format(
+                unique_id=qn(opts.get_field('unique_id').column),
+                assignments=', '.join(assignments),
+                table=table,
+                organization=organization,
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount > 0
+
+    def lock_unique_id(self, unique_id, using=None):
+        """
+        Locks ``unique_id`` until the end of the current transaction
+        (PostgreSQL only): partitioned tables do not have a unique index
+        on ``unique_id``, hence the transactions which insert a session
+        must be serialized in order to avoid duplicates.
+        """
+        self.lock_unique_ids([unique_id], using=using)
+
+    def lock_unique_ids(self, unique_ids, using=None):
+        """
+        Same as ``lock_unique_id`` for several sessions with one query,
+        the locks are acquired in order to avoid deadlocks.
+        """
+        connection = connections[using or router.db_for_write(self.model)]
+        if connection.vendor != 'postgresql' or not unique_ids:
+            return
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(hashtext(key)) '
+                'FROM (SELECT unnest(%s) AS key ORDER BY key) AS keys',
+                [sorted('{}:{}'.format(table, unique_id) for unique_id in unique_ids)],
+            )
+
+    def lock_new_session(self, unique_id, using=None):
+        """
+        Locks ``unique_id`` (see ``lock_unique_id``) and returns ``True``
+        if there isn't any session with this ``unique_id`` yet; must be
+        called in the transaction which inserts the session when
+        ``ACCOUNTING_PARTITIONED`` is enabled.
+        """
+        self.lock_unique_id(unique_id, using=using)
+        return not self.using(using).filter(unique_id=unique_id).exists()
+
+    def _upsert_fallback(self, instance, update_fields, db):
+        queryset = self.using(db).filter(unique_id=instance.unique_id)
+        with transaction.atomic(using=db):
+            # select_for_update cannot lock rows which do not exist yet
+            self.lock_unique_id(instance.unique_id, using=db)
+            existing = queryset.select_for_update().only('organization').first()
+            if existing is None:
+                instance.save(using=db, force_insert=True)
+                return True
+            if str(existing.organization_id) != str(instance.organization_id):
+                return False
+            if update_fields:
+                queryset.update(
+                    **{
+                        field.name: getattr(instance, field.attname)
+                        for field in update_fields
+                    }
+                )
+        return True
+
+
 class AbstractRadiusAccounting(OrgMixin, models.Model):
     id = models.BigAutoField(primary_key=True, db_column='radacctid')
     session_id = models.CharField(
@@ -501,6 +642,8 @@ class AbstractRadiusAccounting(OrgMixin, models.Model):
         blank=True,
     )
 
+    objects = AbstractRadiusAccountingManager()
+
     def save(self, *args, **kwargs):
         if not self.start_time:
             self.start_time = now()
@@ -516,6 +659,82 @@ class AbstractRadiusAccounting(OrgMixin, models.Model):
         return self.unique_id
 
 
+class AbstractRadiusUserCounterManager(models.Manager):
+    def add(self, organization_id, username, session_time, traffic):
+        """
+        adds ``session_time`` (seconds) and ``traffic`` (octets) to
+        the daily and lifetime counters of ``username``, the daily
+        counters are reset when the first usage of a new day is added
+        """
+        today = timezone.localdate()
+        queryset = self.filter(organization_id=organization_id, username=username)
+        for attempt in range(2):
+            # "day" is updated last because MySQL evaluates
+            # the assignments from left to right
+            updated = queryset.update(
+                daily_session_time=models.Case(
+                    models.When(day=today, then=F('daily_session_time') + session_time),
+                    default=models.Value(session_time),
+                ),
+                daily_traffic=models.Case(
+                    models.When(day=today, then=F('daily_traffic') + traffic),
+                    default=models.Value(traffic),
+                ),
+                total_session_time=F('total_session_time') + session_time,
+                total_traffic=F('total_traffic') + traffic,
+                day=today,
+            )
+            if updated or attempt:
+                return
+            try:
+                with transaction.atomic():
+                    self.create(
+                        organization_id=organization_id,
+                        username=username,
+                        day=today,
+                        daily_session_time=session_time,
+                        daily_traffic=traffic,
+                        total_session_time=session_time,
+                        total_traffic=traffic,
+                    )
+                return
+            except IntegrityError:
+                # created concurrently by another request
+                continue
+
+
+class AbstractRadiusUserCounter(OrgMixin, models.Model):
+    """
+    Usage of each user, kept up to date by the accounting
+    endpoints in order to enforce the session limits
+    (see ``openwisp_radius.counters``)
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    username = models.CharField(verbose_name=_('username'), max_length=64)
+    day = models.DateField(verbose_name=_('day'))
+    daily_session_time = models.BigIntegerField(
+        verbose_name=_('daily session time'), default=0
+    )
+    daily_traffic = models.BigIntegerField(verbose_name=_('daily traffic'), default=0)
+    total_session_time = models.BigIntegerField(
+        verbose_name=_('total session time'), default=0
+    )
+    total_traffic = models.BigIntegerField(verbose_name=_('total traffic'), default=0)
+
+    objects = AbstractRadiusUserCounterManager()
+
+    class Meta:
+        db_table = 'radusercounter'
+        verbose_name = _('user counter')
+        verbose_name_plural = _('user counters')
+        unique_together = ('organization', 'username')
+        abstract = True
+
+    def __str__(self):
+        return self.username
+
+
 class AbstractNas(OrgMixin, BaseModel):
     name = models.CharField(
         verbose_name=_('name'),
@@ -604,6 +823,9 @@ class AbstractRadiusGroup(OrgMixin, BaseModel):
             self.radiusgroupcheck_set.update(groupname=self.name)
             self.radiusgroupreply_set.update(groupname=self.name)
             self.radiususergroup_set.update(groupname=self.name)
+            # the update above doesn't send any signal
+            invalidate_groupname_cache()
+            invalidate_group_policy_cache()
         return result
 
     _DEFAULT_VALIDATION_ERROR = _(
@@ -767,8 +989,13 @@ class AbstractRadiusPostAuth(OrgMixin, models.Model):
         blank=True,
         null=True,
     )
+    # not auto_now_add: the date of the instances written in
+    # batches by the write-behind queue is set when they are queued
     date = models.DateTimeField(
-        verbose_name=_('date'), db_column='authdate', auto_now_add=True
+        verbose_name=_('date'),
+        db_column='authdate',
+        default=timezone.now,
+        editable=False,
     )
 
     class Meta:
@@ -827,6 +1054,27 @@ class AbstractRadiusBatch(OrgMixin, TimeStampedEditableModel):
         blank=True,
         help_text=_('If left blank users will never expire'),
     )
+    status = models.CharField(
+        _('status'),
+        max_length=8,
+        choices=BATCH_STATUSES,
+        default='pending',
+        help_text=_('Status of the creation of the users of the batch'),
+    )
+    processed_users = models.PositiveIntegerField(
+        _('processed users'),
+        default=0,
+        help_text=_('Number of users added to the batch so far'),
+    )
+    total_users = models.PositiveIntegerField(
+        _('total users'),
+        null=True,
+        blank=True,
+        help_text=_('Number of users to add (unknown for CSV files)'),
+    )
+    error = models.TextField(
+        _('error'), blank=True, help_text=_('Reason why the batch failed')
+    )
 
     class Meta:
         db_table = 'radbatch'
@@ -838,6 +1086,15 @@ class AbstractRadiusBatch(OrgMixin, TimeStampedEditableModel):
     def __str__(self):
         return self.name
 
+    def clean_fields(self, exclude=None):
+        super().clean_fields(exclude)
+        # excluded by csvfile_upload, which validates the rows while importing
+        if self.strategy == 'csv' and self.csvfile and 'csvfile' not in (exclude or []):
+            try:
+                validate_csvfile(self.csvfile.file)
+            except ValidationError as e:
+                raise ValidationError({'csvfile': e.messages})
+
     def clean(self):
         if self.strategy == 'csv' and not self.csvfile:
             raise ValidationError(
@@ -857,92 +1114,156 @@ class AbstractRadiusBatch(OrgMixin, TimeStampedEditableModel):
             raise ValidationError(
                 _('Mixing fields of different strategies'), code='invalid'
             )
-        if self.strategy == 'csv':
-            validate_csvfile(self.csvfile.file)
         super().clean()
 
     def add(self, reader, password_length=BATCH_DEFAULT_PASSWORD_LENGTH):
-        users_list = []
-        generated_passwords = []
-        for row in reader:
-            if len(row) == 5:
-                user, password = self.get_or_create_user(
-                    row, users_list, password_length
+        """
+        adds the users of the CSV rows in ``reader`` to the batch in chunks
+        (see ``openwisp_radius.provisioning``), the users whose password
+        has been generated receive it by email
+        """
+        creator = BulkUserCreator(self, password_length)
+        try:
+            creator.add(reader)
+        finally:
+            # each chunk is committed in its own transaction, the users of
+            # the chunks committed before an error (eg: an invalid row)
+            # receive their password too
+            try:
+                self.send_passwords(creator.iter_generated_passwords())
+            finally:
+                creator.close()
+
+    def send_passwords(self, generated_passwords):
+        """
+        sends the ``[username, password, email]`` lists of
+        ``generated_passwords`` by email, in chunks, using one connection
+        """
+        with get_connection() as connection:
+            for chunk in chunked(
+                generated_passwords, app_settings.BATCH_BULK_CHUNK_SIZE
+            ):
+                send_mass_mail(
+                    [
+                        (
+                            BATCH_MAIL_SUBJECT,
+                            BATCH_MAIL_MESSAGE.format(username, password),
+                            BATCH_MAIL_SENDER,
+                            [user_email],
+                        )
+                        for username, password, user_email in chunk
+                    ],
+                    connection=connection,
                 )
-                users_list.append(user)
-                if password:
-                    generated_passwords.append(password)
-        for user in users_list:
-            self.save_user(user)
-        for element in generated_passwords:
-            username, password, user_email = element
-            send_mail(
-                BATCH_MAIL_SUBJECT,
-                BATCH_MAIL_MESSAGE.format(username, password),
-                BATCH_MAIL_SENDER,
-                [user_email],
-            )
 
     def csvfile_upload(self, csvfile, password_length=BATCH_DEFAULT_PASSWORD_LENGTH):
-        csv_data = csvfile.read()
-        csv_data = csv_data.decode('utf-8') if isinstance(csv_data, bytes) else csv_data
-        reader = csv.reader(StringIO(csv_data), delimiter=',')
-        self.full_clean()
+        """
+        imports the users of ``csvfile`` in a single pass: the file is
+        read incrementally and its rows are validated while they are
+        imported (see ``iter_csv_rows``), if a row is invalid the batch
+        fails and keeps the users of the chunks imported before it
+        """
+        self.full_clean(exclude=['csvfile'])
         self.save()
-        self.add(reader, password_length)
+        # saving the batch may have read the file
+        csvfile.seek(0)
+        self.process(password_length=password_length, csvfile=csvfile)
 
     def prefix_add(self, prefix, n, password_length=BATCH_DEFAULT_PASSWORD_LENGTH):
+        self.prefix = prefix
+        self.total_users = n
         self.save()
-        users_list, user_password = prefix_generate_users(prefix, n, password_length)
-        for user in users_list:
-            user.full_clean()
-            self.save_user(user)
-        pdf_file = generate_pdf(prefix, {'users': user_password})
-        pdf_file.name = f'{prefix}.pdf'
+        self.process(number_of_users=n, password_length=password_length)
+
+    def generate_users(self, n, password_length=BATCH_DEFAULT_PASSWORD_LENGTH):
+        """
+        adds ``n`` users generated with ``prefix`` and stores
+        their credentials in a PDF file (see ``prefix_add``)
+        """
+        users_list, user_password = prefix_generate_users(
+            self.prefix, n, password_length
+        )
+        BulkUserCreator(self).add_users(users_list)
+        pdf_file = generate_pdf(self.prefix, {'users': user_password})
+        pdf_file.name = f'{self.prefix}.pdf'
         self.pdf = pdf_file
         self.full_clean()
         self.save()
 
-    def get_or_create_user(self, row, users_list, password_length):
-        User = get_user_model()
-        username, password, email, first_name, last_name = row
-        if email and User.objects.filter(email=email).exists():
-            user = User.objects.get(email=email)
-            return user, None
-        generated_password = None
-        username, password, email, first_name, last_name = row
-        if not username and email:
-            username = email.split('@')[0]
-        username = find_available_username(username, users_list)
-        user = User(
-            username=username, email=email, first_name=first_name, last_name=last_name
+    def schedule(
+        self, number_of_users=None, password_length=BATCH_DEFAULT_PASSWORD_LENGTH
+    ):
+        """
+        saves the batch as pending and adds its users in a worker thread
+        (see ``openwisp_radius.jobs``), the CSV file is read from the storage
+        """
+        self.full_clean(exclude=['csvfile'])
+        self.status = 'pending'
+        self.total_users = number_of_users if self.strategy == 'prefix' else None
+        self.save()
+        jobs.submit(
+            self, number_of_users=number_of_users, password_length=password_length
         )
-        cleartext_delimiter = 'cleartext$'
-        if not password:
-            password = get_random_string(length=password_length)
-            user.set_password(password)
-            generated_password = [username, password, email]
-        elif password and password.startswith(cleartext_delimiter):
-            password = password[len(cleartext_delimiter) :]
-            user.set_password(password)
-        else:
-            user.password = password
-        user.full_clean()
-        return user, generated_password
 
-    def save_user(self, user):
-        OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
-        user.save()
-        self.users.add(user)
-        if OrganizationUser.objects.filter(
-            user=user, organization=self.organization
-        ).exists():
-            return
-        obj = OrganizationUser(
-            user=user, organization=self.organization, is_admin=False
-        )
-        obj.full_clean()
-        obj.save()
+    def process(
+        self,
+        number_of_users=None,
+        password_length=BATCH_DEFAULT_PASSWORD_LENGTH,
+        csvfile=None,
+    ):
+        """
+        adds the users of the saved batch (from ``csvfile``, which defaults
+        to the stored CSV file, or generated with ``prefix``) keeping track
+        of the status of the operation, failures are stored in ``error``
+        """
+        self.set_status('running')
+        try:
+            if self.strategy == 'prefix':
+                self.generate_users(number_of_users, password_length)
+            elif csvfile is not None:
+                self.add(iter_csv_rows(csvfile), password_length)
+            else:
+                with self.csvfile.open('rb') as csvfile:
+                    self.add(iter_csv_rows(csvfile), password_length)
+        except Exception as e:
+            error = '\n'.join(e.messages) if isinstance(e, ValidationError) else e
+            # the users of the failed chunk have not been added
+            self.processed_users = self.users.count()
+            self.set_status('failed', error=str(error))
+            raise
+        self.set_status('done')
+
+    def set_status(self, status, error=''):
+        """
+        the number of processed users is saved with the final status
+        """
+        self.status = status
+        self.error = error
+        update_fields = ['status', 'error', 'modified']
+        if status != 'running':
+            update_fields.append('processed_users')
+        self.save(update_fields=update_fields)
+        if status != 'running':
+            cache.delete(self.get_progress_cache_key())
+
+    def get_progress_cache_key(self):
+        return f'openwisp_radius:batch_progress:{self.pk}'
+
+    def set_progress(self, processed_users):
+        """
+        the progress is stored in the django cache (instead of saving the
+        batch after each chunk), where the other processes can read it
+        while the batch is running (see ``get_processed_users``)
+        """
+        self.processed_users = processed_users
+        cache.set(self.get_progress_cache_key(), processed_users)
+
+    def get_processed_users(self):
+        if self.status == 'running':
+            processed_users = cache.get(self.get_progress_cache_key())
+            if processed_users is not None:
+                return processed_users
+        return self.processed_users
 
     def delete(self):
         self.users.all().delete()
@@ -964,6 +1285,28 @@ class AbstractRadiusBatch(OrgMixin, TimeStampedEditableModel):
                 os.remove(path)
 
 
+class AbstractRadiusTokenManager(models.Manager):
+    def verify(self, user, key, consume=None):
+        """
+        Returns ``True`` if ``key`` is the radius token of ``user``.
+        If ``consume`` is ``True`` (default: ``DISPOSABLE_RADIUS_USER_TOKEN``)
+        the token is locked (``SELECT ... FOR UPDATE``) and deleted in the
+        same transaction, hence only one of concurrent verifications of the
+        same token succeeds; otherwise the token is looked up by primary key.
+        """
+        if consume is None:
+            consume = app_settings.DISPOSABLE_RADIUS_USER_TOKEN
+        queryset = self.filter(key=key, user=user)
+        if not consume:
+            return queryset.exists()
+        with transaction.atomic(using=queryset.db):
+            token = queryset.select_for_update().first()
+            if token is None:
+                return False
+            token.delete()
+        return True
+
+
 class AbstractRadiusToken(TimeStampedEditableModel, models.Model):
     # key field is a primary key so additional id field will be redundant
     id = None
@@ -974,6 +1317,8 @@ class AbstractRadiusToken(TimeStampedEditableModel, models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='radius_token'
     )
 
+    objects = AbstractRadiusTokenManager()
+
     class Meta:
         db_table = 'radiustoken'
         verbose_name = _('radius token')
@@ -1045,12 +1390,12 @@ class AbstractOrganizationRadiusSettings(UUIDModel):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        cache.set(self.organization.pk, self.token)
+        set_organization_token(self.organization_id, self.token)
 
     def delete(self, *args, **kwargs):
-        pk = self.organization.pk
+        organization_id = self.organization_id
         super().delete(*args, **kwargs)
-        cache.delete(pk)
+        delete_organization_token(organization_id)
 
 
 class AbstractPhoneToken(TimeStampedEditableModel):
@@ -0,0 +1,396 @@
+"""
+In-process caches used by the API endpoints consumed by freeradius
+"""
+import hashlib
+import hmac
+import os
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.crypto import constant_time_compare
+
+from . import settings as app_settings
+from .passwords import verify_password, verify_passwords
+from .utils import load_model
+
+
+class LocalCache(object):
+    """
+    Bounded, thread safe, in-process cache with
+    per entry expiration and least recently used eviction.
+
+    ``maxsize=0`` disables the cache: every lookup is a miss
+    and nothing is stored.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires < monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        if not self.enabled:
+            return
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (value, monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, condition):
+        """
+        deletes the entries for which ``condition(key, value)``
+        returns ``True``, returns the number of deleted entries
+        """
+        with self._lock:
+            keys = [
+                key
+                for key, (value, expires) in self._data.items()
+                if condition(key, value)
+            ]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedInvalidationCache(LocalCache):
+    """
+    ``LocalCache`` whose entries can be invalidated in all the processes.
+
+    Each entry remembers when its value has been loaded from the database:
+    the time of the invalidations is stored in the django cache, which is
+    shared by all the processes, under the keys returned by
+    ``get_invalidation_keys`` and entries loaded before are discarded on lookup
+    """
+
+    def get_invalidation_keys(self, key, value):
+        raise NotImplementedError()
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        value, loaded = entry
+        invalidations = cache.get_many(self.get_invalidation_keys(key, value))
+        if any(invalidated >= loaded for invalidated in invalidations.values()):
+            self.delete(key)
+            self.hits -= 1
+            self.misses += 1
+            return default
+        return value
+
+    def set(self, key, value, timeout=None, loaded=None):
+        """
+        ``loaded`` is the time (``time.time()``) at which the lookup of
+        the value started, defaults to the current time
+        """
+        super().set(key, (value, time() if loaded is None else loaded), timeout)
+
+
+def get_authorize_invalidation_key(user_id):
+    return f'openwisp_radius:authorize_invalidated:{user_id}'
+
+
+class AuthorizeCache(SharedInvalidationCache):
+    """
+    ``SharedInvalidationCache`` of the users resolved by the authorize
+    endpoint, invalidated per user (see ``invalidate_authorize_cache``)
+    """
+
+    def get_invalidation_keys(self, key, user):
+        return [get_authorize_invalidation_key(user.pk)]
+
+
+# users resolved by the authorize endpoint, keyed by (org uuid, username)
+authorize_cache = AuthorizeCache(
+    maxsize=app_settings.API_AUTHORIZE_CACHE_SIZE,
+    timeout=app_settings.API_AUTHORIZE_CACHE_TIMEOUT,
+)
+
+
+def _set_authorize_invalidation(user_id):
+    cache.set(
+        get_authorize_invalidation_key(user_id),
+        time(),
+        # older entries are expired anyway
+        app_settings.API_AUTHORIZE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_authorize_cache(user_id):
+    """
+    removes any cached authorize entry of the specified user from
+    the cache of the current process and, once the current transaction
+    is committed, from the caches of the other processes
+    """
+    if authorize_cache.enabled:
+        transaction.on_commit(lambda: _set_authorize_invalidation(user_id))
+    return authorize_cache.delete_if(lambda key, entry: entry[0].pk == user_id)
+
+
+# passwords verified by the authorize endpoint, keyed by user id
+password_cache = LocalCache(
+    maxsize=app_settings.API_PASSWORD_CACHE_SIZE,
+    timeout=app_settings.API_PASSWORD_CACHE_TIMEOUT,
+)
+# the digests never leave the process, hence a random key is enough
+_password_cache_key = os.urandom(32)
+
+
+def get_password_digest(user, password):
+    """
+    returns the HMAC of the user id, its password hash and ``password``;
+    the digest changes as soon as the password hash of the user changes
+    """
+    message = '\0'.join([str(user.pk), user.password, str(password)])
+    return hmac.new(_password_cache_key, message.encode(), hashlib.sha256).hexdigest()
+
+
+def _clean_password(password):
+    """
+    the JSON sent to the API may contain passwords which are not
+    strings (eg: numbers), these are converted to strings like
+    the values of form encoded requests
+    """
+    if password is None or isinstance(password, str):
+        return password
+    return str(password)
+
+
+def check_password(user, password):
+    """
+    equivalent to ``user.check_password(password)`` (see
+    ``openwisp_radius.passwords.verify_password``), successful
+    checks are cached in order to skip the password hasher
+    when the same user authenticates again
+    """
+    password = _clean_password(password)
+    if not password or not password_cache.enabled:
+        return verify_password(user, password)
+    digest = password_cache.get(user.pk)
+    if digest is not None and constant_time_compare(
+        digest, get_password_digest(user, password)
+    ):
+        return True
+    valid = verify_password(user, password)
+    if valid:
+        # the password hash may have been upgraded by verify_password
+        password_cache.set(user.pk, get_password_digest(user, password))
+    return valid
+
+
+def check_passwords(credentials):
+    """
+    same as ``check_password`` for a list of ``(user, password)``
+    tuples, returns a list of booleans; the passwords which are
+    not cached are verified concurrently (see ``verify_passwords``)
+    """
+    credentials = [(user, _clean_password(password)) for user, password in credentials]
+    results = [None] * len(credentials)
+    pending = []
+    for index, (user, password) in enumerate(credentials):
+        if not password or not password_cache.enabled:
+            pending.append(index)
+            continue
+        digest = password_cache.get(user.pk)
+        if digest is not None and constant_time_compare(
+            digest, get_password_digest(user, password)
+        ):
+            results[index] = True
+        else:
+            pending.append(index)
+    verified = verify_passwords([credentials[index] for index in pending])
+    for index, valid in zip(pending, verified):
+        results[index] = valid
+        user, password = credentials[index]
+        if valid and password and password_cache.enabled:
+            password_cache.set(user.pk, get_password_digest(user, password))
+    return results
+
+
+def invalidate_password_cache(user_id):
+    password_cache.delete(user_id)
+
+
+# organization radius tokens, local tier in front of the django cache
+organization_token_cache = LocalCache(
+    maxsize=app_settings.API_TOKEN_LOCAL_CACHE_SIZE,
+    timeout=app_settings.API_TOKEN_LOCAL_CACHE_TIMEOUT,
+)
+
+
+def get_organization_token_cache_key(organization_id):
+    return f'openwisp_radius:organization_token:{organization_id}'
+
+
+def get_organization_token(organization_id):
+    """
+    returns the cached radius token of the organization or ``None``
+    """
+    key = get_organization_token_cache_key(organization_id)
+    token = organization_token_cache.get(key)
+    if token is None:
+        token = cache.get(key)
+        if token is not None:
+            organization_token_cache.set(key, token)
+    return token
+
+
+def set_organization_token(organization_id, token):
+    key = get_organization_token_cache_key(organization_id)
+    cache.set(key, token)
+    organization_token_cache.set(key, token)
+
+
+def delete_organization_token(organization_id):
+    key = get_organization_token_cache_key(organization_id)
+    cache.delete(key)
+    organization_token_cache.delete(key)
+
+
+# primary radius group of users, keyed by (org id, username)
+groupname_cache = LocalCache(
+    maxsize=app_settings.API_GROUPNAME_CACHE_SIZE,
+    timeout=app_settings.API_GROUPNAME_CACHE_TIMEOUT,
+)
+
+
+def get_user_groupname(username, organization_id):
+    """
+    returns the ``groupname`` of the radius group of the organization
+    which has the highest priority among the groups of the user
+    (``None`` if the user has no group in the organization),
+    raises ``DoesNotExist`` if the user does not exist
+    """
+    key = (str(organization_id), username)
+    cached = groupname_cache.get(key)
+    if cached is not None:
+        return cached[1]
+    User = get_user_model()
+    RadiusUserGroup = load_model('RadiusUserGroup')
+    # user groups which are not related to any radius group
+    # do not belong to any organization and are not excluded
+    groups = RadiusUserGroup.objects.filter(
+        Q(group__organization_id=organization_id) | Q(group__isnull=True),
+        user=OuterRef('pk'),
+    ).order_by('priority')
+    # users without groups are returned with groupname set to NULL
+    user = (
+        User.objects.filter(username=username)
+        .annotate(groupname=Subquery(groups.values('groupname')[:1]))
+        .values_list('pk', 'groupname')
+        .first()
+    )
+    if user is None:
+        raise User.DoesNotExist()
+    groupname_cache.set(key, user)
+    return user[1]
+
+
+def invalidate_groupname_cache(user_id=None):
+    """
+    removes the cached groupname of the specified user
+    or of any user if ``user_id`` is not supplied
+    """
+    if user_id is None:
+        return groupname_cache.delete_if(lambda key, user: True)
+    return groupname_cache.delete_if(lambda key, user: user[0] == user_id)
+
+
+def get_group_policy_invalidation_key(groupname=None):
+    if groupname is None:
+        return 'openwisp_radius:group_policy_invalidated'
+    return f'openwisp_radius:group_policy_invalidated:{groupname}'
+
+
+class GroupPolicyCache(SharedInvalidationCache):
+    """
+    ``SharedInvalidationCache`` of the compiled policies of the radius
+    groups, invalidated per group or for all the groups at once
+    (see ``invalidate_group_policy_cache``)
+    """
+
+    def get_invalidation_keys(self, groupname, policy):
+        return [
+            get_group_policy_invalidation_key(groupname),
+            get_group_policy_invalidation_key(),
+        ]
+
+
+# compiled checks and replies of radius groups, keyed by groupname
+group_policy_cache = GroupPolicyCache(
+    maxsize=app_settings.API_GROUP_POLICY_CACHE_SIZE,
+    timeout=app_settings.API_GROUP_POLICY_CACHE_TIMEOUT,
+)
+
+
+def _set_group_policy_invalidation(groupname):
+    cache.set(
+        get_group_policy_invalidation_key(groupname),
+        time(),
+        # older entries are expired anyway
+        app_settings.API_GROUP_POLICY_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_group_policy_cache(groupname=None):
+    """
+    removes the compiled policy of the specified group (or of any
+    group if ``groupname`` is not supplied) from the cache of the
+    current process and, once the current transaction is committed,
+    from the caches of the other processes
+    """
+    if group_policy_cache.enabled:
+        transaction.on_commit(lambda: _set_group_policy_invalidation(groupname))
+    if groupname is None:
+        return group_policy_cache.clear()
+    return group_policy_cache.delete(groupname)
@@ -0,0 +1,144 @@
+"""
+Usage counters of each user (see ``RadiusUserCounter``), updated
+incrementally by the accounting endpoints when ``API_ACCOUNTING_COUNTERS``
+is enabled, used to enforce the session limits of the radius groups
+with a lookup instead of summing the accounting sessions of the user
+on each login (like the ``sqlcounter`` module of freeradius does).
+"""
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from . import metrics
+from . import settings as app_settings
+from .utils import load_model
+
+RadiusAccounting = load_model('RadiusAccounting')
+RadiusUserCounter = load_model('RadiusUserCounter')
+
+# group checks enforced with the counters, mapped to the counter field
+TIME_CHECKS = {
+    'Max-Daily-Session': 'daily_session_time',
+    'Max-All-Session': 'total_session_time',
+}
+TRAFFIC_CHECKS = {'Max-Daily-Session-Traffic': 'daily_traffic'}
+LIMIT_CHECKS = {**TIME_CHECKS, **TRAFFIC_CHECKS}
+USAGE_FIELDS = ('session_time', 'input_octets', 'output_octets')
+DAILY_FIELDS = ('daily_session_time', 'daily_traffic')
+
+
+def get_session_usage(organization_id, unique_id):
+    """
+    returns the username and the usage of the session as
+    a dict, ``None`` if the session does not exist yet
+    """
+    return (
+        RadiusAccounting.objects.filter(
+            organization_id=organization_id, unique_id=unique_id
+        )
+        .values('username', *USAGE_FIELDS)
+        .first()
+    )
+
+
+def get_instance_usage(instance):
+    """
+    same as ``get_session_usage`` for sessions already loaded
+    """
+    return {field: getattr(instance, field) for field in ('username',) + USAGE_FIELDS}
+
+
+def get_usage_delta(data, previous=None):
+    """
+    returns the session time and the traffic reported by an accounting
+    packet (``data``) which have not been counted yet, ``previous`` is
+    the usage of the session before the packet (``None`` for new sessions);
+    counters which went backwards are not subtracted
+    """
+    delta = {}
+    for field in USAGE_FIELDS:
+        value = data.get(field)
+        if value is None:
+            delta[field] = 0
+            continue
+        counted = (previous or {}).get(field) or 0
+        delta[field] = max(int(value) - counted, 0)
+    return delta['session_time'], delta['input_octets'] + delta['output_octets']
+
+
+def record_usage(organization_id, data, previous=None):
+    """
+    adds the usage reported by an accounting packet (see
+    ``get_usage_delta``) to the counters of the user
+    """
+    username = data.get('username') or (previous or {}).get('username')
+    session_time, traffic = get_usage_delta(data, previous)
+    if not username or not (session_time or traffic):
+        return
+    with metrics.phase('counter_update'):
+        RadiusUserCounter.objects.add(organization_id, username, session_time, traffic)
+
+
+def get_limits(organization_id, username):
+    """
+    returns the values of the group checks which are enforced with
+    the counters, looked up in the radius group of the user with
+    the highest priority in the organization
+    (see ``policy.get_user_group_policy``)
+    """
+    # imported here because the policy module depends on this one
+    from .policy import get_user_group_policy
+
+    policy = get_user_group_policy(username, organization_id)
+    return policy.limits if policy else {}
+
+
+def get_usage(organization_id, username):
+    """
+    returns the current values of the counters of the user,
+    daily counters of past days are returned as zero
+    """
+    counter = RadiusUserCounter.objects.filter(
+        organization_id=organization_id, username=username
+    ).first()
+    usage = dict.fromkeys(LIMIT_CHECKS.values(), 0)
+    if counter is None:
+        return usage
+    for field in usage.keys():
+        if field in DAILY_FIELDS and counter.day != timezone.localdate():
+            continue
+        usage[field] = getattr(counter, field)
+    return usage
+
+
+def get_reply(organization_id, username, limits=None):
+    """
+    returns a ``(accept, attributes)`` tuple: ``accept`` is ``False``
+    if the user has reached one of its limits, ``attributes`` are the
+    reply attributes with the remaining time and traffic of the user;
+    ``limits`` are looked up with ``get_limits`` if not supplied
+    """
+    with metrics.phase('counter_lookup'):
+        if limits is None:
+            limits = get_limits(organization_id, username)
+        if not limits:
+            return True, {}
+        usage = get_usage(organization_id, username)
+    remaining_time = [
+        value - usage[TIME_CHECKS[attribute]]
+        for attribute, value in limits.items()
+        if attribute in TIME_CHECKS
+    ]
+    remaining_traffic = [
+        value - usage[TRAFFIC_CHECKS[attribute]]
+        for attribute, value in limits.items()
+        if attribute in TRAFFIC_CHECKS
+    ]
+    if any(value <= 0 for value in remaining_time + remaining_traffic):
+        return False, {'reply:Reply-Message': str(_('Your maximum usage was reached'))}
+    attributes = {}
+    if remaining_time:
+        attributes['reply:Session-Timeout'] = min(remaining_time)
+    if remaining_traffic and app_settings.API_COUNTERS_TRAFFIC_REPLY:
+        attribute = 'reply:{}'.format(app_settings.API_COUNTERS_TRAFFIC_REPLY)
+        attributes[attribute] = min(remaining_traffic)
+    return True, attributes
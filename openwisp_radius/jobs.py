@@ -0,0 +1,70 @@
+"""
+Execution of the batch user creation operations in a pool of background
+threads (enabled with ``BATCH_JOB_WORKERS``), so that the admin and the
+batch API endpoint do not keep the process which handles the request
+busy until all the users are created.
+
+The status of each operation is stored in the ``RadiusBatch`` (see
+``AbstractRadiusBatch.process``), while the number of users added so far
+is stored in the django cache until the operation is completed (see
+``AbstractRadiusBatch.set_progress``).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.db import connection, transaction
+
+from . import settings as app_settings
+from .utils import load_model
+
+logger = logging.getLogger(__name__)
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app_settings.BATCH_JOB_WORKERS,
+                thread_name_prefix='radius-batch',
+            )
+        return _executor
+
+
+def shutdown_executor(wait=True):
+    """
+    stops the worker threads (waiting for the operations in progress
+    if ``wait`` is ``True``), a new pool is started when needed again
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def run(batch_id, **options):
+    """
+    executed in the worker threads, processes the batch ``batch_id``;
+    exceptions are logged and raised again (they're stored in the future)
+    """
+    try:
+        batch = load_model('RadiusBatch').objects.get(pk=batch_id)
+        batch.process(**options)
+    except Exception:
+        logger.exception('batch {} failed'.format(batch_id))
+        raise
+    finally:
+        # the thread has its own database connection
+        connection.close()
+
+
+def submit(batch, **options):
+    """
+    processes ``batch`` in a worker thread as soon as the
+    transaction in which it has been saved is committed
+    """
+    transaction.on_commit(lambda: get_executor().submit(run, batch.pk, **options))
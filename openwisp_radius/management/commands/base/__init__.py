@@ -1,6 +1,8 @@
 import sys
+import time
 
 import swapper
+from django.core.management import CommandError
 
 Organization = swapper.load_model('openwisp_users', 'Organization')
 
@@ -22,3 +24,70 @@ class BatchAddMixin(object):
         batch = super()._create_batch(**options)
         batch.organization = org
         return batch
+
+
+class BatchDeleteMixin(object):
+    """
+    Deletes old rows in batches of consecutive primary keys, each batch
+    in its own short transaction, so that the tables are not locked for
+    the whole duration of the command (freeradius keeps writing to them)
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='number of rows deleted in each transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='seconds to wait between batches (default: 0)',
+        )
+        parser.add_argument(
+            '--resume-from',
+            type=int,
+            help='resumes an interrupted run from the last id it printed',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='counts the rows which would be deleted without deleting them',
+        )
+
+    def delete_in_batches(self, queryset, label, **options):
+        """
+        deletes the rows of ``queryset`` in ascending order of primary key
+        and returns their number (the number of rows which would be deleted
+        if ``dry_run`` is ``True``); the last id of each batch is printed
+        and can be passed to ``--resume-from`` if the command is interrupted
+        """
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('The batch size should be greater than 0')
+        if options['resume_from'] is not None:
+            queryset = queryset.filter(pk__gt=options['resume_from'])
+        if options['dry_run']:
+            return queryset.count()
+        deleted = 0
+        last = None
+        while True:
+            batch = queryset if last is None else queryset.filter(pk__gt=last)
+            pks = list(batch.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            if last is not None and options['sleep']:
+                time.sleep(options['sleep'])
+            last = pks[-1]
+            # the range is bounded by the primary keys of the batch,
+            # rows which do not match the queryset are left untouched
+            count, _ = queryset.filter(pk__gte=pks[0], pk__lte=last).delete()
+            deleted += count
+            if options['verbosity']:
+                self.stdout.write(
+                    'Deleted {} {} (last id: {})'.format(deleted, label, last)
+                )
+        return deleted
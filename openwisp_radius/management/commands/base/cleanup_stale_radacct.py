@@ -1,30 +1,81 @@
 from datetime import timedelta
 
-from django.core.management import BaseCommand
+import swapper
+from django.core.management import BaseCommand, CommandError
+from django.db.models import BigIntegerField, DateTimeField, F, Func, Value
 from django.utils.timezone import now
 
 from ....utils import load_model
 
+Organization = swapper.load_model('openwisp_users', 'Organization')
 RadiusAccounting = load_model('RadiusAccounting')
 
 
+class SecondsBetween(Func):
+    """
+    number of seconds elapsed from ``start`` to ``end``
+    (datetime expressions), calculated by the database
+    """
+
+    output_field = BigIntegerField()
+    templates = {
+        'mysql': 'TIMESTAMPDIFF(SECOND, {start}, {end})',
+        'sqlite': (
+            "CAST(strftime('%%s', {end}) AS integer) - "
+            "CAST(strftime('%%s', {start}) AS integer)"
+        ),
+    }
+    default_template = 'CAST(EXTRACT(EPOCH FROM ({end} - {start})) AS bigint)'
+
+    def as_sql(self, compiler, connection, **extra_context):
+        template = self.templates.get(connection.vendor, self.default_template)
+        compiled = dict(
+            zip(
+                ['start', 'end'],
+                [compiler.compile(arg) for arg in self.get_source_expressions()],
+            )
+        )
+        # the parameters follow the order of the expressions in the template
+        names = sorted(compiled, key=lambda name: template.index('{%s}' % name))
+        sql = template.format(**{name: compiled[name][0] for name in names})
+        params = [param for name in names for param in compiled[name][1]]
+        return sql, params
+
+
 class BaseCleanupRadacctCommand(BaseCommand):
     help = 'Closes active accounting sessions older than <days>'
 
     def add_arguments(self, parser):
         parser.add_argument('number_of_days', type=int, nargs='?', default=15)
+        parser.add_argument(
+            '--organization', help='Name of the organization (default: all)'
+        )
+        parser.add_argument(
+            '--nas-ip-address', help='IP address of the NAS (default: all)'
+        )
 
     def handle(self, *args, **options):
-        days = now() - timedelta(days=options['number_of_days'])
+        # the same timestamp is used as stop time of all the sessions
+        stop_time = now()
+        days = stop_time - timedelta(days=options['number_of_days'])
         sessions = RadiusAccounting.objects.filter(start_time__lt=days, stop_time=None)
-        for session in sessions:
-            # calculate seconds in between two dates
-            session.session_time = (now() - session.start_time).total_seconds()
-            session.stop_time = now()
-            session.update_time = session.stop_time
-            session.save()
+        if options['organization']:
+            try:
+                org = Organization.objects.get(name=options['organization'])
+            except Organization.DoesNotExist:
+                raise CommandError('The organization supplied was not found')
+            sessions = sessions.filter(organization=org)
+        if options['nas_ip_address']:
+            sessions = sessions.filter(nas_ip_address=options['nas_ip_address'])
+        closed = sessions.update(
+            session_time=SecondsBetween(
+                F('start_time'), Value(stop_time, output_field=DateTimeField())
+            ),
+            stop_time=stop_time,
+            update_time=stop_time,
+        )
         self.stdout.write(
-            'Closed active sessions older than {} days'.format(
-                options['number_of_days']
+            'Closed {} active sessions older than {} days'.format(
+                closed, options['number_of_days']
             )
         )
@@ -4,20 +4,30 @@ from django.core.management import BaseCommand
 from django.utils.timezone import now
 
 from ....utils import load_model
+from . import BatchDeleteMixin
 
 RadiusPostAuth = load_model('RadiusPostAuth')
 
 
-class BaseDeleteOldPostauthCommand(BaseCommand):
+class BaseDeleteOldPostauthCommand(BatchDeleteMixin, BaseCommand):
     help = 'Delete post-auth logs older than <days>'
 
     def add_arguments(self, parser):
         parser.add_argument('number_of_days', type=int)
+        super().add_arguments(parser)
 
     def handle(self, *args, **options):
         if options['number_of_days']:
             days = now() - timedelta(days=options['number_of_days'])
-            RadiusPostAuth.objects.filter(date__lt=days).delete()
+            queryset = RadiusPostAuth.objects.filter(date__lt=days)
+            count = self.delete_in_batches(queryset, 'post-auth logs', **options)
+            if options['dry_run']:
+                self.stdout.write(
+                    '{} post-auth logs older than {} days would be deleted'.format(
+                        count, options['number_of_days']
+                    )
+                )
+                return
             self.stdout.write(
                 'Deleted post-auth logs older than {} days'.format(
                     options['number_of_days']
@@ -4,20 +4,30 @@ from django.core.management import BaseCommand
 from django.utils.timezone import now
 
 from ....utils import load_model
+from . import BatchDeleteMixin
 
 RadiusAccounting = load_model('RadiusAccounting')
 
 
-class BaseDeleteOldRadacctCommand(BaseCommand):
+class BaseDeleteOldRadacctCommand(BatchDeleteMixin, BaseCommand):
     help = 'Delete accounting sessions older than <days>'
 
     def add_arguments(self, parser):
         parser.add_argument('number_of_days', type=int)
+        super().add_arguments(parser)
 
     def handle(self, *args, **options):
         if options['number_of_days']:
             days = now() - timedelta(days=options['number_of_days'])
-            RadiusAccounting.objects.filter(stop_time__lt=days).delete()
+            queryset = RadiusAccounting.objects.filter(stop_time__lt=days)
+            count = self.delete_in_batches(queryset, 'sessions', **options)
+            if options['dry_run']:
+                self.stdout.write(
+                    '{} sessions older than {} days would be deleted'.format(
+                        count, options['number_of_days']
+                    )
+                )
+                return
             self.stdout.write(
                 'Deleted sessions older than {} days'.format(options['number_of_days'])
             )
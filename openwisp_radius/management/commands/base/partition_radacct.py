@@ -0,0 +1,299 @@
+import re
+from datetime import date
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.utils.timezone import now
+
+from ....utils import load_model
+
+RadiusAccounting = load_model('RadiusAccounting')
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def add_months(month, months):
+    """
+    returns the first day of the month which
+    comes ``months`` months after ``month``
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(table, month):
+    return '{}_p{:04d}_{:02d}'.format(table, month.year, month.month)
+
+
+def get_partition_month(table, name):
+    """
+    returns the month of a partition created by this command,
+    ``None`` for any other table (eg: the default partition)
+    """
+    match = PARTITION_SUFFIX.search(name)
+    if not name.startswith(table) or not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+class BasePartitionRadacctCommand(BaseCommand):
+    help = (
+        'Manages the monthly partitions of the accounting sessions '
+        '(PostgreSQL only): creates the partitions of the next months '
+        'and drops the expired ones'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='converts the accounting table into a partitioned table',
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='number of future monthly partitions to create (default: 3)',
+        )
+        parser.add_argument(
+            '--retention-months',
+            type=int,
+            help='drops the partitions of sessions started more than '
+            '<retention-months> months ago',
+        )
+        parser.add_argument(
+            '--detach-only',
+            action='store_true',
+            help='detaches the expired partitions without dropping them',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='prints the SQL statements without executing them',
+        )
+
+    def handle(self, *args, **options):
+        self.connection = connections[router.db_for_write(RadiusAccounting)]
+        self.dry_run = options['dry_run']
+        if self.connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+        if self.connection.pg_version < 110000:
+            raise CommandError('Partitioning requires PostgreSQL 11 or later')
+        self.table = RadiusAccounting._meta.db_table
+        self.start_column = RadiusAccounting._meta.get_field('start_time').column
+        current = now().date().replace(day=1)
+        last = add_months(current, options['months_ahead'])
+        with transaction.atomic(using=self.connection.alias):
+            with self.connection.cursor() as cursor:
+                self.cursor = cursor
+                if not self.is_partitioned():
+                    if not options['convert']:
+                        raise CommandError(
+                            'The {} table is not partitioned, '
+                            'use --convert to convert it'.format(self.table)
+                        )
+                    self.convert(current, last)
+                else:
+                    self.create_partitions(current, last)
+                if options['retention_months'] is not None:
+                    cutoff = add_months(current, -options['retention_months'])
+                    self.expire_partitions(cutoff, options['detach_only'])
+
+    def execute_sql(self, sql, params=None):
+        if self.dry_run:
+            self.stdout.write(sql + ';')
+            return
+        self.cursor.execute(sql, params)
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def is_partitioned(self):
+        self.cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [self.table]
+        )
+        row = self.cursor.fetchone()
+        return row is not None and row[0] == 'p'
+
+    def get_partitions(self):
+        self.cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [self.table],
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_default_partition(self):
+        return '{}_default'.format(self.table)
+
+    def has_default_rows(self, month):
+        """
+        returns ``True`` if the default partition contains
+        sessions which belong to the partition of ``month``
+        """
+        self.cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM {} WHERE {})'.format(
+                self.quote(self.get_default_partition()), self.get_range(month)
+            )
+        )
+        return self.cursor.fetchone()[0]
+
+    def get_range(self, month):
+        return "{start} >= '{first}' AND {start} < '{end}'".format(
+            start=self.quote(self.start_column),
+            first=month.isoformat(),
+            end=add_months(month, 1).isoformat(),
+        )
+
+    def create_partition(self, month, move_default_rows=False):
+        """
+        creates the partition of ``month``; the sessions of the month which
+        are stored in the default partition make the creation of the
+        partition fail, if ``move_default_rows`` is ``True`` they're moved
+        to the new table before attaching it as a partition
+        """
+        partition = self.quote(get_partition_name(self.table, month))
+        table = self.quote(self.table)
+        bounds = "FOR VALUES FROM ('{start}') TO ('{end}')".format(
+            start=month.isoformat(), end=add_months(month, 1).isoformat()
+        )
+        if not move_default_rows:
+            self.execute_sql(
+                'CREATE TABLE IF NOT EXISTS {} PARTITION OF {} {}'.format(
+                    partition, table, bounds
+                )
+            )
+            return
+        self.execute_sql(
+            'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+            'INCLUDING STORAGE INCLUDING COMMENTS)'.format(partition, table)
+        )
+        self.execute_sql(
+            'WITH moved AS (DELETE FROM {default} WHERE {range} RETURNING *) '
+            'INSERT INTO {partition} SELECT * FROM moved'.format(
+                default=self.quote(self.get_default_partition()),
+                range=self.get_range(month),
+                partition=partition,
+            )
+        )
+        self.execute_sql(
+            'ALTER TABLE {} ATTACH PARTITION {} {}'.format(table, partition, bounds)
+        )
+
+    def create_partitions(self, first, last):
+        """
+        creates the monthly partitions from ``first`` to ``last``
+        (included) which do not exist yet
+        """
+        existing = set(self.get_partitions()) if not self.dry_run else set()
+        has_default = self.get_default_partition() in existing
+        created = 0
+        month = first
+        while month <= last:
+            if get_partition_name(self.table, month) not in existing:
+                self.create_partition(
+                    month,
+                    move_default_rows=has_default and self.has_default_rows(month),
+                )
+                created += 1
+            month = add_months(month, 1)
+        self.stdout.write('Created {} partitions'.format(created))
+
+    def expire_partitions(self, cutoff, detach_only):
+        """
+        detaches (and drops, unless ``detach_only`` is ``True``)
+        the partitions of the months which precede ``cutoff``
+        """
+        expired = 0
+        for name in sorted(self.get_partitions()):
+            month = get_partition_month(self.table, name)
+            if month is None or month >= cutoff:
+                continue
+            self.execute_sql(
+                'ALTER TABLE {} DETACH PARTITION {}'.format(
+                    self.quote(self.table), self.quote(name)
+                )
+            )
+            if not detach_only:
+                self.execute_sql('DROP TABLE {}'.format(self.quote(name)))
+            expired += 1
+        action = 'Detached' if detach_only else 'Dropped'
+        self.stdout.write('{} {} expired partitions'.format(action, expired))
+
+    def convert(self, current, last):
+        """
+        replaces the accounting table with a table partitioned by
+        month on the start time of the sessions, the sessions are
+        copied in the new table within the same transaction
+        """
+        table = self.quote(self.table)
+        old_name = '{}_unpartitioned'.format(self.table)
+        old_table = self.quote(old_name)
+        start = self.quote(self.start_column)
+        pk = self.quote(RadiusAccounting._meta.pk.column)
+        unique_id = self.quote(RadiusAccounting._meta.get_field('unique_id').column)
+        self.cursor.execute(
+            'SELECT pg_get_serial_sequence(%s, %s)',
+            [self.table, RadiusAccounting._meta.pk.column],
+        )
+        sequence = self.cursor.fetchone()[0]
+        # indexes and foreign keys are created again once the old table
+        # is dropped, the constraints which do not include the partition
+        # key (primary key and unique id) are not supported by PostgreSQL
+        self.cursor.execute(
+            'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+            'WHERE indrelid = to_regclass(%s) AND NOT indisunique',
+            [self.table],
+        )
+        indexes = [row[0] for row in self.cursor.fetchall()]
+        self.cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [self.table],
+        )
+        foreign_keys = self.cursor.fetchall()
+        self.cursor.execute(
+            'SELECT min({}) FROM {} WHERE {} IS NOT NULL'.format(start, table, start)
+        )
+        oldest = self.cursor.fetchone()[0]
+        first = oldest.date().replace(day=1) if oldest else current
+        self.execute_sql(
+            'UPDATE {table} SET {start} = now() WHERE {start} IS NULL'.format(
+                table=table, start=start
+            )
+        )
+        self.execute_sql('ALTER TABLE {} RENAME TO {}'.format(table, old_table))
+        self.execute_sql(
+            'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+            'INCLUDING STORAGE INCLUDING COMMENTS) '
+            'PARTITION BY RANGE ({})'.format(table, old_table, start)
+        )
+        self.execute_sql(
+            'ALTER TABLE {} ADD PRIMARY KEY ({}, {})'.format(table, pk, start)
+        )
+        self.execute_sql(
+            'ALTER TABLE {} ADD UNIQUE ({}, {})'.format(table, unique_id, start)
+        )
+        self.execute_sql(
+            'CREATE TABLE {} PARTITION OF {} DEFAULT'.format(
+                self.quote(self.get_default_partition()), table
+            )
+        )
+        self.create_partitions(first, last)
+        self.execute_sql('INSERT INTO {} SELECT * FROM {}'.format(table, old_table))
+        if sequence:
+            self.execute_sql('ALTER SEQUENCE {} OWNED BY NONE'.format(sequence))
+        self.execute_sql('DROP TABLE {}'.format(old_table))
+        for index in indexes:
+            self.execute_sql(index)
+        for name, definition in foreign_keys:
+            self.execute_sql(
+                'ALTER TABLE {} ADD CONSTRAINT {} {}'.format(
+                    table, self.quote(name), definition
+                )
+            )
+        if sequence:
+            self.execute_sql(
+                'ALTER SEQUENCE {} OWNED BY {}.{}'.format(sequence, table, pk)
+            )
+        self.stdout.write('Converted the {} table'.format(self.table))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management import BaseCommand
+
+from ....metrics import HISTOGRAM_BUCKETS, HistogramSink
+
+
+class BaseRadiusMetricsCommand(BaseCommand):
+    help = (
+        'Shows the latency and query histograms of the freeradius API '
+        'endpoints collected by openwisp_radius.metrics.HistogramSink'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true', help='print the histograms as JSON'
+        )
+        parser.add_argument('--reset', action='store_true', help='reset the histograms')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            HistogramSink.reset()
+            self.stdout.write('Metrics have been reset')
+            return
+        histograms = HistogramSink.load()
+        if options['json']:
+            data = {key: h.as_dict() for key, h in sorted(histograms.items())}
+            self.stdout.write(json.dumps(data, indent=4))
+            return
+        if not histograms:
+            self.stdout.write('No metrics collected')
+            return
+        columns = ['count', 'avg (ms)', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'queries']
+        header = '{:<34}'.format('endpoint:phase') + ''.join(
+            '{:>10}'.format(c) for c in columns
+        )
+        self.stdout.write(header)
+        for key, histogram in sorted(histograms.items()):
+            percentiles = [histogram.percentile(p) for p in (50, 95, 99)]
+            values = [
+                '{:>10}'.format(histogram.count),
+                '{:>10.2f}'.format(histogram.time / histogram.count),
+            ]
+            values += [
+                '{:>10}'.format(
+                    '<={}'.format(p) if p else '>{}'.format(HISTOGRAM_BUCKETS[-1])
+                )
+                for p in percentiles
+            ]
+            values.append('{:>10.2f}'.format(histogram.queries / histogram.count))
+            self.stdout.write('{:<34}'.format(key) + ''.join(values))
@@ -0,0 +1,57 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ....utils import load_model
+
+RadiusAccounting = load_model('RadiusAccounting')
+RadiusUserCounter = load_model('RadiusUserCounter')
+
+
+class BaseRebuildRadiusCountersCommand(BaseCommand):
+    help = (
+        'Recalculates the usage counters of the users '
+        'from the accounting sessions stored in the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--organization', help='UUID of the organization (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        midnight = datetime.combine(today, time())
+        if settings.USE_TZ:
+            midnight = timezone.make_aware(midnight)
+        sessions = RadiusAccounting.objects.exclude(username=None).exclude(username='')
+        counters = RadiusUserCounter.objects.all()
+        if options['organization']:
+            sessions = sessions.filter(organization_id=options['organization'])
+            counters = counters.filter(organization_id=options['organization'])
+        traffic = Coalesce('input_octets', 0) + Coalesce('output_octets', 0)
+        # sessions started today are counted as daily usage
+        started_today = Q(start_time__gte=midnight)
+        usage = (
+            sessions.values('organization_id', 'username')
+            .order_by()
+            .annotate(
+                total_session_time=Coalesce(Sum('session_time'), 0),
+                total_traffic=Coalesce(Sum(traffic), 0),
+                daily_session_time=Coalesce(
+                    Sum('session_time', filter=started_today), 0
+                ),
+                daily_traffic=Coalesce(Sum(traffic, filter=started_today), 0),
+            )
+        )
+        with transaction.atomic():
+            counters.delete()
+            created = RadiusUserCounter.objects.bulk_create(
+                [RadiusUserCounter(day=today, **values) for values in usage.iterator()]
+            )
+        self.stdout.write('Rebuilt the counters of {} users'.format(len(created)))
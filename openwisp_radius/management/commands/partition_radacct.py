@@ -0,0 +1,5 @@
+from .base.partition_radacct import BasePartitionRadacctCommand
+
+
+class Command(BasePartitionRadacctCommand):
+    pass
@@ -0,0 +1,5 @@
+from .base.radius_metrics import BaseRadiusMetricsCommand
+
+
+class Command(BaseRadiusMetricsCommand):
+    pass
@@ -0,0 +1,5 @@
+from .base.rebuild_radius_counters import BaseRebuildRadiusCountersCommand
+
+
+class Command(BaseRebuildRadiusCountersCommand):
+    pass
@@ -0,0 +1,288 @@
+"""
+Opt-in instrumentation of the API endpoints consumed by freeradius:
+records the duration and the number of database queries of each
+phase of a request (eg: organization authentication, user lookup,
+password check) and passes them to the configured sinks.
+"""
+import logging
+import os
+import socket
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock, local
+from time import monotonic, perf_counter
+
+from django.core.cache import caches
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from . import settings as app_settings
+
+logger = logging.getLogger(__name__)
+_local = local()
+
+# upper bounds (in milliseconds) of the histogram buckets
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class RequestMetrics(object):
+    """
+    Metrics of a single request: ``phases`` maps the name of each
+    phase to its duration (seconds) and number of queries
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.phases = {}
+        self.duration = 0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # database execute wrapper, counts the queries
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def add(self, phase, duration, queries):
+        total_duration, total_queries = self.phases.get(phase, (0, 0))
+        self.phases[phase] = (total_duration + duration, total_queries + queries)
+
+
+@contextmanager
+def instrument(endpoint):
+    """
+    collects the metrics of the request processed in the
+    block and sends them to the sinks (if metrics are enabled)
+    """
+    if not app_settings.METRICS_ENABLED or getattr(_local, 'metrics', None):
+        yield
+        return
+    metrics = RequestMetrics(endpoint)
+    _local.metrics = metrics
+    start = perf_counter()
+    try:
+        with connection.execute_wrapper(metrics):
+            yield
+    finally:
+        metrics.duration = perf_counter() - start
+        _local.metrics = None
+        send(metrics)
+
+
+@contextmanager
+def phase(name):
+    """
+    records the duration and the queries of the
+    block as the phase ``name`` of the current request
+    """
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        yield
+        return
+    queries = metrics.queries
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, perf_counter() - start, metrics.queries - queries)
+
+
+_sinks = {}
+
+
+def get_sinks():
+    paths = tuple(app_settings.METRICS_SINKS)
+    if paths not in _sinks:
+        _sinks.clear()
+        _sinks[paths] = [import_string(path)() for path in paths]
+    return _sinks[paths]
+
+
+def send(metrics):
+    for sink in get_sinks():
+        try:
+            sink.record(metrics)
+        except Exception:
+            logger.exception(f'{sink.__class__.__name__} failed to record metrics')
+
+
+class BaseSink(object):
+    def record(self, metrics):  # pragma: no cover
+        raise NotImplementedError()
+
+
+class LoggingSink(BaseSink):
+    """
+    logs the metrics of each request with the ``INFO`` level
+    """
+
+    def record(self, metrics):
+        phases = ' '.join(
+            f'{name}={duration * 1000:.2f}ms/{queries}q'
+            for name, (duration, queries) in metrics.phases.items()
+        )
+        logger.info(
+            f'{metrics.endpoint} {metrics.duration * 1000:.2f}ms/'
+            f'{metrics.queries}q {phases}'.strip()
+        )
+
+
+class StatsdSink(BaseSink):
+    """
+    sends the metrics of each request in one UDP
+    datagram to a StatsD compatible collector
+    """
+
+    def __init__(self):
+        self.address = (
+            app_settings.METRICS_STATSD_HOST,
+            app_settings.METRICS_STATSD_PORT,
+        )
+        self.prefix = app_settings.METRICS_STATSD_PREFIX
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def get_lines(self, metrics):
+        prefix = f'{self.prefix}.{metrics.endpoint}'
+        phases = [('total', (metrics.duration, metrics.queries))]
+        phases += list(metrics.phases.items())
+        lines = []
+        for name, (duration, queries) in phases:
+            lines.append(f'{prefix}.{name}.time:{duration * 1000:.3f}|ms')
+            lines.append(f'{prefix}.{name}.queries:{queries}|h')
+        return lines
+
+    def record(self, metrics):
+        data = '\n'.join(self.get_lines(metrics)).encode()
+        try:
+            self.socket.sendto(data, self.address)
+        except OSError as e:
+            logger.warning(f'could not send metrics to {self.address}: {e}')
+
+
+class Histogram(object):
+    """
+    Latency histogram with the buckets of ``HISTOGRAM_BUCKETS``,
+    the last bucket holds the values beyond the last bound
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.buckets = data.get('buckets', [0] * (len(HISTOGRAM_BUCKETS) + 1))
+        self.count = data.get('count', 0)
+        self.time = data.get('time', 0)
+        self.queries = data.get('queries', 0)
+
+    def add(self, duration, queries):
+        milliseconds = duration * 1000
+        self.buckets[bisect_left(HISTOGRAM_BUCKETS, milliseconds)] += 1
+        self.count += 1
+        self.time += milliseconds
+        self.queries += queries
+
+    def merge(self, other, sign=1):
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count * sign
+        self.count += other.count * sign
+        self.time += other.time * sign
+        self.queries += other.queries * sign
+
+    def subtract(self, other):
+        self.merge(other, sign=-1)
+
+    def percentile(self, percent):
+        """
+        returns the upper bound (in milliseconds) of the bucket which contains
+        the percentile, ``None`` if it's beyond the last bound
+        """
+        rank = percent / 100 * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        return {
+            'buckets': list(self.buckets),
+            'count': self.count,
+            'time': self.time,
+            'queries': self.queries,
+        }
+
+
+class HistogramSink(BaseSink):
+    """
+    Aggregates the metrics in histograms kept in memory, which are
+    stored periodically in the cache (see ``METRICS_CACHE``) so that
+    the ``radius_metrics`` management command can read them.
+
+    Each process stores its own histograms, which are merged on read.
+    """
+
+    key_prefix = 'openwisp_radius:metrics'
+
+    def __init__(self):
+        self.histograms = {}
+        self.key = f'{self.key_prefix}:{socket.gethostname()}:{os.getpid()}'
+        self.generation = None
+        self.saved = monotonic()
+        self.saved_data = {}
+        self._lock = Lock()
+
+    @classmethod
+    def get_cache(cls):
+        return caches[app_settings.METRICS_CACHE]
+
+    def record(self, metrics):
+        phases = [('total', (metrics.duration, metrics.queries))]
+        phases += list(metrics.phases.items())
+        with self._lock:
+            for name, (duration, queries) in phases:
+                key = f'{metrics.endpoint}:{name}'
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram()
+                self.histograms[key].add(duration, queries)
+            if monotonic() - self.saved >= app_settings.METRICS_HISTOGRAM_INTERVAL:
+                self.save()
+
+    def save(self):
+        cache = self.get_cache()
+        generation = cache.get(f'{self.key_prefix}:generation', 0)
+        if self.generation is not None and generation != self.generation:
+            # histograms have been reset, only the data
+            # collected since the last save is kept
+            for key, value in self.saved_data.items():
+                self.histograms[key].subtract(Histogram(value))
+        self.generation = generation
+        data = {key: h.as_dict() for key, h in self.histograms.items()}
+        cache.set(self.key, data, None)
+        self.saved_data = data
+        index_key = f'{self.key_prefix}:index'
+        index = cache.get(index_key, [])
+        if self.key not in index:
+            cache.set(index_key, index + [self.key], None)
+        self.saved = monotonic()
+
+    @classmethod
+    def load(cls):
+        """
+        returns the histograms of all the processes, merged
+        """
+        cache = cls.get_cache()
+        index = cache.get(f'{cls.key_prefix}:index', [])
+        histograms = {}
+        for data in cache.get_many(index).values():
+            for key, value in data.items():
+                if key not in histograms:
+                    histograms[key] = Histogram()
+                histograms[key].merge(Histogram(value))
+        return histograms
+
+    @classmethod
+    def reset(cls):
+        cache = cls.get_cache()
+        index_key = f'{cls.key_prefix}:index'
+        cache.delete_many(cache.get(index_key, []) + [index_key])
+        generation_key = f'{cls.key_prefix}:generation'
+        cache.set(generation_key, cache.get(generation_key, 0) + 1, None)
@@ -0,0 +1,61 @@
+# Generated by Django 3.0.14 on 2026-10-18 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import openwisp_users.mixins
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openwisp_users', '0007_unique_email'),
+        ('openwisp_radius', '0008_sms_sender'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RadiusUserCounter',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('username', models.CharField(max_length=64, verbose_name='username')),
+                ('day', models.DateField(verbose_name='day')),
+                (
+                    'daily_session_time',
+                    models.BigIntegerField(
+                        default=0, verbose_name='daily session time'
+                    ),
+                ),
+                (
+                    'daily_traffic',
+                    models.BigIntegerField(default=0, verbose_name='daily traffic'),
+                ),
+                (
+                    'total_session_time',
+                    models.BigIntegerField(
+                        default=0, verbose_name='total session time'
+                    ),
+                ),
+                (
+                    'total_traffic',
+                    models.BigIntegerField(default=0, verbose_name='total traffic'),
+                ),
+                (
+                    'organization',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='openwisp_users.Organization',
+                        verbose_name='organization',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'user counter',
+                'verbose_name_plural': 'user counters',
+                'db_table': 'radusercounter',
+                'abstract': False,
+                'swappable': 'OPENWISP_RADIUS_RADIUSUSERCOUNTER_MODEL',
+                'unique_together': {('organization', 'username')},
+            },
+            bases=(openwisp_users.mixins.ValidateOrgMixin, models.Model),
+        ),
+    ]
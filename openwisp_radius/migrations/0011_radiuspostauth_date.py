@@ -0,0 +1,24 @@
+# Generated by Django 3.0.14 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openwisp_radius', '0010_radiusbatch_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='radiuspostauth',
+            name='date',
+            field=models.DateTimeField(
+                db_column='authdate',
+                default=django.utils.timezone.now,
+                editable=False,
+                verbose_name='date',
+            ),
+        ),
+    ]
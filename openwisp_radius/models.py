@@ -15,6 +15,7 @@ from .base.models import (
     AbstractRadiusPostAuth,
     AbstractRadiusReply,
     AbstractRadiusToken,
+    AbstractRadiusUserCounter,
     AbstractRadiusUserGroup,
 )
 
@@ -39,6 +40,12 @@ class RadiusAccounting(AbstractRadiusAccounting):
         swappable = swappable_setting('openwisp_radius', 'RadiusAccounting')
 
 
+class RadiusUserCounter(AbstractRadiusUserCounter):
+    class Meta(AbstractRadiusUserCounter.Meta):
+        abstract = False
+        swappable = swappable_setting('openwisp_radius', 'RadiusUserCounter')
+
+
 class RadiusGroup(AbstractRadiusGroup):
     class Meta(AbstractRadiusGroup.Meta):
         abstract = False
@@ -0,0 +1,174 @@
+"""
+Verification and hashing of user passwords in pools of worker processes,
+used to spread the CPU time spent by the password hashers of the
+authorize endpoint (``API_PASSWORD_POOL_SIZE``) and of the generation
+of users in batch (``BATCH_PASSWORD_POOL_SIZE``) across all the
+available cores
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+from django.contrib.auth.hashers import is_password_usable
+
+from . import settings as app_settings
+
+logger = logging.getLogger(__name__)
+# settings which define the number of worker processes of each pool
+POOL_SIZE_SETTINGS = {
+    'api': 'API_PASSWORD_POOL_SIZE',
+    'batch': 'BATCH_PASSWORD_POOL_SIZE',
+}
+_pools = {}
+_pool_lock = Lock()
+
+
+def _setup():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:  # pragma: no cover
+        # worker processes are spawned instead of forked
+        django.setup()
+
+
+def _verify(password, encoded):
+    """
+    executed in the worker processes, returns a ``(valid, encoded)``
+    tuple where ``encoded`` is the new hash of the password if the
+    hash supplied must be upgraded, ``None`` otherwise
+    """
+    _setup()
+    from django.contrib.auth.hashers import check_password, make_password
+
+    upgraded = []
+    valid = check_password(
+        password, encoded, setter=lambda raw: upgraded.append(make_password(raw))
+    )
+    return valid, upgraded[0] if upgraded else None
+
+
+def _make_passwords(passwords):
+    """
+    executed in the worker processes, returns
+    the hashes of a list of raw passwords
+    """
+    _setup()
+    from django.contrib.auth.hashers import make_password
+
+    return [make_password(password) for password in passwords]
+
+
+def get_pool(name='api'):
+    with _pool_lock:
+        if name not in _pools:
+            size = getattr(app_settings, POOL_SIZE_SETTINGS[name])
+            _pools[name] = ProcessPoolExecutor(max_workers=size)
+        return _pools[name]
+
+
+def shutdown_pool(wait=True, name=None):
+    """
+    stops the worker processes of the pool ``name`` (of all the pools
+    if ``name`` is ``None``), a new pool is started when needed again
+    """
+    with _pool_lock:
+        names = [name] if name else list(_pools)
+        pools = [_pools.pop(name) for name in names if name in _pools]
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+def verify_password(user, password):
+    """
+    equivalent to ``user.check_password(password)``, the password
+    is verified by the pool of worker processes if it is enabled
+    (see ``API_PASSWORD_POOL_SIZE``); returns ``False`` if the
+    verification takes more than ``API_PASSWORD_POOL_TIMEOUT`` seconds
+    """
+    return verify_passwords([(user, password)])[0]
+
+
+def verify_passwords(credentials):
+    """
+    same as ``verify_password`` for a list of ``(user, password)``
+    tuples, returns a list of booleans; all the passwords are
+    submitted to the pool before waiting for the results,
+    so that they are verified concurrently
+    """
+    futures = [_submit(user, password) for user, password in credentials]
+    return [
+        _get_result(user, password, future)
+        for (user, password), future in zip(credentials, futures)
+    ]
+
+
+def _submit(user, password):
+    """
+    returns the future of the verification, ``None`` if
+    the password must be verified in the current process
+    """
+    if (
+        not app_settings.API_PASSWORD_POOL_SIZE
+        or not password
+        or not is_password_usable(user.password)
+    ):
+        return None
+    try:
+        return get_pool().submit(_verify, password, user.password)
+    except BrokenProcessPool:
+        logger.exception('password pool broken, verifying password in process')
+        shutdown_pool(wait=False, name='api')
+        return None
+
+
+def _get_result(user, password, future):
+    if future is None:
+        return user.check_password(password)
+    try:
+        valid, upgraded = future.result(timeout=app_settings.API_PASSWORD_POOL_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning(
+            'password verification of user {} timed out'.format(user.username)
+        )
+        return False
+    except BrokenProcessPool:
+        logger.exception('password pool broken, verifying password in process')
+        shutdown_pool(wait=False, name='api')
+        return user.check_password(password)
+    if upgraded:
+        # same as the setter used by AbstractBaseUser.check_password
+        user.password = upgraded
+        user._password = None
+        user.save(update_fields=['password'])
+    return valid
+
+
+def hash_passwords(passwords):
+    """
+    returns the hashes of ``passwords`` (list of raw passwords), in
+    the same order, calculated in chunks by the pool of worker processes
+    if it is enabled (see ``BATCH_PASSWORD_POOL_SIZE``), otherwise
+    (or if the pool breaks) in the current process
+    """
+    size = app_settings.BATCH_PASSWORD_POOL_SIZE
+    if not size or len(passwords) < 2:
+        return _make_passwords(passwords)
+    # a few chunks per worker process, so that the work is evenly spread
+    chunk_size = max(len(passwords) // (size * 4), 1)
+    chunks = [
+        passwords[i : i + chunk_size] for i in range(0, len(passwords), chunk_size)
+    ]
+    hashes = []
+    try:
+        # the results of map() are returned in the order of the chunks
+        for chunk in get_pool('batch').map(_make_passwords, chunks):
+            hashes.extend(chunk)
+    except BrokenProcessPool:
+        logger.exception('password pool broken, hashing passwords in process')
+        shutdown_pool(wait=False, name='batch')
+        return _make_passwords(passwords)
+    return hashes
@@ -0,0 +1,227 @@
+"""
+Evaluation of the checks and replies of radius groups in the authorize
+endpoint (enabled with ``API_AUTHORIZE_GROUP_POLICY``), which makes
+the group queries of the freeradius sql module unnecessary.
+
+The checks and the replies of each group are compiled once into a
+``GroupPolicy`` which is kept in memory (see ``group_policy_cache``)
+until the group, its checks or its replies change in any process.
+"""
+import logging
+import re
+from time import time
+
+from django.contrib.auth import get_user_model
+
+from . import counters, metrics
+from . import settings as app_settings
+from .cache import get_user_groupname, group_policy_cache
+from .utils import load_model
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+RadiusGroupCheck = load_model('RadiusGroupCheck')
+RadiusGroupReply = load_model('RadiusGroupReply')
+
+# operators which add the check items to the control list
+CONTROL_OPERATORS = (':=', '=', '+=')
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _numeric(compare):
+    def function(value, expected):
+        try:
+            return compare(_number(value), _number(expected))
+        except TypeError:
+            # number compared to a string
+            return False
+
+    return function
+
+
+COMPARISONS = {
+    '==': lambda value, expected: str(value) == expected,
+    '!=': lambda value, expected: str(value) != expected,
+    '>': _numeric(lambda value, expected: value > expected),
+    '>=': _numeric(lambda value, expected: value >= expected),
+    '<': _numeric(lambda value, expected: value < expected),
+    '<=': _numeric(lambda value, expected: value <= expected),
+    '=~': lambda value, pattern: bool(pattern.search(str(value))),
+    '!~': lambda value, pattern: not pattern.search(str(value)),
+}
+
+
+def add_attribute(attributes, attribute, op, value):
+    """
+    adds an attribute to ``attributes`` with the semantics of the
+    freeradius operators: ``:=`` replaces, ``=`` sets the attribute
+    only if not present yet, ``+=`` adds another value
+    """
+    if op == '=' and attribute in attributes:
+        return
+    if op == '+=' and attribute in attributes:
+        current = attributes[attribute]
+        if not isinstance(current, list):
+            current = [current]
+        attributes[attribute] = current + [value]
+        return
+    attributes[attribute] = value
+
+
+class GroupPolicy(object):
+    """
+    Checks and replies of a radius group compiled for the authorize
+    endpoint: ``conditions`` are compared with the attributes of the
+    request, ``control`` and ``reply`` are the attributes returned
+    when all the conditions are met and ``limits`` are the limits
+    enforced with the usage counters (see ``openwisp_radius.counters``)
+    """
+
+    def __init__(self, groupname, checks, replies):
+        self.groupname = groupname
+        self.conditions = []
+        self.control = {}
+        self.reply = {}
+        self.limits = {}
+        for attribute, op, value in checks:
+            if op in CONTROL_OPERATORS:
+                add_attribute(self.control, attribute, op, value)
+            else:
+                self.add_condition(attribute, op, value)
+        for attribute, value in self.control.items():
+            if attribute in counters.LIMIT_CHECKS and str(value).isdigit():
+                self.limits[attribute] = int(value)
+        for attribute, op, value in replies:
+            add_attribute(self.reply, attribute, op, value)
+
+    def add_condition(self, attribute, op, value):
+        if op == '=*':
+            self.conditions.append((attribute, lambda value: value is not None))
+            return
+        if op == '!*':
+            self.conditions.append((attribute, lambda value: value is None))
+            return
+        if op in ['=~', '!~']:
+            try:
+                value = re.compile(value)
+            except re.error:
+                logger.warning(
+                    'invalid regular expression in check {} of group {}'.format(
+                        attribute, self.groupname
+                    )
+                )
+                # the condition never matches
+                self.conditions.append((attribute, lambda value: False))
+                return
+        compare = COMPARISONS[op]
+        self.conditions.append(
+            (
+                attribute,
+                lambda current, expected=value: current is not None
+                and compare(current, expected),
+            )
+        )
+
+    def match(self, request):
+        """
+        returns ``True`` if the attributes of the
+        request (dict) meet all the conditions
+        """
+        return all(
+            condition(request.get(attribute))
+            for attribute, condition in self.conditions
+        )
+
+    @classmethod
+    def compile(cls, groupname):
+        checks = RadiusGroupCheck.objects.filter(groupname=groupname).values_list(
+            'attribute', 'op', 'value'
+        )
+        replies = RadiusGroupReply.objects.filter(groupname=groupname).values_list(
+            'attribute', 'op', 'value'
+        )
+        return cls(groupname, list(checks), list(replies))
+
+
+def get_group_policy(groupname):
+    policy = group_policy_cache.get(groupname)
+    if policy is None:
+        # changes committed while the policy is compiled invalidate it
+        loaded = time()
+        policy = GroupPolicy.compile(groupname)
+        group_policy_cache.set(groupname, policy, loaded=loaded)
+    return policy
+
+
+def get_user_group_policy(username, organization_id):
+    """
+    returns the policy of the radius group of the user with the highest
+    priority in the organization (see ``get_user_groupname``),
+    ``None`` if there isn't any
+    """
+    try:
+        groupname = get_user_groupname(username, organization_id)
+    except User.DoesNotExist:
+        return None
+    if groupname is None:
+        return None
+    return get_group_policy(groupname)
+
+
+def get_request_attributes(username, data):
+    """
+    returns the attributes of the request which can be compared
+    with the group checks: ``User-Name`` and any other radius
+    attribute sent by freeradius in the body of the request
+    """
+    request = {
+        key: value
+        for key, value in data.items()
+        if key not in ['username', 'password', 'organization']
+    }
+    request['User-Name'] = username
+    return request
+
+
+def authorize(organization_id, user, data):
+    """
+    returns a ``(accept, attributes)`` tuple for users who supplied valid
+    credentials: ``attributes`` are the control and reply attributes of
+    the group of the user, users are rejected if the group sets
+    ``Auth-Type := Reject`` or if they reached one of their limits
+    (the latter only if ``API_ACCOUNTING_COUNTERS`` is enabled);
+    like the freeradius sql module, groups whose conditions
+    are not met are ignored
+    """
+    with metrics.phase('group_policy'):
+        policy = get_user_group_policy(user.username, organization_id)
+    if policy is None:
+        return True, {}
+    if not policy.match(get_request_attributes(user.username, data)):
+        return True, {}
+    if policy.control.get('Auth-Type') == 'Reject':
+        return False, {}
+    attributes = {
+        f'control:{attribute}': value
+        for attribute, value in policy.control.items()
+        if attribute != 'Auth-Type'
+    }
+    attributes.update(
+        {f'reply:{attribute}': value for attribute, value in policy.reply.items()}
+    )
+    if policy.limits and app_settings.API_ACCOUNTING_COUNTERS:
+        accept, usage_attributes = counters.get_reply(
+            organization_id, user.username, limits=policy.limits
+        )
+        if not accept:
+            return False, usage_attributes
+        # the remaining quota takes precedence over the group replies
+        attributes.update(usage_attributes)
+    return True, attributes
@@ -0,0 +1,327 @@
+"""
+Bulk creation of the users imported in a ``RadiusBatch`` from a CSV file
+or generated with a prefix.
+
+The rows are processed in chunks (see ``BATCH_BULK_CHUNK_SIZE``): the
+users and the usernames which already exist are looked up with one
+query per chunk (the usernames taken get a numeric suffix, which is
+checked with another query), the new users are validated in memory and
+created with ``bulk_create`` together with their batch memberships,
+their organization memberships and their radius groups, each chunk is
+committed in its own transaction, hence only the data of the chunk
+being processed is kept in memory. The passwords of each chunk are
+hashed together by ``hash_passwords``, in a pool of worker processes
+if it is enabled (see ``BATCH_PASSWORD_POOL_SIZE``).
+
+``bulk_create`` does not send the ``post_save`` signals, hence the
+default radius group of the organization is assigned here for the whole
+chunk and the caches which their receivers would invalidate (the
+organizations of the users cached by openwisp-users, the users cached by
+the authorize and accounting endpoints) are invalidated explicitly.
+The generated passwords of the committed chunks are stored in a
+temporary file, so that the memory used does not grow with the number
+of rows.
+"""
+import csv
+import tempfile
+
+import swapper
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.crypto import get_random_string
+
+from . import settings as app_settings
+from .cache import invalidate_authorize_cache, invalidate_groupname_cache
+from .passwords import hash_passwords
+from .utils import iter_available_usernames, load_model
+
+CLEARTEXT_PREFIX = 'cleartext$'
+
+
+def chunked(iterable, size):
+    """
+    yields lists of ``size`` items of ``iterable`` (the last one may be shorter)
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BulkUserCreator(object):
+    """
+    Adds users to ``batch`` and to its organization: either the users
+    described by CSV rows (``username, password, email, first_name,
+    last_name``), where rows whose email belongs to an existing user
+    add that user, or users which have been generated (``add_users``)
+    """
+
+    def __init__(self, batch, password_length=None, chunk_size=None):
+        self.batch = batch
+        self.password_length = (
+            password_length or app_settings.BATCH_DEFAULT_PASSWORD_LENGTH
+        )
+        self.chunk_size = chunk_size or app_settings.BATCH_BULK_CHUNK_SIZE
+        self.User = get_user_model()
+        self.OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
+        self.RadiusUserGroup = load_model('RadiusUserGroup')
+        self.default_group = (
+            load_model('RadiusGroup')
+            .objects.filter(organization_id=batch.organization_id, default=True)
+            .first()
+        )
+        users_field = batch._meta.get_field('users')
+        self.Membership = users_field.remote_field.through
+        self.membership_fields = (
+            users_field.m2m_field_name(),
+            users_field.m2m_reverse_field_name(),
+        )
+        # temporary file of the generated passwords (created when needed)
+        self.generated_passwords = None
+        # generated passwords of the chunk which is being processed
+        self.chunk_passwords = []
+        self.created = 0
+
+    def add(self, rows):
+        """
+        processes the rows (rows which don't have 5 columns are ignored),
+        the generated passwords are returned by ``iter_generated_passwords``
+        """
+        rows = (row for row in rows if len(row) == 5)
+        for chunk in chunked(rows, self.chunk_size):
+            self.add_chunk(chunk)
+
+    def store_generated_password(self, username, password, email):
+        """
+        the password is written to the temporary file
+        once the chunk is committed (see ``save_users``)
+        """
+        self.chunk_passwords.append([username, password, email])
+
+    def flush_generated_passwords(self):
+        if not self.chunk_passwords:
+            return
+        if self.generated_passwords is None:
+            self.generated_passwords = tempfile.TemporaryFile(
+                mode='w+', newline='', encoding='utf-8'
+            )
+        csv.writer(self.generated_passwords).writerows(self.chunk_passwords)
+        self.chunk_passwords = []
+
+    def iter_generated_passwords(self):
+        """
+        yields the ``[username, password, email]`` lists
+        of the users whose password has been generated
+        """
+        if self.generated_passwords is None:
+            return
+        self.generated_passwords.seek(0)
+        yield from csv.reader(self.generated_passwords)
+
+    def close(self):
+        """
+        deletes the temporary file of the generated passwords
+        """
+        if self.generated_passwords is not None:
+            self.generated_passwords.close()
+            self.generated_passwords = None
+
+    def add_users(self, users):
+        """
+        creates the (unsaved) ``users`` and adds them to the batch,
+        their usernames must be available (see ``prefix_generate_users``)
+        """
+        for chunk in chunked(users, self.chunk_size):
+            for user in chunk:
+                user.full_clean(validate_unique=False)
+            self.save_users(chunk)
+
+    def add_chunk(self, rows):
+        self.chunk_passwords = []
+        emails = {row[2] for row in rows if row[2]}
+        batch_field, user_field = self.membership_fields
+        # users added to the batch by the previous chunks
+        added = self.Membership.objects.filter(
+            **{batch_field: self.batch.pk, user_field: OuterRef('pk')}
+        )
+        users_by_email = {
+            user.email: user
+            for user in self.User.objects.filter(email__in=emails)
+            .annotate(added=Exists(added))
+            .only('pk', 'username', 'email')
+        }
+        new_rows = []
+        new_emails = set()
+        existing_users = []
+        # identities of the existing users of the chunk
+        seen = set()
+        for row in rows:
+            email = row[2]
+            user = users_by_email.get(email) if email else None
+            if user is None:
+                # rows with the same email add the same user
+                if email not in new_emails:
+                    new_rows.append(row)
+                if email:
+                    new_emails.add(email)
+            elif not user.added and id(user) not in seen:
+                existing_users.append(user)
+                seen.add(id(user))
+        usernames = self.get_available_usernames(
+            [username or email.split('@')[0] for username, _, email, _, _ in new_rows]
+        )
+        new_users = []
+        # users whose password must be hashed and their raw passwords
+        unhashed = []
+        for row, username in zip(new_rows, usernames):
+            user, password = self.build_user(row, username)
+            new_users.append(user)
+            if password is not None:
+                unhashed.append((user, password))
+        hashes = hash_passwords([password for _, password in unhashed])
+        for (user, _), encoded in zip(unhashed, hashes):
+            user.password = encoded
+        for user in new_users:
+            # the uniqueness of username and email is ensured by add_chunk
+            user.full_clean(validate_unique=False)
+        self.save_users(new_users, existing_users)
+
+    def save_users(self, new_users, existing_users=None):
+        """
+        creates ``new_users`` and adds them, together with
+        ``existing_users``, to the batch in a single transaction
+        """
+        existing_users = existing_users or []
+        with transaction.atomic():
+            self.User.objects.bulk_create(new_users)
+            self.add_memberships(new_users, existing_users)
+        self.flush_generated_passwords()
+        self.created += len(new_users)
+        self.batch.set_progress(
+            self.batch.processed_users + len(new_users) + len(existing_users)
+        )
+        # new users cannot be cached yet
+        for user in existing_users:
+            invalidate_authorize_cache(user.pk)
+            invalidate_groupname_cache(user.pk)
+
+    def build_user(self, row, username):
+        """
+        returns a ``(user, password)`` tuple with the (unsaved) user of
+        ``row`` named ``username`` and the raw password which must be
+        hashed (``None`` if ``row`` contains an hash)
+        """
+        _, password, email, first_name, last_name = row
+        user = self.User(
+            username=username, email=email, first_name=first_name, last_name=last_name
+        )
+        if not password:
+            password = get_random_string(length=self.password_length)
+            self.store_generated_password(username, password, email)
+        elif password.startswith(CLEARTEXT_PREFIX):
+            password = password[len(CLEARTEXT_PREFIX) :]
+        else:
+            user.password = password
+            password = None
+        return user, password
+
+    def get_available_usernames(self, usernames):
+        """
+        returns the list of the available usernames for ``usernames``:
+        the usernames which are taken (by existing users or by a previous
+        item of the list) are replaced by their next candidate (see
+        ``iter_available_usernames``), the candidates are looked up
+        together until all of them are available
+        """
+        usernames = list(usernames)
+        # existing usernames and usernames assigned to the items
+        taken = set()
+        owners = {}
+        candidates = {}
+        pending = list(range(len(usernames)))
+        base_usernames = list(usernames)
+        while pending:
+            existing = set(
+                self.User.objects.filter(
+                    username__in={usernames[index] for index in pending}
+                ).values_list('username', flat=True)
+            )
+            taken.update(existing)
+            retry = []
+            for index in pending:
+                username = usernames[index]
+                owner = owners.setdefault(username, index)
+                if username not in existing and owner == index:
+                    taken.add(username)
+                    continue
+                base = base_usernames[index]
+                if base not in candidates:
+                    candidates[base] = iter_available_usernames(
+                        base, taken, prefix=True
+                    )
+                username = next(candidates[base])
+                owners[username] = index
+                usernames[index] = username
+                retry.append(index)
+            pending = retry
+        return usernames
+
+    def add_memberships(self, new_users, existing_users):
+        """
+        adds the users to the batch and to its organization, users
+        who join the organization get its default radius group
+        """
+        organization_id = self.batch.organization_id
+        existing_users = {user.pk: user for user in existing_users}
+        existing_members = set(
+            self.OrganizationUser.objects.filter(
+                organization_id=organization_id, user_id__in=existing_users
+            ).values_list('user_id', flat=True)
+        )
+        with_groups = set(
+            self.RadiusUserGroup.objects.filter(user_id__in=existing_users).values_list(
+                'user_id', flat=True
+            )
+        )
+        users = new_users + list(existing_users.values())
+        batch_field, user_field = self.membership_fields
+        self.Membership.objects.bulk_create(
+            [
+                self.Membership(**{batch_field: self.batch, user_field: user})
+                for user in users
+            ]
+        )
+        members = [user for user in users if user.pk not in existing_members]
+        self.OrganizationUser.objects.bulk_create(
+            [
+                self.OrganizationUser(
+                    user=user, organization_id=organization_id, is_admin=False
+                )
+                for user in members
+            ]
+        )
+        # the organizations of each user are cached by openwisp-users
+        # (eg: by ``User.is_member``) and invalidated on post_save
+        keys = ['user_{}_organizations'.format(user.pk) for user in members]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
+        if self.default_group is None:
+            return
+        self.RadiusUserGroup.objects.bulk_create(
+            [
+                self.RadiusUserGroup(
+                    user=user,
+                    username=user.username,
+                    group=self.default_group,
+                    groupname=self.default_group.name,
+                )
+                for user in members
+                if user.pk not in with_groups
+            ]
+        )
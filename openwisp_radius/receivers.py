@@ -1,6 +1,12 @@
 """
 Receiver functions for django signals (eg: post_save)
 """
+from .cache import (
+    invalidate_authorize_cache,
+    invalidate_group_policy_cache,
+    invalidate_groupname_cache,
+    invalidate_password_cache,
+)
 from .utils import create_default_groups, load_model
 
 
@@ -44,3 +50,27 @@ def organization_post_save(instance, **kwargs):
         rg.name = rg.name.replace(instance.__old_slug, instance.slug)
         rg.full_clean()
         rg.save()
+
+
+def authorize_cache_user_handler(instance, **kwargs):
+    invalidate_authorize_cache(instance.pk)
+
+
+def authorize_cache_related_handler(instance, **kwargs):
+    invalidate_authorize_cache(instance.user_id)
+
+
+def password_cache_user_handler(instance, **kwargs):
+    invalidate_password_cache(instance.pk)
+
+
+def groupname_cache_user_handler(instance, **kwargs):
+    invalidate_groupname_cache(instance.pk)
+
+
+def groupname_cache_usergroup_handler(instance, **kwargs):
+    invalidate_groupname_cache(instance.user_id)
+
+
+def group_policy_handler(instance, **kwargs):
+    invalidate_group_policy_cache(instance.groupname)
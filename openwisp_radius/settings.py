@@ -31,12 +31,58 @@ DEFAULT_SECRET_FORMAT = get_settings_value('DEFAULT_SECRET_FORMAT', 'NT-Password
 DISABLED_SECRET_FORMATS = get_settings_value('DISABLED_SECRET_FORMATS', [])
 BATCH_DEFAULT_PASSWORD_LENGTH = get_settings_value('BATCH_DEFAULT_PASSWORD_LENGTH', 8)
 BATCH_DELETE_EXPIRED = get_settings_value('BATCH_DELETE_EXPIRED', 18)
+BATCH_BULK_CHUNK_SIZE = get_settings_value('BATCH_BULK_CHUNK_SIZE', 1000)
 BATCH_MAIL_SUBJECT = get_settings_value('BATCH_MAIL_SUBJECT', 'Credentials')
 BATCH_MAIL_SENDER = get_settings_value('BATCH_MAIL_SENDER', settings.DEFAULT_FROM_EMAIL)
 API_AUTHORIZE_REJECT = get_settings_value('API_AUTHORIZE_REJECT', False)
 SOCIAL_LOGIN_ENABLED = 'allauth.socialaccount' in settings.INSTALLED_APPS
 DISPOSABLE_RADIUS_USER_TOKEN = get_settings_value('DISPOSABLE_RADIUS_USER_TOKEN', True)
 API_ACCOUNTING_AUTO_GROUP = get_settings_value('API_ACCOUNTING_AUTO_GROUP', True)
+API_POSTAUTH_WRITE_BEHIND = get_settings_value('API_POSTAUTH_WRITE_BEHIND', False)
+API_POSTAUTH_QUEUE_SIZE = get_settings_value('API_POSTAUTH_QUEUE_SIZE', 10000)
+API_POSTAUTH_QUEUE_TIMEOUT = get_settings_value('API_POSTAUTH_QUEUE_TIMEOUT', 0.1)
+API_POSTAUTH_BATCH_SIZE = get_settings_value('API_POSTAUTH_BATCH_SIZE', 100)
+API_POSTAUTH_FLUSH_INTERVAL = get_settings_value('API_POSTAUTH_FLUSH_INTERVAL', 1)
+API_GROUPNAME_CACHE_SIZE = get_settings_value('API_GROUPNAME_CACHE_SIZE', 0)
+API_GROUPNAME_CACHE_TIMEOUT = get_settings_value('API_GROUPNAME_CACHE_TIMEOUT', 60)
+ASGI_THREADS = get_settings_value('ASGI_THREADS', 20)
+ASGI_ORGANIZATION_CONCURRENCY = get_settings_value('ASGI_ORGANIZATION_CONCURRENCY', 10)
+ASGI_QUEUE_TIMEOUT = get_settings_value('ASGI_QUEUE_TIMEOUT', 5)
+API_ACCOUNTING_UPSERT = get_settings_value('API_ACCOUNTING_UPSERT', False)
+ACCOUNTING_PARTITIONED = get_settings_value('ACCOUNTING_PARTITIONED', False)
+METRICS_ENABLED = get_settings_value('METRICS_ENABLED', False)
+METRICS_SINKS = get_settings_value(
+    'METRICS_SINKS', ['openwisp_radius.metrics.LoggingSink']
+)
+METRICS_STATSD_HOST = get_settings_value('METRICS_STATSD_HOST', 'localhost')
+METRICS_STATSD_PORT = get_settings_value('METRICS_STATSD_PORT', 8125)
+METRICS_STATSD_PREFIX = get_settings_value('METRICS_STATSD_PREFIX', 'openwisp_radius')
+METRICS_CACHE = get_settings_value('METRICS_CACHE', 'default')
+METRICS_HISTOGRAM_INTERVAL = get_settings_value('METRICS_HISTOGRAM_INTERVAL', 10)
+API_ACCOUNTING_BATCH_MAX_SIZE = get_settings_value(
+    'API_ACCOUNTING_BATCH_MAX_SIZE', 1000
+)
+API_AUTHORIZE_CACHE_SIZE = get_settings_value('API_AUTHORIZE_CACHE_SIZE', 0)
+API_AUTHORIZE_CACHE_TIMEOUT = get_settings_value('API_AUTHORIZE_CACHE_TIMEOUT', 60)
+API_COMPACT_RESPONSES = get_settings_value('API_COMPACT_RESPONSES', False)
+API_AUTHORIZE_BATCH_MAX_SIZE = get_settings_value('API_AUTHORIZE_BATCH_MAX_SIZE', 100)
+API_PASSWORD_CACHE_SIZE = get_settings_value('API_PASSWORD_CACHE_SIZE', 0)
+API_PASSWORD_CACHE_TIMEOUT = get_settings_value('API_PASSWORD_CACHE_TIMEOUT', 300)
+API_PASSWORD_POOL_SIZE = get_settings_value('API_PASSWORD_POOL_SIZE', 0)
+API_PASSWORD_POOL_TIMEOUT = get_settings_value('API_PASSWORD_POOL_TIMEOUT', 5)
+BATCH_PASSWORD_POOL_SIZE = get_settings_value('BATCH_PASSWORD_POOL_SIZE', 0)
+BATCH_JOB_WORKERS = get_settings_value('BATCH_JOB_WORKERS', 0)
+API_TOKEN_LOCAL_CACHE_SIZE = get_settings_value('API_TOKEN_LOCAL_CACHE_SIZE', 0)
+API_TOKEN_LOCAL_CACHE_TIMEOUT = get_settings_value('API_TOKEN_LOCAL_CACHE_TIMEOUT', 30)
+API_ACCOUNTING_COUNTERS = get_settings_value('API_ACCOUNTING_COUNTERS', False)
+API_AUTHORIZE_GROUP_POLICY = get_settings_value('API_AUTHORIZE_GROUP_POLICY', False)
+API_GROUP_POLICY_CACHE_SIZE = get_settings_value('API_GROUP_POLICY_CACHE_SIZE', 1000)
+API_GROUP_POLICY_CACHE_TIMEOUT = get_settings_value(
+    'API_GROUP_POLICY_CACHE_TIMEOUT', 60
+)
+API_COUNTERS_TRAFFIC_REPLY = get_settings_value(
+    'API_COUNTERS_TRAFFIC_REPLY', 'ChilliSpot-Max-Total-Octets'
+)
 EXTRA_NAS_TYPES = get_settings_value('EXTRA_NAS_TYPES', tuple())
 BATCH_PDF_TEMPLATE = get_settings_value(
     'BATCH_PDF_TEMPLATE',
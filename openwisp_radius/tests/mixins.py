@@ -5,6 +5,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
+from ..cache import authorize_cache, group_policy_cache, groupname_cache, password_cache
 from ..utils import load_model
 from . import CallCommandMixin as BaseCallCommandMixin
 from . import CreateRadiusObjectsMixin as BaseCreateRadiusObjectsMixin
@@ -123,6 +124,11 @@ class BaseTestCase(DefaultOrgMixin, CreateRadiusObjectsMixin, TestCase):
     def tearDown(self):
         for radbatch in RadiusBatch.objects.all():
             radbatch.delete()
+        # rolled back transactions do not invalidate the cache
+        authorize_cache.clear()
+        groupname_cache.clear()
+        group_policy_cache.clear()
+        password_cache.clear()
 
     def _superuser_login(self):
         user = User.objects.create_superuser(
@@ -1,3 +1,5 @@
+from unittest import mock
+
 import swapper
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
@@ -5,6 +7,7 @@ from django.urls import reverse
 
 from openwisp_users.tests.utils import TestMultitenantAdminMixin
 
+from .. import jobs
 from .. import settings as app_settings
 from ..utils import load_model
 from . import CallCommandMixin, FileMixin, PostParamsMixin
@@ -370,6 +373,27 @@ class TestAdmin(
         error_message = 'Ensure this value is greater than or equal to 1'
         self.assertTrue(error_message in str(response.content))
 
+    @mock.patch.object(app_settings, 'BATCH_JOB_WORKERS', 2)
+    def test_radius_batch_save_model_background(self):
+        add_url = reverse('admin:{0}_radiusbatch_add'.format(self.app_label))
+        with mock.patch.object(jobs, 'submit') as submit:
+            response = self.client.post(
+                add_url, self._get_prefix_post_data(), follow=True
+            )
+        self.assertContains(response, 'are being added in background')
+        batch = RadiusBatch.objects.get()
+        self.assertEqual(batch.status, 'pending')
+        self.assertEqual(batch.total_users, 10)
+        self.assertEqual(batch.users.count(), 0)
+        submit.assert_called_once_with(
+            batch, number_of_users=10, password_length=mock.ANY
+        )
+        change_url = reverse(
+            'admin:{0}_radiusbatch_change'.format(self.app_label), args=[batch.pk]
+        )
+        response = self.client.get(change_url)
+        self.assertContains(response, 'Processed users')
+
     def test_radiusbatch_no_of_users(self):
         r = self._create_radius_batch(
             name='test', strategy='prefix', prefix='test-prefix5'
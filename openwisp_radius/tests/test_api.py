@@ -1,17 +1,21 @@
 import json
 import os
+from concurrent.futures.process import BrokenProcessPool
 from datetime import timedelta
+from time import sleep, time
+from types import ModuleType
 from unittest import mock
 
 import swapper
 from dateutil import parser
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.tokens import default_token_generator
 from django.core import mail
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.test import override_settings
+from django.test import Client, override_settings
 from django.urls import reverse
 from django.utils.encoding import force_bytes, force_text
 from django.utils.http import urlsafe_base64_encode
@@ -21,8 +25,25 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from .. import passwords
 from .. import settings as app_settings
+from ..api import fast_views
+from ..api import views as api_views
+from ..api.freeradius import render_cached
+from ..api.urls import get_api_urls
+from ..cache import (
+    authorize_cache,
+    get_authorize_invalidation_key,
+    get_organization_token,
+    get_organization_token_cache_key,
+    get_user_groupname,
+    groupname_cache,
+    organization_token_cache,
+    password_cache,
+)
+from ..passwords import shutdown_pool
 from ..utils import load_model
+from ..writebehind import WriteBehindQueue, postauth_queue
 from . import _TEST_DATE
 from .mixins import ApiTokenMixin, BaseTestCase
 
@@ -32,6 +53,7 @@ RadiusToken = load_model('RadiusToken')
 RadiusAccounting = load_model('RadiusAccounting')
 RadiusPostAuth = load_model('RadiusPostAuth')
 RadiusBatch = load_model('RadiusBatch')
+RadiusGroup = load_model('RadiusGroup')
 RadiusUserGroup = load_model('RadiusUserGroup')
 OrganizationRadiusSettings = load_model('OrganizationRadiusSettings')
 Organization = swapper.load_model('openwisp_users', 'Organization')
@@ -1146,6 +1168,161 @@ class TestApi(ApiTokenMixin, BaseTestCase):
         self.assertEqual(response.status_code, 404)
 
 
+@override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+class TestFastViews(TestApi):
+    """
+    runs the API tests against ``openwisp_radius.api.fast_views``
+    """
+
+    class client_class(Client):
+        def request(self, **request):
+            response = super().request(**request)
+            # emulates the data attribute of DRF responses
+            if not hasattr(response, 'data') and response['Content-Type'] == (
+                'application/json'
+            ):
+                response.data = response.json() if response.content else None
+            return response
+
+    def test_get_api_urls(self):
+        urls = {url.name: url.callback for url in get_api_urls(fast_views)}
+        self.assertEqual(urls['authorize'], fast_views.authorize)
+        self.assertEqual(urls['accounting'], fast_views.accounting)
+        self.assertEqual(urls['batch'], api_views.batch)
+
+    def test_get_api_urls_optional_views(self):
+        optional = ['authorize_batch', 'usage', 'accounting_batch', 'batch_detail']
+        # custom api_views module which does not define the optional views
+        custom_views = ModuleType('custom_views')
+        for name, value in vars(fast_views).items():
+            if name not in optional:
+                setattr(custom_views, name, value)
+        urls = {url.name: url.callback for url in get_api_urls(custom_views)}
+        self.assertEqual(urls['authorize'], fast_views.authorize)
+        for name in optional:
+            self.assertNotIn(name, urls)
+
+    def test_authorize_json(self):
+        self._create_user(username='molly', password='barbar')
+        response = self.client.post(
+            reverse('radius:authorize'),
+            json.dumps({'username': 'molly', 'password': 'barbar'}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'control:Auth-Type': 'Accept'})
+
+    def test_invalid_json(self):
+        response = self.client.post(
+            reverse('radius:authorize'),
+            '{"username":',
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('detail', response.json())
+
+    def test_accounting_validation_errors(self):
+        data = {
+            'status_type': 'Interim-Update',
+            'unique_id': '75058e50',
+            'nas_ip_address': 'wrong',
+            'session_time': 'a lot',
+            'framed_ipv6_prefix': 'wrong',
+        }
+        response = self.client.post(
+            reverse('radius:accounting'),
+            json.dumps(data),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.json().keys()),
+            {'session_id', 'nas_ip_address', 'session_time', 'framed_ipv6_prefix'},
+        )
+        self.assertEqual(RadiusAccounting.objects.count(), 0)
+
+    def test_get_authorize_view(self):
+        response = self.client.get(
+            reverse('radius:authorize'), HTTP_AUTHORIZATION=self.auth_header
+        )
+        self.assertEqual(response.status_code, 405)
+
+
+class TestCompactResponses(TestApi):
+    """
+    runs the API tests with ``API_COMPACT_RESPONSES`` enabled
+    """
+
+    client_class = TestFastViews.client_class
+
+    def setUp(self):
+        super().setUp()
+        app_settings.API_COMPACT_RESPONSES = True
+        self.addCleanup(setattr, app_settings, 'API_COMPACT_RESPONSES', False)
+
+    def _assert_compact(self, response, content):
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['Content-Length'], str(len(content)))
+        # django-rest-framework omits the content type of empty bodies
+        if content:
+            self.assertEqual(response['Content-Type'], 'application/json')
+        # the response is finalized by django-rest-framework
+        self.assertTrue(response.has_header('Allow'))
+        self.assertIn('Accept', response['Vary'])
+
+    def test_compact_authorize(self):
+        self._create_user(username='molly', password='barbar')
+        response = self.client.post(
+            reverse('radius:authorize'),
+            {'username': 'molly', 'password': 'barbar'},
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 200)
+        self._assert_compact(response, b'{"control:Auth-Type":"Accept"}')
+        response = self.client.post(
+            reverse('radius:authorize'),
+            {'username': 'molly', 'password': 'wrong'},
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 200)
+        self._assert_compact(response, b'')
+
+    def test_compact_postauth(self):
+        response = self.client.post(
+            reverse('radius:postauth'),
+            self._get_postauth_params(),
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 201)
+        self._assert_compact(response, b'')
+
+    def test_compact_accounting(self):
+        data = self.acct_post_data
+        data['status_type'] = 'Start'
+        response = self.post_json(data)
+        self.assertEqual(response.status_code, 201)
+        self._assert_compact(response, b'')
+        # the list of accounting sessions is rendered by the default renderers
+        response = self.client.get(
+            reverse('radius:accounting'), HTTP_AUTHORIZATION=self.auth_header
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Allow'))
+
+    def test_render_cached(self):
+        body = render_cached({'control:Auth-Type': 'Accept'})
+        self.assertIs(render_cached({'control:Auth-Type': 'Accept'}), body)
+        self.assertEqual(render_cached(None), b'')
+        self.assertEqual(render_cached({'errors': ['a', 'b']}), b'{"errors":["a","b"]}')
+        # equal values of different types are not confused
+        self.assertEqual(render_cached({'a': 1}), b'{"a":1}')
+        self.assertEqual(render_cached({'a': True}), b'{"a":true}')
+        self.assertEqual(render_cached({'a': 1.0}), b'{"a":1.0}')
+
+
 class TestApiReject(ApiTokenMixin, BaseTestCase):
     @classmethod
     def setUpClass(cls):
@@ -1175,6 +1352,860 @@ class TestApiReject(ApiTokenMixin, BaseTestCase):
         self.assertEqual(response.data, {'control:Auth-Type': 'Reject'})
 
 
+class TestAuthorizeCache(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        authorize_cache.clear()
+        authorize_cache.maxsize = 100
+
+    def tearDown(self):
+        authorize_cache.maxsize = app_settings.API_AUTHORIZE_CACHE_SIZE
+        authorize_cache.clear()
+        super().tearDown()
+
+    def _authorize(self, username='molly', password='barbar'):
+        return self.client.post(
+            reverse('radius:authorize'),
+            {'username': username, 'password': password},
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def test_cache_hit(self):
+        self._create_user(username='molly', password='barbar')
+        response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.assertEqual(authorize_cache.stats()['misses'], 1)
+        self.assertEqual(len(authorize_cache), 1)
+        with self.assertNumQueries(0):
+            response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.assertEqual(authorize_cache.stats()['hits'], 1)
+
+    def test_failure_not_cached(self):
+        self._create_user(username='molly', password='barbar')
+        response = self._authorize(username='wrong')
+        self.assertEqual(response.data, None)
+        self.assertEqual(len(authorize_cache), 0)
+
+    def test_password_change_invalidates(self):
+        user = self._create_user(username='molly', password='barbar')
+        self._authorize()
+        self.assertEqual(len(authorize_cache), 1)
+        user.set_password('changed')
+        user.save()
+        self.assertEqual(len(authorize_cache), 0)
+        response = self._authorize()
+        self.assertEqual(response.data, None)
+        response = self._authorize(password='changed')
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+
+    def test_invalidated_by_other_process(self):
+        user = self._create_user(username='molly', password='barbar')
+        self._authorize()
+        self.assertEqual(len(authorize_cache), 1)
+        # simulates a change saved by another process: the local
+        # entry is kept but the shared invalidation time is set
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        key = get_authorize_invalidation_key(user.pk)
+        self.addCleanup(cache.delete, key)
+        cache.set(key, time())
+        response = self._authorize()
+        self.assertEqual(response.data, None)
+        self.assertEqual(len(authorize_cache), 0)
+
+    def test_deactivation_invalidates(self):
+        user = self._create_user(username='molly', password='barbar')
+        self._authorize()
+        user.is_active = False
+        user.save()
+        response = self._authorize()
+        self.assertEqual(response.data, None)
+
+    def test_membership_removal_invalidates(self):
+        self._create_user(username='molly', password='barbar')
+        self._authorize()
+        OrganizationUser.objects.filter(user__username='molly').delete()
+        self.assertEqual(len(authorize_cache), 0)
+        response = self._authorize()
+        self.assertEqual(response.data, None)
+
+    def test_other_organization(self):
+        self._create_user(username='molly', password='barbar')
+        self._authorize()
+        org = self._create_org(name='other', slug='other')
+        rad = OrganizationRadiusSettings.objects.create(organization=org)
+        response = self.client.post(
+            reverse('radius:authorize'),
+            {'username': 'molly', 'password': 'barbar'},
+            HTTP_AUTHORIZATION='Bearer {0} {1}'.format(org.pk, rad.token),
+        )
+        self.assertEqual(response.data, None)
+
+    def test_disposable_radius_token(self):
+        user = self._create_user(username='molly', password='barbar')
+        token = RadiusToken.objects.create(user=user)
+        response = self._authorize(password=token.key)
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.assertEqual(RadiusToken.objects.count(), 0)
+        response = self._authorize(password=token.key)
+        self.assertEqual(response.data, None)
+
+    def test_radius_token_not_disposable(self):
+        app_settings.DISPOSABLE_RADIUS_USER_TOKEN = False
+        self.addCleanup(setattr, app_settings, 'DISPOSABLE_RADIUS_USER_TOKEN', True)
+        user = self._create_user(username='molly', password='barbar')
+        token = RadiusToken.objects.create(user=user)
+        for i in range(2):
+            response = self._authorize(password=token.key)
+            self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.assertEqual(RadiusToken.objects.count(), 1)
+
+
+class TestPostAuthWriteBehind(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app_settings.API_POSTAUTH_WRITE_BEHIND = True
+        # the background thread is tested separately
+        patcher = mock.patch.object(postauth_queue, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        app_settings.API_POSTAUTH_WRITE_BEHIND = False
+        postauth_queue._get_nowait(postauth_queue.maxsize)
+        super().tearDown()
+
+    def _post(self, **kwargs):
+        return self.client.post(
+            reverse('radius:postauth'),
+            self._get_postauth_params(**kwargs),
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def test_postauth_queued(self):
+        # caches the organization token
+        self._post(reply='')
+        enqueued = postauth_queue.enqueued
+        with self.assertNumQueries(0):
+            response = self._post()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, None)
+        self.assertEqual(RadiusPostAuth.objects.count(), 0)
+        self.assertEqual(postauth_queue.stats()['depth'], 1)
+        self.assertEqual(postauth_queue.enqueued, enqueued + 1)
+        self._post(username='molly', password='barba', reply='Access-Reject')
+        with self.assertNumQueries(1):
+            postauth_queue.flush()
+        self.assertEqual(RadiusPostAuth.objects.count(), 2)
+        self.assertEqual(postauth_queue.stats()['depth'], 0)
+        accept = RadiusPostAuth.objects.get(reply='Access-Accept')
+        self.assertEqual(accept.password, '')
+        self.assertEqual(accept.organization_id, self.default_org.pk)
+        reject = RadiusPostAuth.objects.get(reply='Access-Reject')
+        self.assertEqual(reject.password, 'barba')
+
+    def test_postauth_validation_error(self):
+        response = self._post(reply='')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(postauth_queue.stats()['depth'], 0)
+
+    def test_queue_full(self):
+        queue = WriteBehindQueue(
+            write=mock.Mock(),
+            maxsize=1,
+            batch_size=10,
+            flush_interval=1,
+            put_timeout=0,
+        )
+        with mock.patch.object(queue, 'start'):
+            self.assertTrue(queue.put(RadiusPostAuth()))
+            with mock.patch('openwisp_radius.writebehind.logger') as logger:
+                self.assertFalse(queue.put(RadiusPostAuth()))
+                logger.warning.assert_called_once()
+        self.assertEqual(queue.stats()['dropped'], 1)
+        self.assertEqual(queue.stats()['depth'], 1)
+        queue.flush()
+        queue.write.assert_called_once()
+        self.assertEqual(queue.stats()['written'], 1)
+
+    def test_write_failure(self):
+        queue = WriteBehindQueue(
+            write=mock.Mock(side_effect=ValueError),
+            maxsize=10,
+            batch_size=10,
+            flush_interval=1,
+            put_timeout=0,
+        )
+        with mock.patch.object(queue, 'start'):
+            queue.put(RadiusPostAuth())
+        with mock.patch('openwisp_radius.writebehind.logger') as logger:
+            queue.flush()
+            logger.exception.assert_called_once()
+        self.assertEqual(queue.stats()['failed'], 1)
+
+    def test_write_failure_one_by_one(self):
+        def write(batch):
+            if None in batch:
+                raise ValueError()
+            written.extend(batch)
+
+        written = []
+        queue = WriteBehindQueue(
+            write=write, maxsize=10, batch_size=10, flush_interval=1, put_timeout=0
+        )
+        with mock.patch.object(queue, 'start'):
+            for instance in [1, None, 2]:
+                queue.put(instance)
+        with mock.patch('openwisp_radius.writebehind.logger') as logger:
+            queue.flush()
+            logger.warning.assert_called_once()
+            logger.exception.assert_called_once()
+        self.assertEqual(written, [1, 2])
+        self.assertEqual(queue.stats()['written'], 2)
+        self.assertEqual(queue.stats()['failed'], 1)
+
+    def test_postauth_date_queued(self):
+        queued = now() - timedelta(minutes=5)
+        with freeze_time(queued):
+            self._post()
+        postauth_queue.flush()
+        self.assertEqual(RadiusPostAuth.objects.get().date, queued)
+
+    def test_background_thread(self):
+        written = []
+        queue = WriteBehindQueue(
+            write=written.append,
+            maxsize=10,
+            batch_size=2,
+            flush_interval=0.05,
+            put_timeout=1,
+        )
+        for i in range(5):
+            queue.put(i)
+        for i in range(100):
+            if queue.stats()['written'] == 5:
+                break
+            sleep(0.01)
+        self.assertEqual(sum(written, []), list(range(5)))
+        self.assertTrue(all(len(batch) <= 2 for batch in written))
+        queue.put(5)
+        queue.stop()
+        self.assertEqual(sum(written, []), list(range(6)))
+        self.assertEqual(queue.stats()['written'], 6)
+
+
+class TestAccountingUpsert(ApiTokenMixin, BaseTestCase):
+    _url = reverse('radius:accounting')
+
+    def setUp(self):
+        super().setUp()
+        app_settings.API_ACCOUNTING_UPSERT = True
+
+    def tearDown(self):
+        app_settings.API_ACCOUNTING_UPSERT = False
+        super().tearDown()
+
+    def _post(self, status_type, unique_id='75058e50', **kwargs):
+        data = {
+            'status_type': status_type,
+            'unique_id': unique_id,
+            'session_id': '35000006',
+            'nas_ip_address': '172.16.64.91',
+            'username': 'admin',
+            'session_time': 261,
+            'input_octets': 1111909,
+            'output_octets': 1511074444,
+        }
+        data.update(kwargs)
+        return self.client.post(
+            self._url,
+            data=json.dumps(data),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    @freeze_time(START_DATE)
+    def test_start(self):
+        response = self._post('Start', session_time='', input_octets='')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, None)
+        ra = RadiusAccounting.objects.get()
+        self.assertEqual(ra.organization, self._create_org())
+        self.assertEqual(ra.session_time, 0)
+        self.assertEqual(ra.input_octets, 0)
+        self.assertEqual(ra.start_time, now())
+        self.assertIsNone(ra.update_time)
+
+    def test_one_write(self):
+        app_settings.API_ACCOUNTING_AUTO_GROUP = False
+        self.addCleanup(setattr, app_settings, 'API_ACCOUNTING_AUTO_GROUP', True)
+        # caches the organization token
+        self._post('Start')
+        for status_type in ['Start', 'Interim-Update', 'Stop']:
+            with self.assertNumQueries(1):
+                self._post(status_type)
+        with self.assertNumQueries(1):
+            self._post('Interim-Update', unique_id='reordered')
+        self.assertEqual(RadiusAccounting.objects.count(), 2)
+
+    def test_update(self):
+        self._post('Start')
+        ra = RadiusAccounting.objects.get()
+        response = self._post('Interim-Update', session_time=300)
+        self.assertEqual(response.status_code, 200)
+        ra2 = RadiusAccounting.objects.get()
+        self.assertEqual(ra2.pk, ra.pk)
+        self.assertEqual(ra2.start_time, ra.start_time)
+        self.assertEqual(ra2.session_time, 300)
+        self.assertIsNotNone(ra2.update_time)
+        self.assertIsNone(ra2.stop_time)
+        response = self._post('Stop', session_time=600, terminate_cause='User_Request')
+        self.assertEqual(response.status_code, 200)
+        ra2.refresh_from_db()
+        self.assertEqual(ra2.session_time, 600)
+        self.assertEqual(ra2.terminate_cause, 'User_Request')
+        self.assertIsNotNone(ra2.stop_time)
+
+    @freeze_time(START_DATE)
+    def test_stop_before_start(self):
+        response = self._post('Stop')
+        self.assertEqual(response.status_code, 200)
+        ra = RadiusAccounting.objects.get()
+        self.assertEqual(ra.start_time, now())
+        self.assertEqual(ra.stop_time, now())
+        response = self._post('Start', session_time=0)
+        ra.refresh_from_db()
+        self.assertEqual(ra.stop_time, now())
+        self.assertEqual(ra.session_time, 0)
+
+    def test_validation_error(self):
+        response = self._post('Start', nas_ip_address='wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nas_ip_address', response.data)
+        self.assertEqual(RadiusAccounting.objects.count(), 0)
+
+    def test_other_organization(self):
+        org = self._create_org(name='other', slug='other')
+        RadiusAccounting.objects.create(
+            unique_id='other',
+            session_id='1',
+            nas_ip_address='127.0.0.1',
+            organization=org,
+        )
+        response = self._post('Interim-Update', unique_id='other')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('unique_id', response.data)
+        ra = RadiusAccounting.objects.get()
+        self.assertIsNone(ra.session_time)
+        self.assertEqual(ra.organization, org)
+
+    def test_auto_groupname(self):
+        user = self._create_user(
+            username='tester', email='tester@test.org', password='tester'
+        )
+        usergroup1 = self._create_radius_usergroup(
+            groupname='group1', priority=2, username='testgroup1'
+        )
+        usergroup2 = self._create_radius_usergroup(
+            groupname='group2', priority=1, username='testgroup2'
+        )
+        user.radiususergroup_set.set([usergroup1, usergroup2])
+        self._post('Start', username='tester')
+        ra = RadiusAccounting.objects.get()
+        self.assertEqual(ra.groupname, 'group2')
+        # the groupname is set only when the session is created
+        RadiusAccounting.objects.update(groupname='changed')
+        self._post('Stop', username='tester')
+        ra.refresh_from_db()
+        self.assertEqual(ra.groupname, 'changed')
+
+
+class TestAccountingPartitioned(ApiTokenMixin, BaseTestCase):
+    _url = reverse('radius:accounting')
+
+    def setUp(self):
+        super().setUp()
+        app_settings.ACCOUNTING_PARTITIONED = True
+        self.addCleanup(setattr, app_settings, 'ACCOUNTING_PARTITIONED', False)
+
+    def _post(self, status_type, unique_id='75058e50', **kwargs):
+        data = {
+            'status_type': status_type,
+            'unique_id': unique_id,
+            'session_id': '35000006',
+            'nas_ip_address': '172.16.64.91',
+            'username': 'admin',
+            'session_time': 0,
+            'input_octets': 0,
+            'output_octets': 0,
+        }
+        data.update(kwargs)
+        return self.client.post(
+            self._url,
+            data=json.dumps(data),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_duplicated_start(self):
+        response = self._post('Start')
+        self.assertEqual(response.status_code, 201)
+        # the session is updated instead of inserted again
+        response = self._post('Start', session_time=10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RadiusAccounting.objects.get().session_time, 10)
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_other_organization(self):
+        org = self._create_org(name='other', slug='other')
+        RadiusAccounting.objects.create(
+            unique_id='75058e50',
+            session_id='1',
+            nas_ip_address='127.0.0.1',
+            organization=org,
+        )
+        response = self._post('Start')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('unique_id', response.json())
+        self.assertEqual(RadiusAccounting.objects.count(), 1)
+
+    def test_upsert(self):
+        app_settings.API_ACCOUNTING_UPSERT = True
+        self.addCleanup(setattr, app_settings, 'API_ACCOUNTING_UPSERT', False)
+        manager = RadiusAccounting.objects
+        with mock.patch.object(
+            manager, '_upsert_fallback', wraps=manager._upsert_fallback
+        ) as fallback:
+            self.assertEqual(self._post('Start').status_code, 201)
+            self.assertEqual(self._post('Stop', session_time=30).status_code, 200)
+        self.assertEqual(fallback.call_count, 2)
+        self.assertEqual(RadiusAccounting.objects.get().session_time, 30)
+
+    def test_stop_time_filter(self):
+        queryset = RadiusAccounting.objects.all()
+        filterset = api_views.AccountingFilter(
+            {'stop_time': '2020-01-01 00:00:00'}, queryset=queryset
+        )
+        where = str(filterset.qs.query).split(' WHERE ')[1]
+        # the condition on the start time allows to prune the partitions
+        self.assertIn('acctstarttime', where)
+        self.assertIn('acctstoptime', where)
+        # sessions without start time are not excluded
+        session = RadiusAccounting.objects.create(
+            unique_id='75058e50',
+            session_id='1',
+            nas_ip_address='127.0.0.1',
+            organization=self.default_org,
+            stop_time=parser.parse('2019-12-31 00:00:00+00:00'),
+        )
+        queryset.update(start_time=None)
+        self.assertEqual(list(filterset.qs), [session])
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_start_time_not_null(self):
+        response = self._post('Interim-Update', session_time=10)
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(RadiusAccounting.objects.get().start_time)
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_insert_locked(self):
+        manager = RadiusAccounting.objects
+        with mock.patch.object(manager, 'lock_unique_id') as lock_unique_id:
+            self.assertEqual(self._post('Start').status_code, 201)
+        lock_unique_id.assert_called_once_with('75058e50', using=None)
+
+    def test_insert_locked_drf(self):
+        manager = RadiusAccounting.objects
+        with mock.patch.object(manager, 'lock_unique_id') as lock_unique_id:
+            self.assertEqual(self._post('Start').status_code, 201)
+        lock_unique_id.assert_called_once_with('75058e50', using=None)
+
+    def test_concurrent_insert_drf(self):
+        manager = RadiusAccounting.objects
+        lock_new_session = manager.lock_new_session
+
+        def insert_concurrently(unique_id):
+            # the session is inserted by a concurrent request
+            # after the validation of the serializer
+            self._create_radius_accounting(
+                unique_id=unique_id, session_id='1', nas_ip_address='127.0.0.1'
+            )
+            return lock_new_session(unique_id)
+
+        with mock.patch.object(
+            manager, 'lock_new_session', side_effect=insert_concurrently
+        ):
+            response = self._post('Start', session_time=10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RadiusAccounting.objects.get().session_time, 10)
+
+    def test_batch_locked(self):
+        manager = RadiusAccounting.objects
+        packet = {
+            'status_type': 'Start',
+            'session_id': '35000006',
+            'nas_ip_address': '172.16.64.91',
+            'username': 'admin',
+        }
+        with mock.patch.object(manager, 'lock_unique_ids') as lock_unique_ids:
+            response = self.client.post(
+                reverse('radius:accounting_batch'),
+                data=json.dumps(
+                    [dict(packet, unique_id='a'), dict(packet, unique_id='b')]
+                ),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=self.auth_header,
+            )
+        self.assertEqual(response.status_code, 200)
+        lock_unique_ids.assert_called_once_with({'a', 'b'})
+
+    def test_upsert_locked(self):
+        app_settings.API_ACCOUNTING_UPSERT = True
+        self.addCleanup(setattr, app_settings, 'API_ACCOUNTING_UPSERT', False)
+        manager = RadiusAccounting.objects
+        with mock.patch.object(manager, 'lock_unique_id') as lock_unique_id:
+            self.assertEqual(self._post('Start').status_code, 201)
+        lock_unique_id.assert_called_once_with('75058e50', using='default')
+
+
+class TestAccountingBatch(ApiTokenMixin, BaseTestCase):
+    _url = reverse('radius:accounting_batch')
+
+    def _packet(self, unique_id='75058e50', status_type='Interim-Update', **kwargs):
+        packet = {
+            'status_type': status_type,
+            'unique_id': unique_id,
+            'session_id': '35000006',
+            'nas_ip_address': '172.16.64.91',
+            'username': 'admin',
+            'session_time': 261,
+            'input_octets': 1111909,
+            'output_octets': 1511074444,
+        }
+        packet.update(kwargs)
+        return packet
+
+    def _post(self, data, content_type='application/json', **kwargs):
+        if content_type == 'application/json':
+            data = json.dumps(data)
+        return self.client.post(
+            self._url,
+            data=data,
+            content_type=content_type,
+            HTTP_AUTHORIZATION=self.auth_header,
+            **kwargs,
+        )
+
+    def test_unauthorized(self):
+        response = self.client.post(
+            self._url, data='[]', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_and_update(self):
+        self._create_radius_accounting(
+            unique_id='existing', session_id='1', nas_ip_address='127.0.0.1'
+        )
+        packets = [
+            self._packet('new', status_type='Start', session_time=''),
+            self._packet('existing'),
+            self._packet('new', session_time=300),
+            self._packet('existing', status_type='Stop', session_time=600),
+            self._packet('ignored', status_type='Accounting-On'),
+        ]
+        # caches the organization token
+        self._post([])
+        # savepoint, existing sessions, groupnames, insert, update, release
+        with self.assertNumQueries(6):
+            response = self._post(packets)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['unique_id'], r['status']) for r in response.data],
+            [
+                ('new', 'created'),
+                ('existing', 'updated'),
+                ('new', 'updated'),
+                ('existing', 'updated'),
+                ('ignored', 'ignored'),
+            ],
+        )
+        self.assertEqual(RadiusAccounting.objects.count(), 2)
+        new = RadiusAccounting.objects.get(unique_id='new')
+        self.assertEqual(new.session_time, 300)
+        self.assertIsNotNone(new.start_time)
+        self.assertIsNone(new.stop_time)
+        existing = RadiusAccounting.objects.get(unique_id='existing')
+        self.assertEqual(existing.session_time, 600)
+        self.assertEqual(existing.output_octets, 1511074444)
+        self.assertIsNotNone(existing.stop_time)
+
+    def test_ndjson(self):
+        data = '\n'.join(
+            json.dumps(self._packet(unique_id)) for unique_id in ['one', 'two']
+        )
+        response = self._post(data, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data], ['created'] * 2)
+        self.assertEqual(RadiusAccounting.objects.count(), 2)
+
+    def test_invalid_ndjson(self):
+        response = self._post('{"unique_id":\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_packets(self):
+        packets = [
+            self._packet('valid'),
+            self._packet('invalid', status_type='wrong'),
+            self._packet('invalid2', session_time='a lot'),
+            'not a packet',
+        ]
+        response = self._post(packets)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r['status'] for r in response.data],
+            ['created', 'error', 'error', 'error'],
+        )
+        self.assertIn('status_type', response.data[1]['errors'])
+        self.assertIn('session_time', response.data[2]['errors'])
+        self.assertEqual(RadiusAccounting.objects.count(), 1)
+
+    def test_other_organization(self):
+        org = self._create_org(name='other', slug='other')
+        RadiusAccounting.objects.create(
+            unique_id='other',
+            session_id='1',
+            nas_ip_address='127.0.0.1',
+            organization=org,
+        )
+        response = self._post([self._packet('other')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['status'], 'error')
+        self.assertIn('unique_id', response.data[0]['errors'])
+        ra = RadiusAccounting.objects.get(unique_id='other')
+        self.assertEqual(ra.session_time, None)
+        self.assertEqual(ra.organization, org)
+
+    def test_not_a_list(self):
+        response = self._post(self._packet())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(RadiusAccounting.objects.count(), 0)
+
+    def test_max_size(self):
+        app_settings.API_ACCOUNTING_BATCH_MAX_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'API_ACCOUNTING_BATCH_MAX_SIZE', 1000)
+        packets = [self._packet(str(i)) for i in range(3)]
+        response = self._post(packets)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(RadiusAccounting.objects.count(), 0)
+
+    def test_auto_groupname(self):
+        app_settings.API_ACCOUNTING_AUTO_GROUP = True
+        self.addCleanup(setattr, app_settings, 'API_ACCOUNTING_AUTO_GROUP', True)
+        user = self._create_user(
+            username='tester', email='tester@test.org', password='tester'
+        )
+        usergroup1 = self._create_radius_usergroup(
+            groupname='group1', priority=2, username='testgroup1'
+        )
+        usergroup2 = self._create_radius_usergroup(
+            groupname='group2', priority=1, username='testgroup2'
+        )
+        user.radiususergroup_set.set([usergroup1, usergroup2])
+        packets = [
+            self._packet('one', status_type='Start', username='tester'),
+            self._packet('two', status_type='Start', username='unknown'),
+        ]
+        response = self._post(packets)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            RadiusAccounting.objects.get(unique_id='one').groupname, 'group2'
+        )
+        self.assertIsNone(RadiusAccounting.objects.get(unique_id='two').groupname)
+
+
+class TestAuthorizeBatch(ApiTokenMixin, BaseTestCase):
+    _url = reverse('radius:authorize_batch')
+    _accept = {'control:Auth-Type': 'Accept'}
+    _reject = {'control:Auth-Type': 'Reject'}
+
+    def setUp(self):
+        super().setUp()
+        for username in ['molly', 'tester']:
+            self._create_user(
+                username=username, email=f'{username}@test.org', password='barbar'
+            )
+        # caches the organization token
+        self._post([])
+
+    def _post(self, data, content_type='application/json'):
+        if content_type == 'application/json':
+            data = json.dumps(data)
+        return self.client.post(
+            self._url,
+            data=data,
+            content_type=content_type,
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def _results(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [(r['username'], r['status']) for r in response.data]
+
+    def test_unauthorized(self):
+        response = self.client.post(
+            self._url, data='[]', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_authorize(self):
+        User.objects.create_user(
+            username='outsider', email='outsider@test.org', password='barbar'
+        )
+        self._create_user(
+            username='inactive',
+            email='inactive@test.org',
+            password='barbar',
+            is_active=False,
+        )
+        requests = [
+            {'username': 'molly', 'password': 'barbar'},
+            {'username': 'tester', 'password': 'wrong'},
+            {'username': 'notexisting', 'password': 'barbar'},
+            {'username': 'outsider', 'password': 'barbar'},
+            {'username': 'inactive', 'password': 'barbar'},
+            {'username': 'tester'},
+            {'password': 'barbar'},
+            'invalid',
+        ]
+        # all the users are looked up with one query
+        with self.assertNumQueries(1):
+            response = self._post(requests)
+        self.assertEqual(
+            self._results(response),
+            [
+                ('molly', 'accept'),
+                ('tester', 'reject'),
+                ('notexisting', 'reject'),
+                ('outsider', 'reject'),
+                ('inactive', 'reject'),
+                ('tester', 'reject'),
+                (None, 'error'),
+                (None, 'error'),
+            ],
+        )
+        self.assertEqual(response.data[0]['attributes'], self._accept)
+        self.assertEqual(response.data[1]['attributes'], self._reject)
+        self.assertIn('username', response.data[6]['errors'])
+
+    def test_authorize_cache(self):
+        authorize_cache.maxsize = 100
+        self.addCleanup(setattr, authorize_cache, 'maxsize', 0)
+        requests = [
+            {'username': 'molly', 'password': 'barbar'},
+            {'username': 'tester', 'password': 'barbar'},
+        ]
+        self.client.post(
+            reverse('radius:authorize'),
+            {'username': 'molly', 'password': 'barbar'},
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        # only the users which are not cached are looked up
+        with self.assertNumQueries(1):
+            self._post(requests)
+        with self.assertNumQueries(0):
+            response = self._post(requests)
+        self.assertEqual(
+            self._results(response), [('molly', 'accept'), ('tester', 'accept')]
+        )
+
+    def test_radius_token(self):
+        user = User.objects.get(username='tester')
+        token = RadiusToken.objects.create(user=user)
+        requests = [
+            {'username': 'tester', 'password': token.key},
+            {'username': 'tester', 'password': token.key},
+        ]
+        response = self._post(requests)
+        # the token can be used only once
+        self.assertEqual(
+            self._results(response), [('tester', 'accept'), ('tester', 'reject')]
+        )
+
+    def test_group_policy(self):
+        app_settings.API_AUTHORIZE_GROUP_POLICY = True
+        self.addCleanup(setattr, app_settings, 'API_AUTHORIZE_GROUP_POLICY', False)
+        requests = [
+            {'username': 'molly', 'password': 'barbar'},
+            {'username': 'tester', 'password': 'wrong'},
+        ]
+        response = self._post(requests)
+        self.assertEqual(
+            self._results(response), [('molly', 'accept'), ('tester', 'reject')]
+        )
+        self.assertEqual(
+            response.data[0]['attributes'],
+            {
+                'control:Auth-Type': 'Accept',
+                'control:Max-Daily-Session': '10800',
+                'control:Max-Daily-Session-Traffic': '3000000000',
+            },
+        )
+
+    def test_password_pool(self):
+        app_settings.API_PASSWORD_POOL_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'API_PASSWORD_POOL_SIZE', 0)
+        self.addCleanup(shutdown_pool)
+        requests = [
+            {'username': 'molly', 'password': 'barbar'},
+            {'username': 'tester', 'password': 'wrong'},
+            {'username': 'tester', 'password': 'barbar'},
+        ]
+        response = self._post(requests)
+        self.assertIn('api', passwords._pools)
+        self.assertEqual(
+            self._results(response),
+            [('molly', 'accept'), ('tester', 'reject'), ('tester', 'accept')],
+        )
+
+    def test_password_cache(self):
+        app_settings.API_PASSWORD_CACHE_SIZE = 10
+        password_cache.maxsize = 10
+        self.addCleanup(setattr, password_cache, 'maxsize', 0)
+        self.addCleanup(setattr, app_settings, 'API_PASSWORD_CACHE_SIZE', 0)
+        requests = [{'username': 'molly', 'password': 'barbar'}]
+        self._post(requests)
+        with mock.patch.object(User, 'check_password') as check_password:
+            response = self._post(requests)
+        check_password.assert_not_called()
+        self.assertEqual(self._results(response), [('molly', 'accept')])
+
+    def test_ndjson(self):
+        data = '\n'.join(
+            json.dumps({'username': username, 'password': 'barbar'})
+            for username in ['molly', 'tester']
+        )
+        response = self._post(data, content_type='application/x-ndjson')
+        self.assertEqual(
+            self._results(response), [('molly', 'accept'), ('tester', 'accept')]
+        )
+
+    def test_not_a_list(self):
+        response = self._post({'username': 'molly', 'password': 'barbar'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_max_size(self):
+        app_settings.API_AUTHORIZE_BATCH_MAX_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'API_AUTHORIZE_BATCH_MAX_SIZE', 100)
+        response = self._post([{'username': 'molly', 'password': 'barbar'}] * 3)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_fast_urls(self):
+        response = self._post([{'username': 'molly', 'password': 'barbar'}])
+        self.assertEqual(self._results(response), [('molly', 'accept')])
+
+
 class TestAutoGroupname(ApiTokenMixin, BaseTestCase):
     @classmethod
     def setUpClass(cls):
@@ -1210,6 +2241,336 @@ class TestAutoGroupname(ApiTokenMixin, BaseTestCase):
         user.delete()
 
 
+class TestGroupnameCache(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self._create_user(
+            username='tester', email='tester@test.org', password='tester'
+        )
+        self.group1 = self._create_radius_group(name='group1')
+        self.group2 = self._create_radius_group(name='group2')
+        # the default group of the organization has priority 1
+        self.usergroup = self._create_radius_usergroup(
+            user=self.user, group=self.group1, priority=0
+        )
+        app_settings.API_ACCOUNTING_AUTO_GROUP = True
+        groupname_cache.maxsize = 1000
+
+    def tearDown(self):
+        groupname_cache.maxsize = app_settings.API_GROUPNAME_CACHE_SIZE
+        super().tearDown()
+
+    def test_disabled(self):
+        groupname_cache.maxsize = 0
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group1'
+        )
+        self.assertEqual(len(groupname_cache), 0)
+
+    def _start(self, unique_id):
+        return self.client.post(
+            reverse('radius:accounting'),
+            {
+                'status_type': 'Start',
+                'session_time': '',
+                'input_octets': '',
+                'output_octets': '',
+                'nas_ip_address': '127.0.0.1',
+                'session_id': unique_id,
+                'unique_id': unique_id,
+                'username': 'tester',
+            },
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def test_single_query(self):
+        groupname_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_user_groupname('tester', self.default_org.pk), 'default-group1'
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_user_groupname('tester', self.default_org.pk), 'default-group1'
+            )
+
+    def test_no_group(self):
+        self.user.radiususergroup_set.all().delete()
+        self.assertIsNone(get_user_groupname('tester', self.default_org.pk))
+
+    def test_user_not_found(self):
+        with self.assertRaises(User.DoesNotExist):
+            get_user_groupname('unknown', self.default_org.pk)
+        self.assertEqual(len(groupname_cache), 0)
+
+    def test_start_cached(self):
+        self._start('1')
+        self.assertEqual(len(groupname_cache), 1)
+        # unique_id validation, organization validation, insert
+        with self.assertNumQueries(3):
+            self._start('2')
+        for ra in RadiusAccounting.objects.all():
+            self.assertEqual(ra.groupname, 'default-group1')
+
+    def test_usergroup_change(self):
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group1'
+        )
+        self._create_radius_usergroup(user=self.user, group=self.group2, priority=-1)
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group2'
+        )
+        self.user.radiususergroup_set.filter(priority=-1).get().delete()
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group1'
+        )
+
+    def test_other_organization(self):
+        org = self._create_org(name='other', slug='other')
+        org.add_user(self.user)
+        # the test helpers always use the default organization
+        group = RadiusGroup(name='group3', organization=org)
+        group.full_clean()
+        group.save()
+        usergroup = RadiusUserGroup(user=self.user, group=group, priority=-1)
+        usergroup.full_clean()
+        usergroup.save()
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group1'
+        )
+        self.assertEqual(get_user_groupname('tester', org.pk), 'other-group3')
+        self.assertEqual(len(groupname_cache), 2)
+
+    def test_group_rename(self):
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group1'
+        )
+        self.group1.name = 'default-renamed'
+        self.group1.save()
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-renamed'
+        )
+
+    def test_user_rename(self):
+        self.assertEqual(
+            get_user_groupname('tester', self.default_org.pk), 'default-group1'
+        )
+        self.user.username = 'renamed'
+        self.user.save()
+        with self.assertRaises(User.DoesNotExist):
+            get_user_groupname('tester', self.default_org.pk)
+        self.user.delete()
+        self.assertEqual(len(groupname_cache), 0)
+
+
+class TestPasswordCache(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        password_cache.clear()
+        password_cache.maxsize = 100
+        self.user = self._create_user(username='molly', password='barbar')
+
+    def tearDown(self):
+        password_cache.maxsize = app_settings.API_PASSWORD_CACHE_SIZE
+        super().tearDown()
+
+    def _authorize(self, password='barbar'):
+        return self.client.post(
+            reverse('radius:authorize'),
+            {'username': 'molly', 'password': password},
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    @mock.patch.object(User, 'check_password', autospec=True)
+    def test_cache_hit(self, check_password):
+        check_password.return_value = True
+        response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.assertEqual(check_password.call_count, 1)
+        response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.assertEqual(check_password.call_count, 1)
+        self.assertEqual(password_cache.stats()['hits'], 1)
+
+    def test_non_string_password(self):
+        self.user.set_password('1234')
+        self.user.save()
+        for password in [1234, 1234, None, 12.5, True]:
+            response = self.client.post(
+                reverse('radius:authorize'),
+                json.dumps({'username': 'molly', 'password': password}),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=self.auth_header,
+            )
+            self.assertEqual(response.status_code, 200)
+            if password == 1234:
+                self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+            else:
+                self.assertEqual(response.data, None)
+
+    def test_cache_stores_digest(self):
+        self._authorize()
+        self.assertEqual(len(password_cache), 1)
+        digest = password_cache.get(self.user.pk)
+        self.assertNotIn('barbar', digest)
+        self.assertEqual(len(digest), 64)
+
+    def test_wrong_password(self):
+        self._authorize()
+        response = self._authorize(password='wrong')
+        self.assertEqual(response.data, None)
+        # failures are not cached
+        self.assertEqual(len(password_cache), 1)
+        response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+
+    def test_password_change(self):
+        self._authorize()
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(len(password_cache), 0)
+        response = self._authorize()
+        self.assertEqual(response.data, None)
+        response = self._authorize(password='changed')
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+
+    def test_password_hash_change(self):
+        # hash changed without signals (eg: queryset update)
+        self._authorize()
+        self.user.set_password('changed')
+        User.objects.filter(pk=self.user.pk).update(password=self.user.password)
+        self.assertEqual(len(password_cache), 1)
+        response = self._authorize()
+        self.assertEqual(response.data, None)
+
+    def test_disabled(self):
+        password_cache.maxsize = 0
+        self._authorize()
+        self.assertEqual(len(password_cache), 0)
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    @mock.patch.object(User, 'check_password', autospec=True)
+    def test_fast_views(self, check_password):
+        check_password.return_value = True
+        self._authorize()
+        response = self._authorize()
+        self.assertEqual(response.json(), {'control:Auth-Type': 'Accept'})
+        self.assertEqual(check_password.call_count, 1)
+
+
+class TestPasswordPool(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app_settings.API_PASSWORD_POOL_SIZE = 2
+        self.user = self._create_user(username='molly', password='barbar')
+
+    def tearDown(self):
+        shutdown_pool()
+        app_settings.API_PASSWORD_POOL_SIZE = 0
+        super().tearDown()
+
+    def _authorize(self, password='barbar'):
+        return self.client.post(
+            reverse('radius:authorize'),
+            {'username': 'molly', 'password': password},
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def test_authorize(self):
+        response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        response = self._authorize(password='wrong')
+        self.assertEqual(response.data, None)
+        self.assertIn('api', passwords._pools)
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_fast_views(self):
+        response = self._authorize()
+        self.assertEqual(response.json(), {'control:Auth-Type': 'Accept'})
+        self.assertIn('api', passwords._pools)
+
+    def test_disabled(self):
+        app_settings.API_PASSWORD_POOL_SIZE = 0
+        with mock.patch.object(passwords, 'get_pool') as get_pool:
+            response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        get_pool.assert_not_called()
+
+    def test_hash_upgrade(self):
+        self.user.password = make_password('barbar', hasher='pbkdf2_sha1')
+        self.user.save()
+        response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('barbar'))
+
+    def test_timeout(self):
+        with mock.patch.object(app_settings, 'API_PASSWORD_POOL_TIMEOUT', 0.000001):
+            with self.assertLogs('openwisp_radius.passwords', 'WARNING'):
+                response = self._authorize()
+        self.assertEqual(response.data, None)
+
+    def test_verify_passwords(self):
+        user = self._create_user(
+            username='tester', email='tester@test.org', password='tester'
+        )
+        calls = []
+
+        def submit(function, *args):
+            calls.append('submit')
+            result = function(*args)
+            return mock.Mock(
+                **{
+                    'result.side_effect': lambda timeout: calls.append('result')
+                    or result
+                }
+            )
+
+        pool = mock.Mock(**{'submit.side_effect': submit})
+        with mock.patch.object(passwords, 'get_pool', return_value=pool):
+            valid = passwords.verify_passwords(
+                [(self.user, 'barbar'), (user, 'wrong'), (user, 'tester')]
+            )
+        self.assertEqual(valid, [True, False, True])
+        # the passwords are verified concurrently
+        self.assertEqual(calls, ['submit'] * 3 + ['result'] * 3)
+
+    def test_broken_pool(self):
+        pool = mock.Mock(**{'submit.side_effect': BrokenProcessPool()})
+        with mock.patch.object(passwords, 'get_pool', return_value=pool):
+            with self.assertLogs('openwisp_radius.passwords', 'ERROR'):
+                response = self._authorize()
+        self.assertEqual(response.data, {'control:Auth-Type': 'Accept'})
+
+    def test_hash_passwords(self):
+        raw_passwords = [f'password{i}' for i in range(10)]
+        app_settings.BATCH_PASSWORD_POOL_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_PASSWORD_POOL_SIZE', 0)
+        hashes = passwords.hash_passwords(raw_passwords)
+        self.assertIn('batch', passwords._pools)
+        # the hashes are returned in the order of the passwords
+        self.assertEqual(len(hashes), 10)
+        for password, encoded in zip(raw_passwords, hashes):
+            self.assertTrue(check_password(password, encoded))
+
+    def test_hash_passwords_disabled(self):
+        with mock.patch.object(passwords, 'get_pool') as get_pool:
+            hashes = passwords.hash_passwords(['barbar', 'tester'])
+        get_pool.assert_not_called()
+        self.assertTrue(check_password('tester', hashes[1]))
+
+    def test_hash_passwords_broken_pool(self):
+        app_settings.BATCH_PASSWORD_POOL_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_PASSWORD_POOL_SIZE', 0)
+        pool = mock.Mock(**{'map.side_effect': BrokenProcessPool()})
+        with mock.patch.object(passwords, 'get_pool', return_value=pool):
+            with self.assertLogs('openwisp_radius.passwords', 'ERROR'):
+                hashes = passwords.hash_passwords(['barbar', 'tester'])
+        self.assertTrue(check_password('barbar', hashes[0]))
+        self.assertTrue(check_password('tester', hashes[1]))
+
+
 class TestAutoGroupnameDisabled(ApiTokenMixin, BaseTestCase):
     @classmethod
     def setUpClass(cls):
@@ -1349,19 +2710,64 @@ class TestOgranizationRadiusSettings(ApiTokenMixin, BaseTestCase):
         rad = OrganizationRadiusSettings.objects.create(
             token='12345', organization=self.org
         )
+        cache_key = get_organization_token_cache_key(self.org.pk)
+        self.assertEqual(rad.token, cache.get(cache_key))
+        cache.clear()
         options = dict(username='molly', password='barbar')
         self._create_user(**options)
         token_querystring = '?token={0}&uuid={1}'.format(rad.token, str(self.org.pk))
         post_url = '{}{}'.format(reverse('radius:authorize'), token_querystring)
         self.client.post(post_url, {'username': 'molly', 'password': 'barbar'})
-        self.assertEqual(rad.token, cache.get(rad.organization.pk))
+        self.assertEqual(rad.token, cache.get(cache_key))
         # test update
         rad.token = '1234567'
         rad.save()
-        self.assertEqual(rad.token, cache.get(rad.organization.pk))
+        self.assertEqual(rad.token, cache.get(cache_key))
         # test delete
         rad.delete()
-        self.assertEqual(None, cache.get(rad.organization.pk))
+        self.assertEqual(None, cache.get(cache_key))
+
+    def test_cache_wrong_token(self):
+        rad = OrganizationRadiusSettings.objects.create(
+            token='12345', organization=self.org
+        )
+        self._create_user(username='molly', password='barbar')
+        post_url = '{}?token={}&uuid={}'.format(
+            reverse('radius:authorize'), 'wrong', str(self.org.pk)
+        )
+        with self.assertNumQueries(0):
+            r = self.client.post(post_url, {'username': 'molly', 'password': 'barbar'})
+        self.assertEqual(r.status_code, 403)
+        self.assertEqual(rad.token, get_organization_token(self.org.pk))
+
+    def test_invalid_uuid(self):
+        post_url = '{}?token={}&uuid={}'.format(
+            reverse('radius:authorize'), '12345', 'invalid'
+        )
+        with self.assertNumQueries(0):
+            r = self.client.post(post_url, {'username': 'molly', 'password': 'barbar'})
+        self.assertEqual(r.status_code, 403)
+        self.assertEqual(r.data, {'detail': 'Token authentication failed'})
+
+    def test_local_cache(self):
+        organization_token_cache.maxsize = 10
+        self.addCleanup(organization_token_cache.clear)
+        self.addCleanup(
+            setattr,
+            organization_token_cache,
+            'maxsize',
+            app_settings.API_TOKEN_LOCAL_CACHE_SIZE,
+        )
+        rad = OrganizationRadiusSettings.objects.create(
+            token='12345', organization=self.org
+        )
+        self.assertEqual(len(organization_token_cache), 1)
+        # the django cache is not queried if the local tier has the token
+        cache.clear()
+        self.assertEqual(get_organization_token(self.org.pk), rad.token)
+        rad.delete()
+        self.assertEqual(len(organization_token_cache), 0)
+        self.assertIsNone(get_organization_token(self.org.pk))
 
     def test_no_org_radius_setting(self):
         cache.clear()
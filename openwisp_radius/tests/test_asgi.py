@@ -0,0 +1,297 @@
+import asyncio
+import json
+import os
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from time import sleep
+from unittest import mock
+from uuid import UUID, uuid4
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+
+from ..api.freeradius import ACCEPT
+from ..asgi import FreeradiusApplication
+from ..utils import load_model
+from .mixins import ApiTokenMixin, BaseTestCase
+
+User = get_user_model()
+RadiusAccounting = load_model('RadiusAccounting')
+RadiusPostAuth = load_model('RadiusPostAuth')
+
+
+class InlineExecutor(Executor):
+    """
+    runs functions in the event loop with the database
+    connection of the test, which holds its transaction
+    """
+
+    def __init__(self):
+        self.connection = connections[DEFAULT_DB_ALIAS]
+
+    def submit(self, fn, *args, **kwargs):
+        connections[DEFAULT_DB_ALIAS] = self.connection
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class SlowApplication(FreeradiusApplication):
+    def authenticate(self, uuid, token, data):
+        return str(UUID(uuid))
+
+    def respond(self, function, organization_id, data):
+        sleep(0.3)
+        return 200, ACCEPT
+
+
+class TestFreeradiusApplication(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(self.loop.close)
+        # the test runs in a transaction which must not be closed
+        patcher = mock.patch('openwisp_radius.asgi.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the inline executor runs queries in the thread of the event loop
+        patcher = mock.patch.dict(os.environ, {'DJANGO_ALLOW_ASYNC_UNSAFE': 'true'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_scope(self, path, headers=None, method='POST', query_string=b''):
+        if headers is None:
+            headers = [
+                (b'content-type', b'application/json'),
+                (b'authorization', self.auth_header.encode()),
+            ]
+        return {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query_string,
+            'headers': headers,
+        }
+
+    async def _call(self, app, scope, body=b''):
+        messages = [
+            {'type': 'http.request', 'body': body[:5], 'more_body': True},
+            {'type': 'http.request', 'body': body[5:], 'more_body': False},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, receive, send)
+        return sent
+
+    def _request(self, path, data=None, app=None, **kwargs):
+        app = app or FreeradiusApplication(executor=InlineExecutor())
+        body = json.dumps(data).encode() if data is not None else b''
+        sent = self.loop.run_until_complete(
+            self._call(app, self._get_scope(path, **kwargs), body)
+        )
+        status = sent[0]['status']
+        body = sent[1]['body']
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(headers[b'content-length'], str(len(body)).encode())
+        return status, json.loads(body) if body else None
+
+    def test_authorize(self):
+        self._create_user(username='molly', password='barbar')
+        status, data = self._request(
+            '/api/v1/authorize/', {'username': 'molly', 'password': 'barbar'}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(data, {'control:Auth-Type': 'Accept'})
+        status, data = self._request(
+            '/api/v1/authorize/', {'username': 'molly', 'password': 'wrong'}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(data, None)
+
+    def test_authorize_form_querystring(self):
+        self._create_user(username='molly', password='barbar')
+        org = self.default_org
+        query_string = 'uuid={0}&token={1}'.format(
+            org.pk, org.radius_settings.token
+        ).encode()
+        app = FreeradiusApplication(executor=InlineExecutor())
+        scope = self._get_scope(
+            '/api/v1/authorize/',
+            headers=[(b'content-type', b'application/x-www-form-urlencoded')],
+            query_string=query_string,
+        )
+        sent = self.loop.run_until_complete(
+            self._call(app, scope, b'username=molly&password=barbar')
+        )
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(sent[1]['body'], ACCEPT)
+
+    def test_token_auth_failed(self):
+        status, data = self._request(
+            '/api/v1/authorize/',
+            {'username': 'molly', 'password': 'barbar'},
+            headers=[(b'authorization', b'Bearer wrong wrong')],
+        )
+        self.assertEqual(status, 403)
+        self.assertEqual(data, {'detail': 'Token authentication failed'})
+
+    def test_postauth(self):
+        status, data = self._request('/api/v1/postauth/', self._get_postauth_params())
+        self.assertEqual(status, 201)
+        self.assertEqual(data, None)
+        self.assertEqual(RadiusPostAuth.objects.count(), 1)
+
+    def test_accounting(self):
+        packet = {
+            'status_type': 'Start',
+            'session_id': '35000006',
+            'unique_id': '75058e50',
+            'nas_ip_address': '172.16.64.91',
+            'username': 'admin',
+        }
+        status, data = self._request('/api/v1/accounting/', packet)
+        self.assertEqual(status, 201)
+        packet.update({'status_type': 'Stop', 'session_time': 261})
+        status, data = self._request('/api/v1/accounting/', packet)
+        self.assertEqual(status, 200)
+        ra = RadiusAccounting.objects.get()
+        self.assertEqual(ra.session_time, 261)
+        self.assertIsNotNone(ra.stop_time)
+        packet['nas_ip_address'] = 'wrong'
+        status, data = self._request('/api/v1/accounting/', packet)
+        self.assertEqual(status, 400)
+        self.assertIn('nas_ip_address', data)
+
+    def test_usage(self):
+        self._create_user(username='molly', password='barbar')
+        status, data = self._request('/api/v1/usage/', {'username': 'molly'})
+        self.assertEqual(status, 200)
+        self.assertEqual(data['reply:Session-Timeout'], 10800)
+
+    def test_invalid_json(self):
+        app = FreeradiusApplication(executor=InlineExecutor())
+        sent = self.loop.run_until_complete(
+            self._call(app, self._get_scope('/api/v1/authorize/'), b'{"username"')
+        )
+        self.assertEqual(sent[0]['status'], 400)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_body_too_large(self):
+        status, data = self._request(
+            '/api/v1/authorize/', {'username': 'molly', 'password': 'barbar'}
+        )
+        self.assertEqual(status, 413)
+        self.assertEqual(
+            data,
+            {'detail': 'Request body exceeded settings.DATA_UPLOAD_MAX_MEMORY_SIZE.'},
+        )
+
+    def test_invalid_encoding(self):
+        app = FreeradiusApplication(executor=InlineExecutor())
+        scope = self._get_scope(
+            '/api/v1/authorize/',
+            headers=[
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'authorization', self.auth_header.encode()),
+            ],
+        )
+        sent = self.loop.run_until_complete(
+            self._call(app, scope, b'username=\xff\xfe&password=barbar')
+        )
+        self.assertEqual(sent[0]['status'], 400)
+        self.assertEqual(json.loads(sent[1]['body']), {'detail': 'Invalid encoding.'})
+
+    def test_not_found(self):
+        status, data = self._request('/api/v1/batch/', {})
+        self.assertEqual(status, 404)
+        status, data = self._request('/api/v1/accounting/', method='GET')
+        self.assertEqual(status, 404)
+
+    def test_fallback(self):
+        calls = []
+
+        async def fallback(scope, receive, send):
+            calls.append(scope)
+
+        app = FreeradiusApplication(fallback=fallback, executor=InlineExecutor())
+        scope = self._get_scope('/api/v1/accounting/', method='GET')
+        self.loop.run_until_complete(self._call(app, scope))
+        self.assertEqual(calls, [scope])
+
+    def test_lifespan(self):
+        executor = mock.Mock()
+        app = FreeradiusApplication(executor=executor)
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.loop.run_until_complete(app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        )
+        executor.shutdown.assert_called_once()
+
+    def test_organization_concurrency(self):
+        app = SlowApplication(
+            executor=ThreadPoolExecutor(max_workers=4),
+            organization_concurrency=1,
+            queue_timeout=0.1,
+        )
+        self.addCleanup(app.executor.shutdown)
+
+        def request(uuid):
+            headers = [(b'authorization', f'Bearer {uuid} token'.encode())]
+            return self._call(
+                app, self._get_scope('/api/v1/authorize/', headers=headers)
+            )
+
+        slow, other = str(uuid4()), str(uuid4())
+        responses = self.loop.run_until_complete(
+            asyncio.gather(request(slow), request(slow), request(other))
+        )
+        statuses = [sent[0]['status'] for sent in responses]
+        self.assertEqual(statuses, [200, 503, 200])
+        # semaphores are discarded when they're not used anymore
+        self.assertEqual(app._semaphores, {})
+
+    def test_semaphore_after_authentication(self):
+        app = FreeradiusApplication(executor=InlineExecutor())
+        headers = [(b'authorization', f'Bearer {uuid4()} wrong'.encode())]
+        with mock.patch.object(app, 'acquire_semaphore') as acquire_semaphore:
+            status, data = self._request(
+                '/api/v1/authorize/', {}, app=app, headers=headers
+            )
+        self.assertEqual(status, 403)
+        acquire_semaphore.assert_not_called()
+        self.assertEqual(app._semaphores, {})
+        # semaphores are keyed by the normalized uuid of the organization
+        org_id = self.default_org.pk
+        token = self.default_org.radius_settings.token
+        keys = []
+        acquire_semaphore = app.acquire_semaphore
+        for uuid in [str(org_id), org_id.hex.upper()]:
+            headers = [(b'authorization', f'Bearer {uuid} {token}'.encode())]
+            with mock.patch.object(
+                app, 'acquire_semaphore', side_effect=acquire_semaphore
+            ) as mocked:
+                status, data = self._request(
+                    '/api/v1/usage/', {'username': 'admin'}, app=app, headers=headers
+                )
+            keys.append(mocked.call_args[0][0])
+        self.assertEqual(keys, [str(org_id), str(org_id)])
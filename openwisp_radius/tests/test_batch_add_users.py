@@ -1,13 +1,35 @@
 import csv
 import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
+import swapper
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
+from .. import jobs
+from .. import settings as app_settings
+from ..provisioning import BulkUserCreator
 from ..utils import load_model
 from . import FileMixin
-from .mixins import BaseTestCase
+from .mixins import (
+    ApiTokenMixin,
+    BaseTestCase,
+    CreateRadiusObjectsMixin,
+    DefaultOrgMixin,
+)
 
 RadiusBatch = load_model('RadiusBatch')
+RadiusUserGroup = load_model('RadiusUserGroup')
+User = get_user_model()
+OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
 
 
 class TestCSVUpload(FileMixin, BaseTestCase):
@@ -95,3 +117,370 @@ class TestCSVUpload(FileMixin, BaseTestCase):
         self.assertEqual(batch.users.all().count(), 1)
         user = batch.users.first()
         self.assertEqual(hashed_password, user.password)
+
+    def _is_member(self, user):
+        return OrganizationUser.objects.filter(
+            user=user, organization=self.default_org
+        ).exists()
+
+    def _create_csv_batch(self, reader):
+        return self._create_radius_batch(
+            name='test', strategy='csv', csvfile=self._get_csvfile(reader)
+        )
+
+    def test_existing_email(self):
+        user = User.objects.create(username='existing', email='rohith@openwisp.com')
+        reader = [
+            ['rohith', '', 'rohith@openwisp.com', 'Rohith', 'ASRK'],
+            ['other', '', 'rohith@openwisp.com', '', ''],
+        ]
+        batch = self._create_csv_batch(reader)
+        batch.add(reader)
+        self.assertEqual(list(batch.users.all()), [user])
+        self.assertTrue(self._is_member(user))
+        group = RadiusUserGroup.objects.get(user=user)
+        self.assertEqual(group.username, 'existing')
+        self.assertEqual(group.groupname, 'default-users')
+        # the password of existing users is not generated
+        self.assertEqual(len(mail.outbox), 0)
+
+    @mock.patch('django.db.transaction.on_commit', side_effect=lambda func: func())
+    def test_existing_user_organizations_cache(self, on_commit):
+        user = User.objects.create(username='existing', email='rohith@openwisp.com')
+        key = 'user_{}_organizations'.format(user.pk)
+        # cached by openwisp-users before the user joins the organization
+        cache.set(key, [])
+        self.addCleanup(cache.delete, key)
+        reader = [['rohith', '', 'rohith@openwisp.com', '', '']]
+        batch = self._create_csv_batch(reader)
+        batch.add(reader)
+        self.assertTrue(self._is_member(user))
+        self.assertIsNone(cache.get(key))
+
+    def test_repeated_email(self):
+        reader = [
+            ['rohith', '', 'rohith@openwisp.com', 'Rohith', 'ASRK'],
+            ['other', '', 'rohith@openwisp.com', '', ''],
+        ]
+        batch = self._create_csv_batch(reader)
+        batch.add(reader)
+        self.assertEqual(batch.users.count(), 1)
+        self.assertEqual(User.objects.filter(email='rohith@openwisp.com').count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_repeated_email_chunks(self):
+        app_settings.BATCH_BULK_CHUNK_SIZE = 1
+        self.addCleanup(setattr, app_settings, 'BATCH_BULK_CHUNK_SIZE', 1000)
+        reader = [
+            ['rohith', '', 'rohith@openwisp.com', '', ''],
+            ['other', '', 'other@openwisp.com', '', ''],
+            ['rohith', '', 'rohith@openwisp.com', '', ''],
+        ]
+        batch = self._create_csv_batch(reader)
+        # the user added by the first chunk is found in the database
+        batch.add(reader)
+        self.assertEqual(batch.users.count(), 2)
+        self.assertEqual(batch.processed_users, 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_username_collisions(self):
+        User.objects.create(username='rohith', email='existing@openwisp.com')
+        User.objects.create(username='rohith2', email='existing2@openwisp.com')
+        reader = [
+            ['rohith', '', 'rohith0@openwisp.com', '', ''],
+            ['rohith', '', 'rohith1@openwisp.com', '', ''],
+            ['rohith1', '', 'rohith2@openwisp.com', '', ''],
+        ]
+        batch = self._create_csv_batch(reader)
+        with CaptureQueriesContext(connection) as queries:
+            batch.add(reader)
+        self.assertEqual(
+            list(batch.users.order_by('email').values_list('username', flat=True)),
+            ['rohith1', 'rohith3', 'rohith11'],
+        )
+        # the candidates are looked up by username, without prefix scans
+        for query in queries.captured_queries:
+            self.assertNotIn('LIKE', query['sql'])
+
+    def test_chunks(self):
+        app_settings.BATCH_BULK_CHUNK_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_BULK_CHUNK_SIZE', 1000)
+        User.objects.create(username='rohith', email='existing@openwisp.com')
+        User.objects.create(username='rohith2', email='existing2@openwisp.com')
+        reader = [
+            ['rohith', '', 'rohith0@openwisp.com', '', ''],
+            ['rohith', '', 'rohith1@openwisp.com', '', ''],
+            ['rohith', '', 'rohith2@openwisp.com', '', ''],
+            ['', '', 'existing@openwisp.com', '', ''],
+            ['', '', 'rohith@openwisp.com', '', ''],
+        ]
+        batch = self._create_csv_batch(reader)
+        batch.add(reader)
+        self.assertEqual(
+            sorted(batch.users.values_list('username', flat=True)),
+            ['rohith', 'rohith1', 'rohith3', 'rohith4', 'rohith5'],
+        )
+        for user in batch.users.all():
+            self.assertTrue(self._is_member(user))
+            self.assertEqual(user.radiususergroup_set.count(), 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertIn('username: rohith1,', mail.outbox[0].body)
+
+    def test_csvfile_upload(self):
+        app_settings.BATCH_BULK_CHUNK_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_BULK_CHUNK_SIZE', 1000)
+        rows = [[f'user{i}', '', f'user{i}@openwisp.com', '', ''] for i in range(5)]
+        csvfile = self._get_csvfile(rows)
+        batch = RadiusBatch(
+            name='test', strategy='csv', csvfile=csvfile, organization=self.default_org,
+        )
+        self.addCleanup(batch._remove_files)
+        batch.csvfile_upload(csvfile)
+        self.assertEqual(batch.users.count(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_generated_passwords_file(self):
+        reader = [
+            ['rohith', '', 'rohith@openwisp.com', '', ''],
+            ['other', 'cleartext$password', 'other@openwisp.com', '', ''],
+        ]
+        batch = self._create_csv_batch(reader)
+        creator = BulkUserCreator(batch)
+        self.addCleanup(creator.close)
+        creator.add(reader)
+        # the passwords are stored in a temporary file, not in memory
+        self.assertFalse(isinstance(creator.generated_passwords, list))
+        generated = list(creator.iter_generated_passwords())
+        self.assertEqual(len(generated), 1)
+        username, password, email = generated[0]
+        self.assertEqual(username, 'rohith')
+        self.assertEqual(email, 'rohith@openwisp.com')
+        self.assertTrue(User.objects.get(username='rohith').check_password(password))
+        creator.close()
+        self.assertIsNone(creator.generated_passwords)
+
+    def test_send_passwords_chunks(self):
+        app_settings.BATCH_BULK_CHUNK_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_BULK_CHUNK_SIZE', 1000)
+        rows = [[f'user{i}', '', f'user{i}@openwisp.com', '', ''] for i in range(5)]
+        batch = self._create_csv_batch(rows)
+        with mock.patch(
+            'openwisp_radius.base.models.send_mass_mail'
+        ) as send_mass_mail, mock.patch(
+            'openwisp_radius.base.models.get_connection'
+        ) as get_connection:
+            batch.add(rows)
+        get_connection.assert_called_once()
+        self.assertEqual(
+            [len(call[0][0]) for call in send_mass_mail.call_args_list], [2, 2, 1]
+        )
+
+    def test_csvfile_upload_invalid_row(self):
+        app_settings.BATCH_BULK_CHUNK_SIZE = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_BULK_CHUNK_SIZE', 1000)
+        rows = [[f'user{i}', '', f'user{i}@openwisp.com', '', ''] for i in range(5)]
+        rows.append(['invalid', '', 'invalid', '', ''])
+        csvfile = self._get_csvfile(rows)
+        batch = RadiusBatch(
+            name='test', strategy='csv', csvfile=csvfile, organization=self.default_org,
+        )
+        self.addCleanup(batch._remove_files)
+        with self.assertRaises(ValidationError) as error:
+            batch.csvfile_upload(csvfile)
+        self.assertIn('line number 6', error.exception.message)
+        # the chunks imported before the chunk of the invalid row are kept
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'failed')
+        self.assertEqual(batch.processed_users, 4)
+        self.assertEqual(User.objects.filter(username__startswith='user').count(), 4)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_number_of_queries(self):
+        rows = [[f'user{i}', '', f'user{i}@openwisp.com', '', ''] for i in range(5)]
+        batch = self._create_csv_batch(rows)
+        # the transaction of the chunk is a savepoint in the tests,
+        # the progress of the batch is stored in the cache
+        with self.assertNumQueries(9):
+            batch.add(rows)
+        rows = [[f'other{i}', '', f'other{i}@openwisp.com', '', ''] for i in range(50)]
+        # the number of queries does not depend on the number of rows
+        with self.assertNumQueries(9):
+            batch.add(rows)
+        self.assertEqual(batch.users.count(), 55)
+
+
+class TestBatchJobs(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app_settings.BATCH_JOB_WORKERS = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_JOB_WORKERS', 0)
+
+    def _post_batch(self, data):
+        with mock.patch.object(jobs, 'submit') as submit:
+            response = self.client.post(
+                reverse('radius:batch'),
+                self._get_post_defaults(data),
+                HTTP_AUTHORIZATION=self.auth_header,
+            )
+        self.assertEqual(response.status_code, 202)
+        batch = RadiusBatch.objects.get(pk=response.data['id'])
+        self.assertEqual(batch.status, 'pending')
+        self.assertEqual(batch.users.count(), 0)
+        submit.assert_called_once()
+        return response, batch, submit.call_args[1]
+
+    def _get_status(self, response):
+        self.assertEqual(response['Location'], response.data['url'])
+        return self.client.get(
+            response['Location'], HTTP_AUTHORIZATION=self.auth_header
+        ).data
+
+    def test_prefix(self):
+        response, batch, options = self._post_batch(
+            {
+                'name': 'test',
+                'strategy': 'prefix',
+                'prefix': 'test',
+                'number_of_users': 3,
+            }
+        )
+        self.assertEqual(response.data['total_users'], 3)
+        # executed by the worker threads
+        batch.process(**options)
+        data = self._get_status(response)
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['processed_users'], 3)
+        self.assertEqual(data['total_users'], 3)
+        self.assertIsNotNone(data['pdf'])
+        self.assertEqual(batch.users.count(), 3)
+
+    def test_csv(self):
+        csvfile = SimpleUploadedFile(
+            'test.csv', b'rohith,,rohith@openwisp.com,,\nother,,other@openwisp.com,,'
+        )
+        response, batch, options = self._post_batch(
+            {'name': 'test', 'strategy': 'csv', 'csvfile': csvfile}
+        )
+        self.assertIsNone(response.data['total_users'])
+        # the CSV file is read from the storage
+        batch.process(**options)
+        data = self._get_status(response)
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['processed_users'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed(self):
+        csvfile = SimpleUploadedFile(
+            'test.csv', b'rohith,,rohith@openwisp.com,,\ninvalid,,invalid,,'
+        )
+        response, batch, options = self._post_batch(
+            {'name': 'test', 'strategy': 'csv', 'csvfile': csvfile}
+        )
+        with self.assertRaises(ValidationError):
+            batch.process(**options)
+        data = self._get_status(response)
+        self.assertEqual(data['status'], 'failed')
+        self.assertIn('line number 2', data['error'])
+        self.assertEqual(batch.users.count(), 0)
+
+    def test_progress(self):
+        batch = RadiusBatch.objects.create(
+            name='test', strategy='prefix', prefix='test', organization=self.default_org
+        )
+        url = reverse('radius:batch_detail', args=[batch.pk])
+        batch.set_status('running')
+        batch.set_progress(3)
+        # the progress is visible outside the transaction of the operation
+        self.assertEqual(RadiusBatch.objects.get(pk=batch.pk).processed_users, 0)
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.auth_header)
+        self.assertEqual(response.data['processed_users'], 3)
+        batch.set_status('done')
+        self.assertIsNone(cache.get(batch.get_progress_cache_key()))
+        self.assertEqual(RadiusBatch.objects.get(pk=batch.pk).processed_users, 3)
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.auth_header)
+        self.assertEqual(response.data['processed_users'], 3)
+
+    def test_status_other_organization(self):
+        org = self._create_org(name='other', slug='other')
+        batch = RadiusBatch.objects.create(
+            name='test', strategy='prefix', prefix='test', organization=org
+        )
+        response = self.client.get(
+            reverse('radius:batch_detail', args=[batch.pk]),
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_run_failure(self):
+        batch = RadiusBatch.objects.create(
+            name='test', strategy='prefix', prefix='test', organization=self.default_org
+        )
+        with mock.patch.object(
+            RadiusBatch, 'generate_users', side_effect=ValueError('broken')
+        ):
+            with mock.patch.object(jobs, 'connection') as connection:
+                with self.assertLogs('openwisp_radius.jobs', 'ERROR'):
+                    with self.assertRaises(ValueError):
+                        jobs.run(batch.pk, number_of_users=1)
+        connection.close.assert_called_once()
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'failed')
+        self.assertEqual(batch.error, 'broken')
+
+
+class TestBatchJobsThreads(
+    ApiTokenMixin, DefaultOrgMixin, CreateRadiusObjectsMixin, TransactionTestCase
+):
+    # the default organization is created by the migrations
+    serialized_rollback = True
+
+    def setUp(self):
+        super().setUp()
+        app_settings.BATCH_JOB_WORKERS = 2
+        self.addCleanup(setattr, app_settings, 'BATCH_JOB_WORKERS', 0)
+        # the futures of the operations, their exceptions
+        # are raised in the test by ``_wait_jobs``
+        self.futures = []
+        executor = ThreadPoolExecutor(max_workers=app_settings.BATCH_JOB_WORKERS)
+        self.addCleanup(executor.shutdown)
+
+        def submit(*args, **kwargs):
+            future = executor.submit(*args, **kwargs)
+            self.futures.append(future)
+            return future
+
+        # the executor is looked up by ``jobs.submit`` when the
+        # transaction in which the batch is saved is committed
+        patcher = mock.patch(
+            'openwisp_radius.jobs.get_executor',
+            return_value=mock.Mock(submit=mock.Mock(side_effect=submit)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _wait_jobs(self):
+        for future in self.futures:
+            future.result(timeout=30)
+
+    def test_prefix(self):
+        response = self.client.post(
+            reverse('radius:batch'),
+            self._get_post_defaults(
+                {
+                    'name': 'test',
+                    'strategy': 'prefix',
+                    'prefix': 'test',
+                    'number_of_users': 5,
+                }
+            ),
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(self.futures), 1)
+        # waits for the worker threads and raises their exceptions
+        self._wait_jobs()
+        batch = RadiusBatch.objects.get(pk=response.data['id'])
+        self.addCleanup(batch.delete)
+        self.assertEqual(batch.status, 'done')
+        self.assertEqual(batch.processed_users, 5)
+        self.assertEqual(batch.users.count(), 5)
@@ -1,10 +1,18 @@
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
 from django.core.management import CommandError, call_command
-from django.utils.timezone import now
+from django.db import connection
+from django.utils.timezone import make_aware, now
 
+from ..management.commands.base.partition_radacct import (
+    add_months,
+    get_partition_month,
+    get_partition_name,
+)
 from ..utils import load_model
 from . import CallCommandMixin, FileMixin
 from .mixins import BaseTestCase
@@ -39,6 +47,58 @@ class TestCommands(FileMixin, CallCommandMixin, BaseTestCase):
         self.assertNotEqual(session.session_time, None)
         self.assertEqual(session.update_time, session.stop_time)
 
+    def test_cleanup_stale_radacct_filters(self):
+        start_time = now() - timedelta(days=10)
+        org = self._create_org(name='other', slug='other')
+        for unique_id, nas_ip_address, organization in [
+            ('1', '127.0.0.1', self.default_org),
+            ('2', '127.0.0.2', self.default_org),
+            ('3', '127.0.0.1', org),
+        ]:
+            RadiusAccounting.objects.create(
+                unique_id=unique_id,
+                session_id=unique_id,
+                nas_ip_address=nas_ip_address,
+                organization=organization,
+                start_time=start_time,
+            )
+        # sessions which are already closed are not updated
+        options = _RADACCT.copy()
+        options.update(unique_id='closed', stop_time='2017-06-10 11:50:00')
+        self._create_radius_accounting(**options)
+        stdout = StringIO()
+        call_command(
+            'cleanup_stale_radacct',
+            5,
+            organization=self.default_org.name,
+            nas_ip_address='127.0.0.1',
+            stdout=stdout,
+        )
+        self.assertIn('Closed 1 active sessions older than 5 days', stdout.getvalue())
+        session = RadiusAccounting.objects.get(unique_id='1')
+        self.assertAlmostEqual(session.session_time, 10 * 86400, delta=2)
+        self.assertEqual(session.update_time, session.stop_time)
+        self.assertEqual(RadiusAccounting.objects.filter(stop_time=None).count(), 2)
+        closed = RadiusAccounting.objects.get(unique_id='closed')
+        self.assertIsNone(closed.session_time)
+        stdout = StringIO()
+        call_command('cleanup_stale_radacct', 5, stdout=stdout)
+        self.assertIn('Closed 2 active sessions', stdout.getvalue())
+        stop_times = set(
+            RadiusAccounting.objects.filter(unique_id__in=['2', '3']).values_list(
+                'stop_time', flat=True
+            )
+        )
+        # all the sessions are closed with the same timestamp
+        self.assertEqual(len(stop_times), 1)
+
+    def test_cleanup_stale_radacct_organization_not_found(self):
+        with self.assertRaises(CommandError) as context:
+            call_command('cleanup_stale_radacct', 5, organization='wrong')
+        self.assertEqual(
+            str(context.exception), 'The organization supplied was not found'
+        )
+
     def test_delete_old_postauth_command(self):
         options = dict(username='steve', password='jones', reply='ghdhd')
         self._create_radius_postauth(**options)
@@ -57,6 +117,91 @@ class TestCommands(FileMixin, CallCommandMixin, BaseTestCase):
         call_command('delete_old_radacct', 3)
         self.assertEqual(RadiusAccounting.objects.filter(unique_id='666').count(), 0)
 
+    def _create_old_sessions(self, number):
+        sessions = []
+        for index in range(number):
+            options = _RADACCT.copy()
+            options.update(
+                unique_id='old-{}'.format(index), stop_time='2017-06-10 11:50:00',
+            )
+            sessions.append(self._create_radius_accounting(**options))
+        return sessions
+
+    def test_delete_old_radacct_batches(self):
+        sessions = self._create_old_sessions(5)
+        # recent and open sessions are not deleted
+        options = _RADACCT.copy()
+        options.update(unique_id='recent', start_time=now(), stop_time=now())
+        self._create_radius_accounting(**options)
+        options = _RADACCT.copy()
+        options['unique_id'] = 'open'
+        self._create_radius_accounting(**options)
+        stdout = StringIO()
+        with mock.patch('time.sleep') as sleep:
+            call_command(
+                'delete_old_radacct', 3, batch_size=2, sleep=0.5, stdout=stdout
+            )
+        output = stdout.getvalue()
+        self.assertIn('Deleted 2 sessions (last id: {})'.format(sessions[1].pk), output)
+        self.assertIn('Deleted 5 sessions (last id: {})'.format(sessions[4].pk), output)
+        self.assertIn('Deleted sessions older than 3 days', output)
+        self.assertEqual(sleep.call_count, 2)
+        sleep.assert_called_with(0.5)
+        self.assertEqual(
+            sorted(RadiusAccounting.objects.values_list('unique_id', flat=True)),
+            ['open', 'recent'],
+        )
+
+    def test_delete_old_radacct_resume(self):
+        sessions = self._create_old_sessions(4)
+        call_command(
+            'delete_old_radacct',
+            3,
+            '--resume-from',
+            str(sessions[1].pk),
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            sorted(RadiusAccounting.objects.values_list('unique_id', flat=True)),
+            ['old-0', 'old-1'],
+        )
+
+    def test_delete_old_radacct_resume_invalid(self):
+        with self.assertRaises(CommandError):
+            call_command('delete_old_radacct', 3, '--resume-from', 'x')
+
+    def test_delete_old_radacct_dry_run(self):
+        self._create_old_sessions(3)
+        stdout = StringIO()
+        call_command('delete_old_radacct', 3, dry_run=True, stdout=stdout)
+        self.assertIn(
+            '3 sessions older than 3 days would be deleted', stdout.getvalue()
+        )
+        self.assertEqual(RadiusAccounting.objects.count(), 3)
+
+    def test_delete_old_radacct_invalid_batch_size(self):
+        with self.assertRaises(CommandError):
+            call_command('delete_old_radacct', 3, batch_size=0)
+
+    def test_delete_old_postauth_batches(self):
+        for username in ['steve', 'mark', 'john']:
+            self._create_radius_postauth(
+                username=username, password='jones', reply='ghdhd'
+            )
+        RadiusPostAuth.objects.exclude(username='john').update(
+            date='2017-06-10 10:50:00'
+        )
+        stdout = StringIO()
+        call_command('delete_old_postauth', 3, dry_run=True, stdout=stdout)
+        self.assertIn('2 post-auth logs older than 3 days', stdout.getvalue())
+        self.assertEqual(RadiusPostAuth.objects.count(), 3)
+        stdout = StringIO()
+        call_command('delete_old_postauth', 3, batch_size=1, stdout=stdout)
+        self.assertIn('Deleted 2 post-auth logs', stdout.getvalue())
+        self.assertEqual(
+            list(RadiusPostAuth.objects.values_list('username', flat=True)), ['john']
+        )
+
     def test_batch_add_users_command(self):
         self.assertEqual(RadiusBatch.objects.all().count(), 0)
         path = self._get_path('static/test_batch.csv')
@@ -153,3 +298,75 @@ class TestCommands(FileMixin, CallCommandMixin, BaseTestCase):
         )
         with self.assertRaises(SystemExit):
             self._call_command('prefix_add_users', **options)
+
+    def test_partition_radacct_helpers(self):
+        self.assertEqual(add_months(date(2020, 11, 1), 3), date(2021, 2, 1))
+        self.assertEqual(add_months(date(2020, 1, 1), -1), date(2019, 12, 1))
+        name = get_partition_name('radacct', date(2020, 2, 1))
+        self.assertEqual(name, 'radacct_p2020_02')
+        self.assertEqual(get_partition_month('radacct', name), date(2020, 2, 1))
+        self.assertIsNone(get_partition_month('radacct', 'radacct_default'))
+
+    @skipUnless(connection.vendor != 'postgresql', 'requires another database')
+    def test_partition_radacct_command_not_supported(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_radacct', stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'postgresql', 'requires PostgreSQL')
+    def test_partition_radacct_command(self):
+        current = now().date().replace(day=1)
+        oldest = add_months(current, -13)
+        options = _RADACCT.copy()
+        options.update(
+            unique_id='old', start_time=make_aware(datetime.combine(oldest, time(12))),
+        )
+        self._create_radius_accounting(**options)
+        stdout = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('partition_radacct', stdout=stdout)
+        call_command('partition_radacct', convert=True, stdout=stdout)
+        self.assertIn('Converted the radacct table', stdout.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_inherits '
+                "WHERE inhparent = 'radacct'::regclass"
+            )
+            # default partition, 13 months ago to 3 months ahead
+            self.assertEqual(cursor.fetchone()[0], 18)
+        self.assertEqual(RadiusAccounting.objects.get().unique_id, 'old')
+        options.update(unique_id='new', start_time=now())
+        self._create_radius_accounting(**options)
+        stdout = StringIO()
+        call_command(
+            'partition_radacct', months_ahead=4, retention_months=12, stdout=stdout
+        )
+        self.assertIn('Created 1 partitions', stdout.getvalue())
+        self.assertIn('Dropped 1 expired partitions', stdout.getvalue())
+        self.assertEqual(
+            list(RadiusAccounting.objects.values_list('unique_id', flat=True)), ['new'],
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'requires PostgreSQL')
+    def test_partition_radacct_default_rows(self):
+        call_command('partition_radacct', convert=True, stdout=StringIO())
+        # stored in the default partition, the partitions
+        # are created up to 3 months ahead
+        future = add_months(now().date().replace(day=1), 5)
+        options = _RADACCT.copy()
+        options.update(
+            unique_id='future',
+            start_time=make_aware(datetime.combine(future, time(12))),
+        )
+        self._create_radius_accounting(**options)
+        stdout = StringIO()
+        call_command('partition_radacct', months_ahead=6, stdout=stdout)
+        self.assertIn('Created 3 partitions', stdout.getvalue())
+        partition = get_partition_name('radacct', future)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT acctuniqueid FROM {}'.format(
+                    connection.ops.quote_name(partition)
+                )
+            )
+            self.assertEqual(cursor.fetchall(), [('future',)])
+        self.assertEqual(RadiusAccounting.objects.get().unique_id, 'future')
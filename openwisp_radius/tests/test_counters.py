@@ -0,0 +1,261 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import settings as app_settings
+from ..cache import groupname_cache
+from ..utils import load_model
+from .mixins import ApiTokenMixin, BaseTestCase
+
+RadiusAccounting = load_model('RadiusAccounting')
+RadiusGroupCheck = load_model('RadiusGroupCheck')
+RadiusUserCounter = load_model('RadiusUserCounter')
+
+
+class TestCounters(ApiTokenMixin, BaseTestCase):
+    _acct_data = {
+        'status_type': 'Start',
+        'session_id': '35000006',
+        'unique_id': '75058e50',
+        'nas_ip_address': '172.16.64.91',
+        'username': 'molly',
+        'session_time': 0,
+        'input_octets': 0,
+        'output_octets': 0,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self._set_setting('API_ACCOUNTING_COUNTERS', True)
+        self.user = self._create_user(username='molly', password='barbar')
+
+    def _set_setting(self, name, value):
+        self.addCleanup(setattr, app_settings, name, getattr(app_settings, name))
+        setattr(app_settings, name, value)
+
+    def _post(self, name, data):
+        return self.client.post(
+            reverse(f'radius:{name}'),
+            json.dumps(data),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def _account(self, **kwargs):
+        data = self._acct_data.copy()
+        data.update(kwargs)
+        response = self._post('accounting', data)
+        self.assertIn(response.status_code, [200, 201])
+        return response
+
+    def _get_counter(self):
+        return RadiusUserCounter.objects.get(
+            organization=self.default_org, username='molly'
+        )
+
+    def _assert_counter(self, session_time, traffic):
+        counter = self._get_counter()
+        self.assertEqual(counter.day, timezone.localdate())
+        self.assertEqual(counter.daily_session_time, session_time)
+        self.assertEqual(counter.total_session_time, session_time)
+        self.assertEqual(counter.daily_traffic, traffic)
+        self.assertEqual(counter.total_traffic, traffic)
+
+    def _test_accounting(self):
+        self._account()
+        self.assertEqual(RadiusUserCounter.objects.count(), 0)
+        self._account(
+            status_type='Interim-Update',
+            session_time=60,
+            input_octets=100,
+            output_octets=200,
+        )
+        self._assert_counter(60, 300)
+        # only the usage which was not counted yet is added
+        self._account(
+            status_type='Stop', session_time=90, input_octets=150, output_octets=250
+        )
+        self._assert_counter(90, 400)
+        # duplicated packets are not counted twice
+        self._account(
+            status_type='Stop', session_time=90, input_octets=150, output_octets=250
+        )
+        self._assert_counter(90, 400)
+        self._account(
+            unique_id='75058e51', session_time=10, input_octets=0, output_octets=5
+        )
+        self._assert_counter(100, 405)
+
+    def test_accounting(self):
+        self._test_accounting()
+
+    def test_accounting_upsert(self):
+        self._set_setting('API_ACCOUNTING_UPSERT', True)
+        self._test_accounting()
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_accounting_fast_views(self):
+        self._test_accounting()
+
+    def test_accounting_disabled(self):
+        app_settings.API_ACCOUNTING_COUNTERS = False
+        self._account(status_type='Interim-Update', session_time=60)
+        self.assertEqual(RadiusUserCounter.objects.count(), 0)
+
+    def test_accounting_batch(self):
+        packets = [
+            self._acct_data,
+            dict(self._acct_data, status_type='Interim-Update', session_time=30),
+            dict(
+                self._acct_data,
+                status_type='Stop',
+                session_time=40,
+                input_octets=10,
+                output_octets=20,
+            ),
+            dict(self._acct_data, unique_id='75058e51', session_time=5),
+        ]
+        response = self._post('accounting_batch', packets)
+        self.assertEqual(response.status_code, 200)
+        self._assert_counter(45, 30)
+        packets = [
+            dict(self._acct_data, status_type='Stop', session_time=50),
+            dict(self._acct_data, unique_id='75058e51', username='other'),
+        ]
+        self._post('accounting_batch', packets)
+        self._assert_counter(55, 30)
+        self.assertFalse(RadiusUserCounter.objects.filter(username='other').exists())
+
+    def test_daily_reset(self):
+        RadiusUserCounter.objects.create(
+            organization=self.default_org,
+            username='molly',
+            day=timezone.localdate() - timedelta(days=1),
+            daily_session_time=1000,
+            daily_traffic=2000,
+            total_session_time=1000,
+            total_traffic=2000,
+        )
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 10, 20)
+        counter = self._get_counter()
+        self.assertEqual(counter.day, timezone.localdate())
+        self.assertEqual(counter.daily_session_time, 10)
+        self.assertEqual(counter.daily_traffic, 20)
+        self.assertEqual(counter.total_session_time, 1010)
+        self.assertEqual(counter.total_traffic, 2020)
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 10, 20)
+        counter = self._get_counter()
+        self.assertEqual(counter.daily_session_time, 20)
+        self.assertEqual(counter.total_session_time, 1020)
+
+    @mock.patch.object(groupname_cache, 'maxsize', 1000)
+    def test_usage(self):
+        # limits of the default group: 10800 seconds, 3000000000 octets
+        response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                'reply:Session-Timeout': 10800,
+                'reply:ChilliSpot-Max-Total-Octets': 3000000000,
+            },
+        )
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 800, 1000000000)
+        # the organization token, the groupname and the group policy are cached
+        with self.assertNumQueries(1):
+            response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(
+            response.json(),
+            {
+                'reply:Session-Timeout': 10000,
+                'reply:ChilliSpot-Max-Total-Octets': 2000000000,
+            },
+        )
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 10000, 0)
+        response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['control:Auth-Type'], 'Reject')
+        self.assertIn('reply:Reply-Message', response.json())
+
+    def test_usage_all_session(self):
+        group = self.user.radiususergroup_set.first().group
+        RadiusGroupCheck.objects.filter(group=group).delete()
+        RadiusGroupCheck.objects.create(
+            group=group,
+            groupname=group.name,
+            attribute='Max-All-Session',
+            op=':=',
+            value='3600',
+        )
+        RadiusUserCounter.objects.create(
+            organization=self.default_org,
+            username='molly',
+            day=timezone.localdate() - timedelta(days=1),
+            daily_session_time=600,
+            total_session_time=600,
+        )
+        self._set_setting('API_COUNTERS_TRAFFIC_REPLY', None)
+        response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(response.json(), {'reply:Session-Timeout': 3000})
+
+    def test_usage_no_limits(self):
+        group = self.user.radiususergroup_set.first().group
+        RadiusGroupCheck.objects.filter(group=group).delete()
+        response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data)
+        response = self._post('usage', {'username': 'notexisting'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_usage_fast_views(self):
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 800, 0)
+        response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reply:Session-Timeout'], 10000)
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 10000, 0)
+        response = self._post('usage', {'username': 'molly'})
+        self.assertEqual(response.status_code, 401)
+        response = self._post('usage', {'username': 'notexisting'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+
+    def test_rebuild_command(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        options = dict(
+            organization=self.default_org,
+            nas_ip_address='172.16.64.91',
+            username='molly',
+        )
+        RadiusAccounting.objects.create(
+            session_id='1',
+            unique_id='1',
+            start_time=yesterday,
+            session_time=100,
+            input_octets=10,
+            output_octets=20,
+            **options,
+        )
+        RadiusAccounting.objects.create(
+            session_id='2',
+            unique_id='2',
+            session_time=50,
+            input_octets=1,
+            output_octets=2,
+            **options,
+        )
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 9999, 9999)
+        stdout = StringIO()
+        call_command('rebuild_radius_counters', stdout=stdout)
+        self.assertIn('Rebuilt the counters of 1 users', stdout.getvalue())
+        counter = self._get_counter()
+        self.assertEqual(counter.total_session_time, 150)
+        self.assertEqual(counter.total_traffic, 33)
+        self.assertEqual(counter.daily_session_time, 50)
+        self.assertEqual(counter.daily_traffic, 3)
@@ -0,0 +1,205 @@
+import json
+import socket
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from .. import metrics
+from .. import settings as app_settings
+from ..metrics import HISTOGRAM_BUCKETS, Histogram, HistogramSink, StatsdSink
+from ..utils import load_model
+from .mixins import ApiTokenMixin, BaseTestCase
+
+RadiusToken = load_model('RadiusToken')
+
+
+class RecordingSink(metrics.BaseSink):
+    recorded = []
+
+    def record(self, metrics):
+        self.recorded.append(metrics)
+
+
+class TestMetrics(ApiTokenMixin, BaseTestCase):
+    _acct_data = {
+        'status_type': 'Start',
+        'session_id': '35000006',
+        'unique_id': '75058e50',
+        'nas_ip_address': '172.16.64.91',
+        'username': 'molly',
+        'session_time': 0,
+        'input_octets': 0,
+        'output_octets': 0,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self._set_metrics(
+            METRICS_ENABLED=True,
+            METRICS_SINKS=['openwisp_radius.tests.test_metrics.RecordingSink'],
+        )
+        RecordingSink.recorded = []
+        self.user = self._create_user(username='molly', password='barbar')
+
+    def _set_metrics(self, **settings):
+        for name, value in settings.items():
+            self.addCleanup(setattr, app_settings, name, getattr(app_settings, name))
+            setattr(app_settings, name, value)
+
+    def _post(self, name, data):
+        return self.client.post(
+            reverse(f'radius:{name}'),
+            json.dumps(data),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def _authorize(self, password='barbar'):
+        return self._post('authorize', {'username': 'molly', 'password': password})
+
+    def test_disabled(self):
+        app_settings.METRICS_ENABLED = False
+        with mock.patch.object(metrics, 'send') as send:
+            self._authorize()
+        send.assert_not_called()
+
+    def test_authorize(self):
+        response = self._authorize()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(RecordingSink.recorded), 1)
+        recorded = RecordingSink.recorded[0]
+        self.assertEqual(recorded.endpoint, 'authorize')
+        self.assertEqual(
+            list(recorded.phases), ['auth', 'user_lookup', 'password_check']
+        )
+        self.assertEqual(recorded.phases['user_lookup'][1], 1)
+        self.assertEqual(recorded.phases['password_check'][1], 0)
+        self.assertGreaterEqual(recorded.queries, 1)
+        self.assertGreater(recorded.duration, 0)
+
+    def test_authorize_token(self):
+        token = RadiusToken.objects.create(user=self.user)
+        self._authorize(password=token.key)
+        recorded = RecordingSink.recorded[0]
+        self.assertIn('token_check', recorded.phases)
+        # the disposable token is deleted
+        self.assertGreater(recorded.phases['token_check'][1], 0)
+
+    def test_postauth(self):
+        response = self._post('postauth', self._get_postauth_params())
+        self.assertEqual(response.status_code, 201)
+        recorded = RecordingSink.recorded[0]
+        self.assertEqual(recorded.endpoint, 'postauth')
+        self.assertEqual(list(recorded.phases), ['auth', 'validation', 'db_write'])
+        self.assertEqual(recorded.phases['db_write'][1], 1)
+
+    def test_accounting(self):
+        response = self._post('accounting', self._acct_data)
+        self.assertEqual(response.status_code, 201)
+        recorded = RecordingSink.recorded[0]
+        self.assertEqual(recorded.endpoint, 'accounting')
+        for phase in ['auth', 'validation', 'groupname_lookup', 'db_write']:
+            self.assertIn(phase, recorded.phases)
+        self.assertEqual(recorded.phases['groupname_lookup'][1], 1)
+
+    def test_accounting_list_not_instrumented(self):
+        self.client.get(
+            reverse('radius:accounting'), HTTP_AUTHORIZATION=self.auth_header
+        )
+        self.assertEqual(RecordingSink.recorded, [])
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_fast_views(self):
+        self._authorize()
+        self._post('accounting', self._acct_data)
+        authorize, accounting = RecordingSink.recorded
+        self.assertEqual(authorize.endpoint, 'authorize')
+        self.assertEqual(
+            list(authorize.phases), ['auth', 'user_lookup', 'password_check']
+        )
+        self.assertEqual(accounting.endpoint, 'accounting')
+        for phase in ['auth', 'validation', 'groupname_lookup', 'db_write']:
+            self.assertIn(phase, accounting.phases)
+
+    def test_sink_failure(self):
+        with mock.patch.object(RecordingSink, 'record', side_effect=ValueError):
+            with self.assertLogs('openwisp_radius.metrics', 'ERROR'):
+                response = self._authorize()
+        self.assertEqual(response.status_code, 200)
+
+    def test_logging_sink(self):
+        app_settings.METRICS_SINKS = ['openwisp_radius.metrics.LoggingSink']
+        with self.assertLogs('openwisp_radius.metrics', 'INFO') as logs:
+            self._authorize()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('authorize ', logs.output[0])
+        self.assertIn('user_lookup=', logs.output[0])
+
+    def test_statsd_sink(self):
+        collector = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(collector.close)
+        collector.bind(('127.0.0.1', 0))
+        collector.settimeout(2)
+        self._set_metrics(
+            METRICS_SINKS=['openwisp_radius.metrics.StatsdSink'],
+            METRICS_STATSD_HOST='127.0.0.1',
+            METRICS_STATSD_PORT=collector.getsockname()[1],
+        )
+        self._authorize()
+        lines = collector.recv(65535).decode().split('\n')
+        self.assertIn('openwisp_radius.authorize.user_lookup.queries:1|h', lines)
+        self.assertTrue(lines[0].startswith('openwisp_radius.authorize.total.time:'))
+        self.assertTrue(lines[0].endswith('|ms'))
+
+    def test_statsd_sink_error(self):
+        sink = StatsdSink()
+        sink.socket.close()
+        sink.socket = mock.Mock(**{'sendto.side_effect': OSError('error')})
+        with self.assertLogs('openwisp_radius.metrics', 'WARNING'):
+            sink.record(metrics.RequestMetrics('authorize'))
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for milliseconds in [0.5, 3, 3, 40, 8000]:
+            histogram.add(milliseconds / 1000, 1)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.queries, 5)
+        self.assertEqual(histogram.percentile(20), 1)
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(80), 50)
+        self.assertIsNone(histogram.percentile(99))
+        self.assertEqual(histogram.buckets[-1], 1)
+        self.assertEqual(len(histogram.buckets), len(HISTOGRAM_BUCKETS) + 1)
+        merged = Histogram(histogram.as_dict())
+        merged.merge(histogram)
+        self.assertEqual(merged.count, 10)
+
+    def test_histogram_sink_command(self):
+        self._set_metrics(
+            METRICS_SINKS=['openwisp_radius.metrics.HistogramSink'],
+            METRICS_HISTOGRAM_INTERVAL=0,
+        )
+        HistogramSink.reset()
+        self.addCleanup(HistogramSink.reset)
+        self._authorize()
+        self._authorize()
+        histograms = HistogramSink.load()
+        self.assertEqual(histograms['authorize:total'].count, 2)
+        self.assertEqual(histograms['authorize:user_lookup'].queries, 2)
+        stdout = StringIO()
+        call_command('radius_metrics', stdout=stdout)
+        self.assertIn('authorize:password_check', stdout.getvalue())
+        stdout = StringIO()
+        call_command('radius_metrics', json=True, stdout=stdout)
+        data = json.loads(stdout.getvalue())
+        self.assertEqual(data['authorize:total']['count'], 2)
+        call_command('radius_metrics', reset=True, stdout=StringIO())
+        stdout = StringIO()
+        call_command('radius_metrics', stdout=stdout)
+        self.assertIn('No metrics collected', stdout.getvalue())
+        # data collected before the reset is discarded
+        self._authorize()
+        self.assertEqual(HistogramSink.load()['authorize:total'].count, 1)
@@ -23,6 +23,7 @@ RadiusGroupReply = load_model('RadiusGroupReply')
 RadiusUserGroup = load_model('RadiusUserGroup')
 RadiusBatch = load_model('RadiusBatch')
 Organization = swapper.load_model('openwisp_users', 'Organization')
+OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
 
 
 class TestNas(BaseTestCase):
@@ -411,6 +412,26 @@ class TestRadiusBatch(BaseTestCase):
         self.assertEqual(RadiusBatch.objects.all().count(), 0)
         self.assertEqual(User.objects.all().count(), 0)
 
+    def test_prefix_add(self):
+        User = get_user_model()
+        User.objects.create(username='test-prefix1')
+        User.objects.create(username='test-prefix3')
+        radiusbatch = self._create_radius_batch(
+            strategy='prefix', prefix='test-prefix', name='test'
+        )
+        radiusbatch.prefix_add('test-prefix', 4)
+        self.assertEqual(
+            sorted(radiusbatch.users.values_list('username', flat=True)),
+            ['test-prefix2', 'test-prefix4', 'test-prefix5', 'test-prefix6'],
+        )
+        for user in radiusbatch.users.all():
+            self.assertEqual(user.radiususergroup_set.get().groupname, 'default-users')
+            self.assertTrue(
+                OrganizationUser.objects.filter(
+                    user=user, organization=self.default_org
+                ).exists()
+            )
+
     def test_clean_method(self):
         with self.assertRaises(ValidationError):
             self._create_radius_batch()
@@ -0,0 +1,203 @@
+import json
+from time import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from .. import settings as app_settings
+from ..cache import (
+    get_group_policy_invalidation_key,
+    group_policy_cache,
+    groupname_cache,
+)
+from ..policy import GroupPolicy
+from ..utils import load_model
+from .mixins import ApiTokenMixin, BaseTestCase
+
+RadiusGroupCheck = load_model('RadiusGroupCheck')
+RadiusGroupReply = load_model('RadiusGroupReply')
+RadiusUserCounter = load_model('RadiusUserCounter')
+
+
+class TestGroupPolicy(ApiTokenMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self._set_setting('API_AUTHORIZE_GROUP_POLICY', True)
+        self.user = self._create_user(username='molly', password='barbar')
+        self.group = self.user.radiususergroup_set.first().group
+
+    def _set_setting(self, name, value):
+        self.addCleanup(setattr, app_settings, name, getattr(app_settings, name))
+        setattr(app_settings, name, value)
+
+    def _authorize(self, **data):
+        data.setdefault('username', 'molly')
+        data.setdefault('password', 'barbar')
+        return self.client.post(
+            reverse('radius:authorize'),
+            json.dumps(data),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=self.auth_header,
+        )
+
+    def _create_check(self, attribute, op, value):
+        return RadiusGroupCheck.objects.create(
+            group=self.group,
+            groupname=self.group.name,
+            attribute=attribute,
+            op=op,
+            value=value,
+        )
+
+    def _create_reply(self, attribute, op, value):
+        return RadiusGroupReply.objects.create(
+            group=self.group,
+            groupname=self.group.name,
+            attribute=attribute,
+            op=op,
+            value=value,
+        )
+
+    def test_disabled(self):
+        app_settings.API_AUTHORIZE_GROUP_POLICY = False
+        response = self._authorize()
+        self.assertEqual(response.json(), {'control:Auth-Type': 'Accept'})
+
+    def test_default_group(self):
+        response = self._authorize()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                'control:Auth-Type': 'Accept',
+                'control:Max-Daily-Session': '10800',
+                'control:Max-Daily-Session-Traffic': '3000000000',
+            },
+        )
+
+    def test_wrong_password(self):
+        response = self._authorize(password='wrong')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data)
+
+    def test_replies(self):
+        self._authorize()
+        # the cached policy is invalidated
+        self._create_reply('Session-Timeout', '=', '3600')
+        self._create_reply('Reply-Message', '+=', 'hello')
+        self._create_reply('Reply-Message', '+=', 'world')
+        response = self._authorize()
+        self.assertEqual(response.json()['reply:Session-Timeout'], '3600')
+        self.assertEqual(response.json()['reply:Reply-Message'], ['hello', 'world'])
+        RadiusGroupReply.objects.filter(attribute='Reply-Message').delete()
+        response = self._authorize()
+        self.assertNotIn('reply:Reply-Message', response.json())
+
+    @mock.patch.object(groupname_cache, 'maxsize', 1000)
+    def test_policy_cache(self):
+        self._authorize()
+        self.assertIn(self.group.name, group_policy_cache._data)
+        with self.assertNumQueries(1):
+            # only the user is looked up
+            self._authorize()
+        self.group.name = 'default-renamed'
+        self.group.save()
+        self.assertEqual(len(group_policy_cache), 0)
+
+    def test_policy_cache_invalidated_by_other_process(self):
+        self._create_reply('Session-Timeout', ':=', '3600')
+        self._authorize()
+        self.assertIn(self.group.name, group_policy_cache._data)
+        # simulates changes saved by another process: the local entry
+        # is kept but the shared invalidation times are set
+        for groupname, value in [(self.group.name, '7200'), (None, '1800')]:
+            RadiusGroupReply.objects.update(value=value)
+            key = get_group_policy_invalidation_key(groupname)
+            self.addCleanup(cache.delete, key)
+            cache.set(key, time())
+            response = self._authorize()
+            self.assertEqual(response.json()['reply:Session-Timeout'], value)
+
+    def test_conditions(self):
+        self._create_check('NAS-IP-Address', '==', '10.0.0.1')
+        self._create_reply('Session-Timeout', ':=', '3600')
+        # groups whose conditions are not met are ignored
+        response = self._authorize()
+        self.assertEqual(response.json(), {'control:Auth-Type': 'Accept'})
+        response = self._authorize(**{'NAS-IP-Address': '10.0.0.1'})
+        self.assertEqual(response.json()['reply:Session-Timeout'], '3600')
+        self.assertEqual(response.json()['control:Max-Daily-Session'], '10800')
+
+    def test_reject(self):
+        self._create_check('Auth-Type', ':=', 'Reject')
+        response = self._authorize()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'control:Auth-Type': 'Reject'})
+
+    def test_counters(self):
+        self._set_setting('API_ACCOUNTING_COUNTERS', True)
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 800, 0)
+        response = self._authorize()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reply:Session-Timeout'], 10000)
+        RadiusUserCounter.objects.add(self.default_org.pk, 'molly', 10000, 0)
+        response = self._authorize()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['control:Auth-Type'], 'Reject')
+        self.assertIn('reply:Reply-Message', response.json())
+
+    @override_settings(ROOT_URLCONF='openwisp2.fast_urls')
+    def test_fast_views(self):
+        self._create_reply('Session-Timeout', ':=', '3600')
+        response = self._authorize()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['control:Auth-Type'], 'Accept')
+        self.assertEqual(response.json()['reply:Session-Timeout'], '3600')
+        self._create_check('Auth-Type', ':=', 'Reject')
+        response = self._authorize()
+        self.assertEqual(response.status_code, 401)
+
+    def test_operators(self):
+        checks = [
+            ('Max-Daily-Session', ':=', '100'),
+            ('Max-Daily-Session', '=', '200'),
+            ('Simultaneous-Use', '=', '1'),
+            ('NAS-Port', '>=', '10'),
+            ('NAS-Port', '<', '20'),
+            ('Called-Station-Id', '=~', '^00-27-22'),
+            ('Calling-Station-Id', '!~', '^ff'),
+            ('NAS-Identifier', '=*', ''),
+            ('Framed-IP-Address', '!*', ''),
+            ('NAS-Port-Type', '!=', 'Virtual'),
+        ]
+        policy = GroupPolicy('test', checks, [])
+        self.assertEqual(
+            policy.control, {'Max-Daily-Session': '100', 'Simultaneous-Use': '1'}
+        )
+        self.assertEqual(policy.limits, {'Max-Daily-Session': 100})
+        request = {
+            'NAS-Port': '15',
+            'Called-Station-Id': '00-27-22-F3-FA-F1:hostname',
+            'Calling-Station-Id': '5c:7d:c1:72:a7:3b',
+            'NAS-Identifier': 'nas',
+            'NAS-Port-Type': 'Wireless - IEEE 802.11',
+        }
+        self.assertTrue(policy.match(request))
+        for attribute, value in [
+            ('NAS-Port', '20'),
+            ('NAS-Port', 'wrong'),
+            ('Called-Station-Id', '11-27-22'),
+            ('Calling-Station-Id', 'ff:7d'),
+            ('NAS-Identifier', None),
+            ('Framed-IP-Address', '10.0.0.1'),
+            ('NAS-Port-Type', 'Virtual'),
+        ]:
+            with self.subTest(attribute=attribute, value=value):
+                self.assertFalse(policy.match(dict(request, **{attribute: value})))
+
+    def test_invalid_regular_expression(self):
+        with self.assertLogs('openwisp_radius.policy', 'WARNING'):
+            policy = GroupPolicy('test', [('Called-Station-Id', '=~', '(')], [])
+        self.assertFalse(policy.match({'Called-Station-Id': '('}))
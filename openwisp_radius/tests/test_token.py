@@ -1,8 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from threading import Barrier
 from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TransactionTestCase
 from django.utils import timezone
 from freezegun import freeze_time
 
@@ -28,6 +33,66 @@ class TestRadiusToken(BaseTestCase):
         self.assertEqual(str(obj), obj.key)
         self.assertEqual(obj.user, u)
 
+    def test_verify(self):
+        u = User.objects.create(username='test', email='test@test.org', password='test')
+        token = RadiusToken.objects.create(user=u)
+        with self.assertNumQueries(1):
+            self.assertTrue(RadiusToken.objects.verify(u, token.key, consume=False))
+        self.assertFalse(RadiusToken.objects.verify(u, 'wrong', consume=False))
+        self.assertTrue(RadiusToken.objects.filter(key=token.key).exists())
+
+    def test_verify_consume(self):
+        u = User.objects.create(username='test', email='test@test.org', password='test')
+        token = RadiusToken.objects.create(user=u)
+        handler = mock.Mock()
+        post_delete.connect(handler, sender=RadiusToken)
+        self.addCleanup(post_delete.disconnect, handler, sender=RadiusToken)
+        self.assertFalse(RadiusToken.objects.verify(u, 'wrong', consume=True))
+        handler.assert_not_called()
+        # savepoint, SELECT ... FOR UPDATE, DELETE, release savepoint
+        with self.assertNumQueries(4):
+            self.assertTrue(RadiusToken.objects.verify(u, token.key, consume=True))
+        handler.assert_called_once()
+        self.assertEqual(handler.call_args[1]['instance'].user_id, u.pk)
+        self.assertFalse(RadiusToken.objects.verify(u, token.key, consume=True))
+        self.assertFalse(RadiusToken.objects.filter(key=token.key).exists())
+
+    @mock.patch.object(app_settings, 'DISPOSABLE_RADIUS_USER_TOKEN', False)
+    def test_verify_default(self):
+        u = User.objects.create(username='test', email='test@test.org', password='test')
+        token = RadiusToken.objects.create(user=u)
+        self.assertTrue(RadiusToken.objects.verify(u, token.key))
+        self.assertTrue(RadiusToken.objects.filter(key=token.key).exists())
+
+
+class TestRadiusTokenConcurrency(TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # the connections of the threads share the cache of the
+            # in-memory database, which does not wait for the locks of
+            # the other connections ("database table is locked")
+            self.skipTest('concurrent writes not supported by in-memory sqlite')
+
+    def test_verify_consume_concurrent(self):
+        u = User.objects.create(username='test', email='test@test.org', password='test')
+        token = RadiusToken.objects.create(user=u)
+        threads = 8
+        barrier = Barrier(threads)
+
+        def verify():
+            try:
+                barrier.wait(timeout=10)
+                return RadiusToken.objects.verify(u, token.key, consume=True)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(verify) for i in range(threads)]
+        # exceptions raised by the workers are raised again here
+        results = [future.result() for future in futures]
+        self.assertEqual(results.count(True), 1)
+
 
 class TestPhoneToken(BaseTestCase):
     def setUp(self):
@@ -1,7 +1,16 @@
+from io import BytesIO
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
-from ..utils import find_available_username, validate_csvfile
+from ..utils import (
+    find_available_username,
+    iter_available_usernames,
+    iter_csv_rows,
+    iter_csvfile_lines,
+    prefix_generate_users,
+    validate_csvfile,
+)
 from . import FileMixin
 from .mixins import BaseTestCase
 
@@ -14,6 +23,39 @@ class TestUtils(FileMixin, BaseTestCase):
         User.objects.create(username='rohith1', password='password')
         self.assertEqual(find_available_username('rohith', []), 'rohith2')
 
+    def test_find_available_username_users_list(self):
+        User = get_user_model()
+        User.objects.create(username='rohith', password='password')
+        users_list = [User(username='rohith1'), User(username='rohith2')]
+        self.assertEqual(find_available_username('rohith', users_list), 'rohith3')
+        self.assertEqual(find_available_username('bob', users_list), 'bob')
+        self.assertEqual(find_available_username('bob', [], prefix=True), 'bob1')
+
+    def test_iter_available_usernames(self):
+        taken = {'user', 'user1', 'user3'}
+        usernames = iter_available_usernames('user', taken)
+        self.assertEqual(
+            [next(usernames) for i in range(3)], ['user2', 'user4', 'user5']
+        )
+        self.assertIn('user5', taken)
+        usernames = iter_available_usernames('other', taken)
+        self.assertEqual([next(usernames) for i in range(2)], ['other', 'other1'])
+
+    def test_prefix_generate_users(self):
+        User = get_user_model()
+        User.objects.create(username='test-prefix2')
+        User.objects.create(username='test-prefix10')
+        # the existing usernames are looked up with a single query
+        with self.assertNumQueries(1):
+            users_list, user_password = prefix_generate_users('test-prefix', 10, 8)
+        usernames = [user.username for user in users_list]
+        self.assertEqual(len(set(usernames)), 10)
+        self.assertNotIn('test-prefix2', usernames)
+        self.assertNotIn('test-prefix10', usernames)
+        self.assertEqual(usernames[:2], ['test-prefix1', 'test-prefix3'])
+        self.assertEqual(usernames[-1], 'test-prefix12')
+        self.assertEqual([username for username, _ in user_password], usernames)
+
     def test_validate_file_format(self):
         invalid_format_path = self._get_path('static/test_batch_invalid_format.pdf')
         with self.assertRaises(ValidationError) as error:
@@ -32,3 +74,26 @@ class TestUtils(FileMixin, BaseTestCase):
         with self.assertRaises(ValidationError) as error:
             validate_csvfile(open(improper_csv_path, 'rt'))
         self.assertTrue('Improper CSV format' in error.exception.message)
+
+    def test_iter_csvfile_lines(self):
+        csvfile = BytesIO('àlpha,1\r\nbèta,2\n\ngamma,3'.encode('utf-8'))
+        # the chunks split the multi-byte characters
+        self.assertEqual(
+            list(iter_csvfile_lines(csvfile, chunk_size=1)),
+            ['àlpha,1\r\n', 'bèta,2\n', '\n', 'gamma,3'],
+        )
+
+    def test_iter_csv_rows(self):
+        csvfile = BytesIO(
+            b'rohith,,rohith@openwisp.com,,\n\n'
+            b'"rohith2","","rohith2@openwisp.com","Rohith","ASRK"\n'
+            b'invalid,,invalid,,\n'
+            b'other,,other@openwisp.com,,\n'
+        )
+        rows = iter_csv_rows(csvfile)
+        self.assertEqual(next(rows), ['rohith', '', 'rohith@openwisp.com', '', ''])
+        self.assertEqual(next(rows)[2], 'rohith2@openwisp.com')
+        with self.assertRaises(ValidationError) as error:
+            next(rows)
+        self.assertIn('line number 4', error.exception.message)
+        self.assertIn('Enter a valid email address', error.exception.message)
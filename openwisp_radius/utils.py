@@ -1,7 +1,7 @@
+import codecs
 import csv
 import os
 from datetime import timedelta
-from io import StringIO
 
 import swapper
 from django.conf import settings
@@ -18,6 +18,7 @@ from sendsms.signals import sms_post_send
 from weasyprint import HTML
 
 from . import settings as app_settings
+from .passwords import hash_passwords
 
 SESSION_TIME_ATTRIBUTE = 'Max-Daily-Session'
 SESSION_TRAFFIC_ATTRIBUTE = 'Max-Daily-Session-Traffic'
@@ -98,47 +99,110 @@ class SmsMessage(BaseSmsMessage):
         return res
 
 
-def find_available_username(username, users_list, prefix=False):
+def get_usernames_with_prefix(prefix):
+    """
+    returns the set of the usernames of the existing users
+    which start with ``prefix``, looked up with a single query
+    """
     User = get_user_model()
+    return set(
+        User.objects.filter(username__startswith=prefix).values_list(
+            'username', flat=True
+        )
+    )
+
+
+def iter_available_usernames(username, taken, prefix=False):
+    """
+    yields the usernames which are not in ``taken`` (set): ``username``
+    (skipped if ``prefix`` is ``True``) and ``username`` followed by 1, 2,
+    3 and so on; the usernames yielded are added to ``taken``
+    """
+    if not prefix and username not in taken:
+        taken.add(username)
+        yield username
     suffix = 1
-    tmp = '{}{}'.format(username, suffix) if prefix else username
-    names_list = map(lambda x: x.username, users_list)
-    while User.objects.filter(username=tmp).exists() or tmp in names_list:
-        suffix += 1 if prefix else 0
-        tmp = '{}{}'.format(username, suffix)
-        suffix += 1 if not prefix else 0
-    return tmp
+    while True:
+        candidate = '{}{}'.format(username, suffix)
+        if candidate not in taken:
+            taken.add(candidate)
+            yield candidate
+        suffix += 1
 
 
-def validate_csvfile(csvfile):
-    csv_data = csvfile.read()
+def find_available_username(username, users_list, prefix=False):
+    """
+    returns the first available username (see ``iter_available_usernames``),
+    the usernames of the (unsaved) users in ``users_list`` are not available
+    """
+    taken = get_usernames_with_prefix(username)
+    taken.update(user.username for user in users_list)
+    return next(iter_available_usernames(username, taken, prefix))
+
+
+def iter_csvfile_lines(csvfile, chunk_size=64 * 1024):
+    """
+    yields the lines of ``csvfile`` (binary or text file), which is read
+    in chunks of ``chunk_size`` and decoded incrementally, hence it is
+    never loaded entirely in memory
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    while True:
+        data = csvfile.read(chunk_size)
+        if not data:
+            break
+        if isinstance(data, bytes):
+            data = decoder.decode(data)
+        *lines, pending = (pending + data).split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def iter_csv_rows(csvfile):
+    """
+    yields the rows of ``csvfile`` which are not empty, validating them
+    while the file is read: raises ``ValidationError`` (which contains
+    the line number) as soon as an invalid row is found
+    """
+    reader = csv.reader(iter_csvfile_lines(csvfile), delimiter=',')
+    error_message = 'The CSV contains a line with invalid data,\
+                    line number {} triggered the following error: {}'
     try:
-        csv_data = csv_data.decode('utf-8') if isinstance(csv_data, bytes) else csv_data
-    except UnicodeDecodeError:
+        for row in reader:
+            if len(row) == 5:
+                username, password, email, firstname, lastname = row
+                try:
+                    validate_email(email)
+                except ValidationError as e:
+                    raise ValidationError(
+                        _(error_message.format(str(reader.line_num), e.message))
+                    )
+                yield row
+            elif len(row) > 0:
+                raise ValidationError(
+                    _(
+                        error_message.format(
+                            str(reader.line_num), 'Improper CSV format.'
+                        )
+                    )
+                )
+    except (UnicodeDecodeError, csv.Error):
         raise ValidationError(
             _(
                 'Unrecognized file format, the supplied file '
                 'does not look like a CSV file.'
             )
         )
-    reader = csv.reader(StringIO(csv_data), delimiter=',')
-    error_message = 'The CSV contains a line with invalid data,\
-                    line number {} triggered the following error: {}'
-    row_count = 1
-    for row in reader:
-        if len(row) == 5:
-            username, password, email, firstname, lastname = row
-            try:
-                validate_email(email)
-            except ValidationError as e:
-                raise ValidationError(
-                    _(error_message.format(str(row_count), e.message))
-                )
-            row_count += 1
-        elif len(row) > 0:
-            raise ValidationError(
-                _(error_message.format(str(row_count), 'Improper CSV format.'))
-            )
+
+
+def validate_csvfile(csvfile):
+    csvfile.seek(0)
+    for row in iter_csv_rows(csvfile):
+        pass
     csvfile.seek(0)
 
 
@@ -146,13 +210,18 @@ def prefix_generate_users(prefix, n, password_length):
     users_list = []
     user_password = []
     User = get_user_model()
+    # the suffixes are calculated in memory from the existing usernames
+    usernames = iter_available_usernames(
+        prefix, get_usernames_with_prefix(prefix), prefix=True
+    )
     for i in range(n):
-        username = find_available_username(prefix, users_list, True)
+        username = next(usernames)
         password = get_random_string(length=password_length)
-        u = User(username=username)
-        u.set_password(password)
-        users_list.append(u)
+        users_list.append(User(username=username))
         user_password.append([username, password])
+    hashes = hash_passwords([password for _, password in user_password])
+    for user, encoded in zip(users_list, hashes):
+        user.password = encoded
     return users_list, user_password
 
 
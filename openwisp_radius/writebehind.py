@@ -0,0 +1,168 @@
+"""
+In-process write-behind queues, used to remove
+database writes from the latency path of freeradius
+"""
+import atexit
+import logging
+import queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from django.db import close_old_connections, connection
+
+from . import settings as app_settings
+from .utils import load_model
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue(object):
+    """
+    Bounded queue of model instances which are written in batches
+    by a background thread, as soon as ``batch_size`` instances are
+    collected or ``flush_interval`` seconds have passed.
+
+    When the queue is full, ``put`` blocks up to ``put_timeout``
+    seconds, after which the instance is dropped.
+    If writing a batch fails, its instances are written one by one.
+    Any instance still queued is written when the process exits.
+    """
+
+    def __init__(self, write, maxsize, batch_size, flush_interval, put_timeout):
+        self.write = write
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopping = Event()
+        self._thread = None
+        self._lock = Lock()
+
+    def put(self, instance):
+        """
+        enqueues ``instance``, returns ``False`` if it has been dropped
+        """
+        self.start()
+        try:
+            self._queue.put(instance, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(
+                'write-behind queue full, {} dropped'.format(
+                    instance.__class__.__name__
+                )
+            )
+            return False
+        self.enqueued += 1
+        return True
+
+    def start(self):
+        """
+        starts the background thread (if not started yet)
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        """
+        stops the background thread and writes any queued instance
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout)
+            atexit.unregister(self.stop)
+        self.flush()
+
+    def flush(self):
+        """
+        writes any queued instance in the current thread
+        """
+        while True:
+            batch = self._get_nowait(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def stats(self):
+        return {
+            'depth': self._queue.qsize(),
+            'maxsize': self.maxsize,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _get_nowait(self, size):
+        batch = []
+        while len(batch) < size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = []
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stopping.is_set():
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                # the thread has its own database connections
+                close_old_connections()
+                self._write(batch)
+        connection.close()
+
+    def _write(self, batch):
+        try:
+            self.write(batch)
+        except Exception:
+            if len(batch) == 1:
+                self.failed += 1
+                logger.exception('write-behind queue failed to write 1 instance')
+                return
+            # one invalid instance must not cause the loss
+            # of the others: falls back to one write per instance
+            logger.warning(
+                'write-behind queue failed to write {} instances, '
+                'retrying one by one'.format(len(batch))
+            )
+            for instance in batch:
+                self._write([instance])
+        else:
+            self.written += len(batch)
+
+
+def _write_postauth(batch):
+    load_model('RadiusPostAuth').objects.bulk_create(batch)
+
+
+postauth_queue = WriteBehindQueue(
+    write=_write_postauth,
+    maxsize=app_settings.API_POSTAUTH_QUEUE_SIZE,
+    batch_size=app_settings.API_POSTAUTH_BATCH_SIZE,
+    flush_interval=app_settings.API_POSTAUTH_FLUSH_INTERVAL,
+    put_timeout=app_settings.API_POSTAUTH_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+"""
+Benchmark suite of the API endpoints consumed by freeradius
+(authorize, postauth, accounting).
+
+Generates organizations, users and accounting sessions in a test
+database, then drives the endpoints with the django test client
+(the whole middleware stack is included) and reports the latency
+percentiles, the requests per second and the database queries per
+request of each endpoint, both for the default views
+(django-rest-framework), the default views with compact responses
+(``API_COMPACT_RESPONSES``) and the lightweight views of
+``openwisp_radius.api.fast_views``; the bytes of each response
+(headers included) are reported too.
+
+``--responses`` measures only the time spent building and
+serializing the responses, comparing the renderers of
+django-rest-framework with the pre-serialized compact responses.
+
+``--batch`` measures the import of users from a CSV file
+(``RadiusBatch.add``) with each of the ``--chunk-sizes``
+(``BATCH_BULK_CHUNK_SIZE``), reporting the rows per second
+and the database queries per row.
+
+The test database is created with the settings of the ``openwisp2``
+project, to use PostgreSQL configure it in ``tests/local_settings.py``.
+Passwords are hashed with MD5 (unless ``--hasher default`` is passed)
+in order to measure the overhead of the views and not the one of the
+password hasher.
+
+Usage:
+
+    ./tests/benchmark.py [--requests 1000] [--organizations 5] [--users 100]
+                         [--sessions 100] [--views default compact fast]
+                         [--responses] [--json results.json]
+    ./tests/benchmark.py --batch [--batch-rows 5000] [--chunk-sizes 1 100 1000]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+from itertools import cycle
+from time import perf_counter
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'openwisp2.settings')
+
+URLCONFS = {
+    'default': 'openwisp2.urls',
+    'compact': 'openwisp2.urls',
+    'fast': 'openwisp2.fast_urls',
+}
+COMPACT_VIEWS = ['compact']
+RESPONSES = {
+    'accept': {'control:Auth-Type': 'Accept'},
+    'empty': None,
+    'attributes': {
+        'control:Auth-Type': 'Accept',
+        'reply:Session-Timeout': 3600,
+        'reply:ChilliSpot-Max-Total-Octets': 3000000000,
+    },
+}
+ENDPOINTS = ['authorize', 'postauth', 'accounting-start', 'accounting-interim']
+PASSWORD = 'tester'
+
+
+def percentile(values, percent):
+    """
+    returns the nearest-rank percentile of the sorted list ``values``
+    """
+    index = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[index]
+
+
+def generate_data(organizations, users, sessions):
+    """
+    creates the organizations, the users and the open accounting
+    sessions used by the benchmark, returns a list of dicts
+    with the details of each organization
+    """
+    import swapper
+    from django.contrib.auth import get_user_model
+
+    from openwisp_radius.utils import load_model
+
+    Organization = swapper.load_model('openwisp_users', 'Organization')
+    OrganizationUser = swapper.load_model('openwisp_users', 'OrganizationUser')
+    OrganizationRadiusSettings = load_model('OrganizationRadiusSettings')
+    RadiusAccounting = load_model('RadiusAccounting')
+    User = get_user_model()
+
+    password = User(username='hasher')
+    password.set_password(PASSWORD)
+    data = []
+    for i in range(organizations):
+        org = Organization.objects.create(name=f'bench-{i}', slug=f'bench-{i}')
+        radius_settings = OrganizationRadiusSettings.objects.create(
+            organization=org, token=f'bench-token-{i}'
+        )
+        usernames = [f'bench-{i}-{n}' for n in range(users)]
+        User.objects.bulk_create(
+            [
+                User(
+                    username=username,
+                    email=f'{username}@openwisp.org',
+                    password=password.password,
+                )
+                for username in usernames
+            ]
+        )
+        # add_user() is not used in order to generate the data
+        # quickly, the radius user groups are not needed
+        OrganizationUser.objects.bulk_create(
+            [
+                OrganizationUser(organization=org, user=user)
+                for user in User.objects.filter(username__in=usernames)
+            ]
+        )
+        unique_ids = [f'bench-{i}-{n}' for n in range(sessions)]
+        RadiusAccounting.objects.bulk_create(
+            [
+                RadiusAccounting(
+                    organization=org,
+                    session_id=unique_id,
+                    unique_id=unique_id,
+                    username=usernames[n % users],
+                    nas_ip_address='172.16.64.91',
+                )
+                for n, unique_id in enumerate(unique_ids)
+            ]
+        )
+        data.append(
+            {
+                'authorization': f'Bearer {org.pk} {radius_settings.token}',
+                'usernames': usernames,
+                'unique_ids': unique_ids,
+            }
+        )
+    return data
+
+
+def get_packets(endpoint, data, prefix):
+    """
+    returns an infinite iterator of ``(path, packet, authorization)``
+    tuples which spreads the requests across organizations and users,
+    ``prefix`` is used for the unique ids of the sessions started
+    """
+    orgs = cycle(data)
+    counter = 0
+    while True:
+        counter += 1
+        org = next(orgs)
+        username = org['usernames'][counter % len(org['usernames'])]
+        if endpoint == 'authorize':
+            path = '/api/v1/authorize/'
+            packet = {'username': username, 'password': PASSWORD}
+        elif endpoint == 'postauth':
+            path = '/api/v1/postauth/'
+            packet = {
+                'username': username,
+                'password': PASSWORD,
+                'reply': 'Access-Accept',
+                'called_station_id': '00-27-22-F3-FA-F1:hostname',
+                'calling_station_id': '5c:7d:c1:72:a7:3b',
+            }
+        else:
+            path = '/api/v1/accounting/'
+            if endpoint == 'accounting-start':
+                status_type = 'Start'
+                unique_id = f'{prefix}-{counter}'
+            else:
+                status_type = 'Interim-Update'
+                unique_id = org['unique_ids'][counter % len(org['unique_ids'])]
+            packet = {
+                'status_type': status_type,
+                'session_id': unique_id,
+                'unique_id': unique_id,
+                'username': username,
+                'nas_ip_address': '172.16.64.91',
+                'session_time': counter,
+                'input_octets': counter * 1000,
+                'output_octets': counter * 10000,
+                'called_station_id': '00-27-22-F3-FA-F1:hostname',
+                'calling_station_id': '5c:7d:c1:72:a7:3b',
+            }
+        yield path, json.dumps(packet), org['authorization']
+
+
+def measure(client, packets, requests):
+    """
+    sends ``requests`` requests, returns the duration of each
+    request (in seconds), the total number of queries and the
+    total size of the responses (headers included)
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    durations = []
+    queries = 0
+    size = 0
+    for i in range(requests):
+        path, body, authorization = next(packets)
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            response = client.post(
+                path,
+                body,
+                content_type='application/json',
+                HTTP_AUTHORIZATION=authorization,
+            )
+            durations.append(perf_counter() - start)
+        assert response.status_code < 300, response.content
+        queries += len(context.captured_queries)
+        size += len(response.serialize_headers()) + len(response.content)
+    return durations, queries, size
+
+
+def run(args):
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from openwisp_radius import settings as app_settings
+
+    data = generate_data(args.organizations, args.users, args.sessions)
+    client = Client()
+    results = []
+    for views in args.views:
+        app_settings.API_COMPACT_RESPONSES = views in COMPACT_VIEWS
+        with override_settings(ROOT_URLCONF=URLCONFS[views]):
+            for endpoint in args.endpoints:
+                packets = get_packets(endpoint, data, prefix=views)
+                # warm up caches and lazy initializations
+                measure(client, packets, args.warmup)
+                durations, queries, size = measure(client, packets, args.requests)
+                total = sum(durations)
+                durations.sort()
+                results.append(
+                    {
+                        'views': views,
+                        'endpoint': endpoint,
+                        'requests': args.requests,
+                        'p50_ms': percentile(durations, 50) * 1000,
+                        'p95_ms': percentile(durations, 95) * 1000,
+                        'p99_ms': percentile(durations, 99) * 1000,
+                        'requests_per_second': args.requests / total,
+                        'queries_per_request': queries / args.requests,
+                        'bytes_per_response': size / args.requests,
+                    }
+                )
+    app_settings.API_COMPACT_RESPONSES = False
+    return results
+
+
+def run_batch(args):
+    """
+    imports ``--batch-rows`` users with each chunk size,
+    returns the rows per second and the queries per row
+    """
+    import csv
+    from io import StringIO
+
+    import swapper
+    from django.db import connection
+
+    from openwisp_radius import settings as app_settings
+    from openwisp_radius.utils import load_model
+
+    Organization = swapper.load_model('openwisp_users', 'Organization')
+    RadiusBatch = load_model('RadiusBatch')
+    results = []
+    for chunk_size in args.chunk_sizes:
+        name = f'batch-{chunk_size}'
+        org = Organization.objects.create(name=name, slug=name)
+        batch = RadiusBatch.objects.create(name=name, organization=org, strategy='csv')
+        csv_data = ''.join(
+            f'{name}-{n},cleartext${PASSWORD},{name}-{n}@openwisp.org,,\n'
+            for n in range(args.batch_rows)
+        )
+        app_settings.BATCH_BULK_CHUNK_SIZE = chunk_size
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start = perf_counter()
+            batch.add(csv.reader(StringIO(csv_data)))
+            total = perf_counter() - start
+        assert batch.users.count() == args.batch_rows
+        results.append(
+            {
+                'chunk_size': chunk_size,
+                'rows': args.batch_rows,
+                'seconds': total,
+                'rows_per_second': args.batch_rows / total,
+                'queries_per_row': len(queries) / args.batch_rows,
+            }
+        )
+    return results
+
+
+def build_drf_response(data):
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.response import Response
+
+    response = Response(data)
+    # what APIView.finalize_response sets after the content negotiation
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = 'application/json'
+    response.renderer_context = {}
+    response['Allow'] = 'POST, OPTIONS'
+    response['Vary'] = 'Accept'
+    return response.render()
+
+
+def build_compact_response(data):
+    from openwisp_radius.api.freeradius import render_cached
+    from openwisp_radius.api.utils import compact_response
+
+    return compact_response(render_cached(data))
+
+
+def run_responses(args):
+    """
+    measures the time spent building and serializing the
+    responses and their size (headers included)
+    """
+    results = []
+    for name, data in RESPONSES.items():
+        for path, build in [
+            ('default', build_drf_response),
+            ('compact', build_compact_response),
+        ]:
+            start = perf_counter()
+            for i in range(args.requests):
+                response = build(data)
+                serialized = response.serialize()
+            total = perf_counter() - start
+            results.append(
+                {
+                    'response': name,
+                    'path': path,
+                    'build_us': total / args.requests * 1000000,
+                    'bytes': len(serialized),
+                }
+            )
+    return results
+
+
+def get_environment(args):
+    import django
+    from django.db import connection
+
+    import openwisp_radius
+
+    return {
+        'openwisp_radius': openwisp_radius.get_version(),
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'hasher': args.hasher,
+        'organizations': args.organizations,
+        'users': args.users,
+        'sessions': args.sessions,
+    }
+
+
+def print_results(results):
+    columns = ['p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'req/s', 'queries', 'bytes']
+    header = f'{"views":<10}{"endpoint":<22}' + ''.join(f'{c:>12}' for c in columns)
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f'{r["views"]:<10}{r["endpoint"]:<22}'
+            f'{r["p50_ms"]:>12.3f}{r["p95_ms"]:>12.3f}{r["p99_ms"]:>12.3f}'
+            f'{r["requests_per_second"]:>12.1f}{r["queries_per_request"]:>12.2f}'
+            f'{r["bytes_per_response"]:>12.1f}'
+        )
+
+
+def print_response_results(results):
+    header = f'{"response":<14}{"path":<10}{"build (us)":>12}{"bytes":>12}'
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f'{r["response"]:<14}{r["path"]:<10}'
+            f'{r["build_us"]:>12.2f}{r["bytes"]:>12}'
+        )
+
+
+def print_batch_results(results):
+    columns = ['rows', 'seconds', 'rows/s', 'queries/row']
+    header = f'{"chunk size":<12}' + ''.join(f'{c:>12}' for c in columns)
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f'{r["chunk_size"]:<12}{r["rows"]:>12}{r["seconds"]:>12.3f}'
+            f'{r["rows_per_second"]:>12.1f}{r["queries_per_row"]:>12.3f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--organizations', type=int, default=5)
+    parser.add_argument('--users', type=int, default=100, help='per organization')
+    parser.add_argument('--sessions', type=int, default=100, help='per organization')
+    parser.add_argument(
+        '--views', nargs='+', choices=list(URLCONFS), default=list(URLCONFS)
+    )
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--hasher', choices=['md5', 'default'], default='md5')
+    parser.add_argument(
+        '--responses',
+        action='store_true',
+        help='measures only the time spent building the responses',
+    )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='measures the import of users from a CSV file',
+    )
+    parser.add_argument('--batch-rows', type=int, default=5000)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument(
+        '--json', metavar='FILE', help='writes the results as JSON to FILE'
+    )
+    args = parser.parse_args()
+
+    import django
+
+    if args.responses:
+        django.setup()
+        results = run_responses(args)
+        print_response_results(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'results': results}, f, indent=4)
+        return
+    from django.conf import settings
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import override_settings
+
+    django.setup()
+    runner = DiscoverRunner(verbosity=0)
+    runner.setup_test_environment()
+    old_config = runner.setup_databases()
+    hashers = settings.PASSWORD_HASHERS
+    if args.hasher == 'md5':
+        hashers = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    try:
+        with override_settings(PASSWORD_HASHERS=hashers):
+            results = run_batch(args) if args.batch else run(args)
+        environment = get_environment(args)
+    finally:
+        runner.teardown_databases(old_config)
+        runner.teardown_test_environment()
+    if args.batch:
+        print_batch_results(results)
+    else:
+        print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'environment': environment, 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+from django.conf.urls import include, url
+
+from openwisp_radius.api import fast_views
+from openwisp_radius.urls import get_urls
+
+from .urls import urlpatterns as base_urlpatterns
+
+# replaces the radius urls with the ones of the lightweight views
+urlpatterns = [
+    pattern
+    for pattern in base_urlpatterns
+    if getattr(pattern, 'namespace', None) != 'radius'
+] + [url(r'^', include((get_urls(fast_views), 'radius'), namespace='radius'))]
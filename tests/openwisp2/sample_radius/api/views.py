@@ -1,5 +1,8 @@
+from openwisp_radius.api.views import AccountingBatchView as BaseAccountingBatchView
 from openwisp_radius.api.views import AccountingView as BaseAccountingView
+from openwisp_radius.api.views import AuthorizeBatchView as BaseAuthorizeBatchView
 from openwisp_radius.api.views import AuthorizeView as BaseAuthorizeView
+from openwisp_radius.api.views import BatchDetailView as BaseBatchDetailView
 from openwisp_radius.api.views import BatchView as BaseBatchView
 from openwisp_radius.api.views import ChangePhoneNumberView as BaseChangePhoneNumberView
 from openwisp_radius.api.views import CreatePhoneTokenView as BaseCreatePhoneTokenView
@@ -11,6 +14,7 @@ from openwisp_radius.api.views import (
 from openwisp_radius.api.views import PasswordResetView as BasePasswordResetView
 from openwisp_radius.api.views import PostAuthView as BasePostAuthView
 from openwisp_radius.api.views import RegisterView as BaseRegisterView
+from openwisp_radius.api.views import UsageView as BaseUsageView
 from openwisp_radius.api.views import UserAccountingView as BaseUserAccountingView
 from openwisp_radius.api.views import ValidateAuthTokenView as BaseValidateAuthTokenView
 from openwisp_radius.api.views import (
@@ -22,18 +26,34 @@ class AuthorizeView(BaseAuthorizeView):
     pass
 
 
+class AuthorizeBatchView(BaseAuthorizeBatchView):
+    pass
+
+
 class PostAuthView(BasePostAuthView):
     pass
 
 
+class UsageView(BaseUsageView):
+    pass
+
+
 class AccountingView(BaseAccountingView):
     pass
 
 
+class AccountingBatchView(BaseAccountingBatchView):
+    pass
+
+
 class BatchView(BaseBatchView):
     pass
 
 
+class BatchDetailView(BaseBatchDetailView):
+    pass
+
+
 class RegisterView(BaseRegisterView):
     pass
 
@@ -75,9 +95,13 @@ class ChangePhoneNumberView(BaseChangePhoneNumberView):
 
 
 authorize = AuthorizeView.as_view()
+authorize_batch = AuthorizeBatchView.as_view()
 postauth = PostAuthView.as_view()
+usage = UsageView.as_view()
 accounting = AccountingView.as_view()
+accounting_batch = AccountingBatchView.as_view()
 batch = BatchView.as_view()
+batch_detail = BatchDetailView.as_view()
 register = RegisterView.as_view()
 obtain_auth_token = ObtainAuthTokenView.as_view()
 validate_auth_token = ValidateAuthTokenView.as_view()
@@ -0,0 +1,7 @@
+from openwisp_radius.management.commands.base.partition_radacct import (
+    BasePartitionRadacctCommand,
+)
+
+
+class Command(BasePartitionRadacctCommand):
+    pass
@@ -0,0 +1,7 @@
+from openwisp_radius.management.commands.base.radius_metrics import (
+    BaseRadiusMetricsCommand,
+)
+
+
+class Command(BaseRadiusMetricsCommand):
+    pass
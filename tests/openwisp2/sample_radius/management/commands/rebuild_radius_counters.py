@@ -0,0 +1,7 @@
+from openwisp_radius.management.commands.base.rebuild_radius_counters import (
+    BaseRebuildRadiusCountersCommand,
+)
+
+
+class Command(BaseRebuildRadiusCountersCommand):
+    pass
@@ -0,0 +1,60 @@
+import django.db.models.deletion
+import swapper
+from django.db import migrations, models
+
+import openwisp_users.mixins
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sample_radius', '0002_default_groups_and_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RadiusUserCounter',
+            fields=[
+                ('details', models.CharField(blank=True, max_length=64, null=True),),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('username', models.CharField(max_length=64, verbose_name='username'),),
+                ('day', models.DateField(verbose_name='day')),
+                (
+                    'daily_session_time',
+                    models.BigIntegerField(
+                        default=0, verbose_name='daily session time'
+                    ),
+                ),
+                (
+                    'daily_traffic',
+                    models.BigIntegerField(default=0, verbose_name='daily traffic'),
+                ),
+                (
+                    'total_session_time',
+                    models.BigIntegerField(
+                        default=0, verbose_name='total session time'
+                    ),
+                ),
+                (
+                    'total_traffic',
+                    models.BigIntegerField(default=0, verbose_name='total traffic'),
+                ),
+                (
+                    'organization',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=swapper.get_model_name('openwisp_users', 'Organization'),
+                        verbose_name='organization',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'user counter',
+                'verbose_name_plural': 'user counters',
+                'db_table': 'radusercounter',
+                'abstract': False,
+                'unique_together': {('organization', 'username')},
+            },
+            bases=(openwisp_users.mixins.ValidateOrgMixin, models.Model),
+        ),
+    ]
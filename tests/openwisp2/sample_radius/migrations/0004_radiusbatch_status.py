@@ -0,0 +1,69 @@
+from django.db import migrations, models
+
+STATUS_CHOICES = [
+    ('pending', 'pending'),
+    ('running', 'running'),
+    ('done', 'done'),
+    ('failed', 'failed'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sample_radius', '0003_radiususercounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='radiusbatch',
+            name='error',
+            field=models.TextField(
+                blank=True,
+                help_text='Reason why the batch failed',
+                verbose_name='error',
+            ),
+        ),
+        migrations.AddField(
+            model_name='radiusbatch',
+            name='processed_users',
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text='Number of users added to the batch so far',
+                verbose_name='processed users',
+            ),
+        ),
+        # the users of the existing batches have already been added
+        migrations.AddField(
+            model_name='radiusbatch',
+            name='status',
+            field=models.CharField(
+                choices=STATUS_CHOICES,
+                default='done',
+                help_text='Status of the creation of the users of the batch',
+                max_length=8,
+                verbose_name='status',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='radiusbatch',
+            name='status',
+            field=models.CharField(
+                choices=STATUS_CHOICES,
+                default='pending',
+                help_text='Status of the creation of the users of the batch',
+                max_length=8,
+                verbose_name='status',
+            ),
+        ),
+        migrations.AddField(
+            model_name='radiusbatch',
+            name='total_users',
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text='Number of users to add (unknown for CSV files)',
+                null=True,
+                verbose_name='total users',
+            ),
+        ),
+    ]
@@ -13,6 +13,7 @@ from openwisp_radius.base.models import (
     AbstractRadiusPostAuth,
     AbstractRadiusReply,
     AbstractRadiusToken,
+    AbstractRadiusUserCounter,
     AbstractRadiusUserGroup,
 )
 
@@ -39,6 +40,11 @@ class RadiusAccounting(DetailsModel, AbstractRadiusAccounting):
         abstract = False
 
 
+class RadiusUserCounter(DetailsModel, AbstractRadiusUserCounter):
+    class Meta(AbstractRadiusUserCounter.Meta):
+        abstract = False
+
+
 class RadiusGroup(DetailsModel, AbstractRadiusGroup):
     class Meta(AbstractRadiusGroup.Meta):
         abstract = False
@@ -1,4 +1,13 @@
 from openwisp_radius.tests.test_admin import TestAdmin as BaseTestAdmin
+from openwisp_radius.tests.test_api import (
+    TestAccountingBatch as BaseTestAccountingBatch,
+)
+from openwisp_radius.tests.test_api import (
+    TestAccountingPartitioned as BaseTestAccountingPartitioned,
+)
+from openwisp_radius.tests.test_api import (
+    TestAccountingUpsert as BaseTestAccountingUpsert,
+)
 from openwisp_radius.tests.test_api import TestApi as BaseTestApi
 from openwisp_radius.tests.test_api import TestApiPhoneToken as BaseTestApiPhoneToken
 from openwisp_radius.tests.test_api import TestApiReject as BaseTestApiReject
@@ -6,17 +15,40 @@ from openwisp_radius.tests.test_api import TestApiUserToken as BaseTestApiUserTo
 from openwisp_radius.tests.test_api import (
     TestApiValidateToken as BaseTestApiValidateToken,
 )
+from openwisp_radius.tests.test_api import TestAuthorizeBatch as BaseTestAuthorizeBatch
+from openwisp_radius.tests.test_api import TestAuthorizeCache as BaseTestAuthorizeCache
 from openwisp_radius.tests.test_api import TestAutoGroupname as BaseTestAutoGroupname
 from openwisp_radius.tests.test_api import (
     TestAutoGroupnameDisabled as BaseTestAutoGroupnameDisabled,
 )
+from openwisp_radius.tests.test_api import (
+    TestCompactResponses as BaseTestCompactResponses,
+)
+from openwisp_radius.tests.test_api import TestFastViews as BaseTestFastViews
+from openwisp_radius.tests.test_api import TestGroupnameCache as BaseTestGroupnameCache
 from openwisp_radius.tests.test_api import (
     TestOgranizationRadiusSettings as BaseTestOgranizationRadiusSettings,
 )
+from openwisp_radius.tests.test_api import TestPasswordCache as BaseTestPasswordCache
+from openwisp_radius.tests.test_api import TestPasswordPool as BaseTestPasswordPool
+from openwisp_radius.tests.test_api import (
+    TestPostAuthWriteBehind as BaseTestPostAuthWriteBehind,
+)
+from openwisp_radius.tests.test_asgi import (
+    TestFreeradiusApplication as BaseTestFreeradiusApplication,
+)
+from openwisp_radius.tests.test_batch_add_users import (
+    TestBatchJobs as BaseTestBatchJobs,
+)
+from openwisp_radius.tests.test_batch_add_users import (
+    TestBatchJobsThreads as BaseTestBatchJobsThreads,
+)
 from openwisp_radius.tests.test_batch_add_users import (
     TestCSVUpload as BaseTestCSVUpload,
 )
 from openwisp_radius.tests.test_commands import TestCommands as BaseTestCommands
+from openwisp_radius.tests.test_counters import TestCounters as BaseTestCounters
+from openwisp_radius.tests.test_metrics import TestMetrics as BaseTestMetrics
 from openwisp_radius.tests.test_models import TestNas as BaseTestNas
 from openwisp_radius.tests.test_models import (
     TestRadiusAccounting as BaseTestRadiusAccounting,
@@ -28,9 +60,13 @@ from openwisp_radius.tests.test_models import (
     TestRadiusPostAuth as BaseTestRadiusPostAuth,
 )
 from openwisp_radius.tests.test_models import TestRadiusReply as BaseTestRadiusReply
+from openwisp_radius.tests.test_policy import TestGroupPolicy as BaseTestGroupPolicy
 from openwisp_radius.tests.test_social import TestSocial as BaseTestSocial
 from openwisp_radius.tests.test_token import TestPhoneToken as BaseTestPhoneToken
 from openwisp_radius.tests.test_token import TestRadiusToken as BaseTestRadiusToken
+from openwisp_radius.tests.test_token import (
+    TestRadiusTokenConcurrency as BaseTestRadiusTokenConcurrency,
+)
 from openwisp_radius.tests.test_users_integration import (
     TestUsersIntegration as BaseTestUsersIntegration,
 )
@@ -135,6 +171,78 @@ class TestApiValidateToken(BaseTestApiValidateToken):
     pass
 
 
+class TestAuthorizeCache(BaseTestAuthorizeCache):
+    pass
+
+
+class TestAccountingBatch(BaseTestAccountingBatch):
+    pass
+
+
+class TestAccountingUpsert(BaseTestAccountingUpsert):
+    pass
+
+
+class TestPostAuthWriteBehind(BaseTestPostAuthWriteBehind):
+    pass
+
+
+class TestGroupnameCache(BaseTestGroupnameCache):
+    pass
+
+
+class TestFastViews(BaseTestFastViews):
+    pass
+
+
+class TestFreeradiusApplication(BaseTestFreeradiusApplication):
+    pass
+
+
+class TestMetrics(BaseTestMetrics):
+    pass
+
+
+class TestPasswordCache(BaseTestPasswordCache):
+    pass
+
+
+class TestPasswordPool(BaseTestPasswordPool):
+    pass
+
+
+class TestRadiusTokenConcurrency(BaseTestRadiusTokenConcurrency):
+    pass
+
+
+class TestCounters(BaseTestCounters):
+    pass
+
+
+class TestGroupPolicy(BaseTestGroupPolicy):
+    pass
+
+
+class TestAuthorizeBatch(BaseTestAuthorizeBatch):
+    pass
+
+
+class TestCompactResponses(BaseTestCompactResponses):
+    pass
+
+
+class TestAccountingPartitioned(BaseTestAccountingPartitioned):
+    pass
+
+
+class TestBatchJobs(BaseTestBatchJobs):
+    pass
+
+
+class TestBatchJobsThreads(BaseTestBatchJobsThreads):
+    pass
+
+
 del BaseTestAdmin
 del BaseTestApi
 del BaseTestApiReject
@@ -158,3 +266,21 @@ del BaseTestRadiusToken
 del BaseTestPhoneToken
 del BaseTestUsersIntegration
 del BaseTestUtils
+del BaseTestAuthorizeCache
+del BaseTestAccountingBatch
+del BaseTestAccountingUpsert
+del BaseTestPostAuthWriteBehind
+del BaseTestGroupnameCache
+del BaseTestFastViews
+del BaseTestFreeradiusApplication
+del BaseTestMetrics
+del BaseTestPasswordCache
+del BaseTestPasswordPool
+del BaseTestRadiusTokenConcurrency
+del BaseTestCounters
+del BaseTestGroupPolicy
+del BaseTestAuthorizeBatch
+del BaseTestCompactResponses
+del BaseTestAccountingPartitioned
+del BaseTestBatchJobs
+del BaseTestBatchJobsThreads
@@ -2,7 +2,7 @@ import os
 import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TESTING = sys.argv[1] == 'test'
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 # Set DEBUG to False in production
 DEBUG = True
@@ -162,6 +162,7 @@ if os.environ.get('SAMPLE_APP', False):
     OPENWISP_RADIUS_RADIUSCHECK_MODEL = 'sample_radius.RadiusCheck'
     OPENWISP_RADIUS_RADIUSGROUPCHECK_MODEL = 'sample_radius.RadiusGroupCheck'
     OPENWISP_RADIUS_RADIUSACCOUNTING_MODEL = 'sample_radius.RadiusAccounting'
+    OPENWISP_RADIUS_RADIUSUSERCOUNTER_MODEL = 'sample_radius.RadiusUserCounter'
     OPENWISP_RADIUS_NAS_MODEL = 'sample_radius.Nas'
     OPENWISP_RADIUS_RADIUSUSERGROUP_MODEL = 'sample_radius.RadiusUserGroup'
     OPENWISP_RADIUS_RADIUSPOSTAUTH_MODEL = 'sample_radius.RadiusPostAuth'